@@ -1,16 +1,18 @@
 import csv
 import lzma
 import os
-from concurrent.futures import ThreadPoolExecutor
 
 from bulk_update.helper import bulk_update
+from django.db import connection, transaction
 
 from jarbas.core.management.commands import LoadCommand
+from jarbas.core.postgres import copy, create_staging_table, is_postgres, quote
 from jarbas.chamber_of_deputies.models import Reimbursement
 
 
 class Command(LoadCommand):
     help = 'Load Serenata de Amor receipts text dataset'
+    STAGING_TABLE = 'receipts_text_staging'
     count = 0
 
     def add_arguments(self, parser):
@@ -19,11 +21,15 @@ class Command(LoadCommand):
             '--batch-size', '-b', dest='batch_size', type=int, default=4096,
             help='Batch size for bulk update (default: 4096)'
         )
+        parser.add_argument(
+            '--table', dest='table',
+            help='Table to load into (default: the reimbursements table)'
+        )
 
     def handle(self, *args, **options):
-        self.queue = []
         self.path = options['dataset']
         self.batch_size = options['batch_size']
+        self.table = options.get('table') or Reimbursement._meta.db_table
         if not os.path.exists(self.path):
             raise FileNotFoundError(os.path.abspath(self.path))
 
@@ -56,24 +62,52 @@ class Command(LoadCommand):
         )
 
     def main(self):
+        update = self.copy_batch if is_postgres() else self.update
         for batch in self.receipts():
-            with ThreadPoolExecutor(max_workers=32) as executor:
-                executor.map(self.schedule_update, batch)
-            self.update()
+            update(batch)
+            print('{:,} reimbursements updated.'.format(self.count), end='\r')
+
+    def copy_batch(self, batch):
+        """
+        Loads a batch with PostgreSQL `COPY` into a staging table and updates
+        the reimbursements with a single `UPDATE ... FROM` joined on
+        `document_id` (if a document is repeated, its last text is kept).
+        Each batch is committed on its own, so neither the staging table nor
+        the transaction grow with the dataset.
+        """
+        columns = ('document_id', 'receipt_text')
+        rows = (
+            tuple(content[column] for column in columns)
+            for content in batch
+            if content['document_id'] is not None
+        )
+        table, staging = quote(self.table), quote(self.STAGING_TABLE)
+        with transaction.atomic(), connection.cursor() as cursor:
+            create_staging_table(cursor, self.STAGING_TABLE, self.table, columns)
+            copy(cursor, self.STAGING_TABLE, columns, rows)
+            cursor.execute(
+                'UPDATE {table} r SET receipt_text = s.receipt_text FROM ('
+                'SELECT DISTINCT ON (document_id) document_id, receipt_text FROM {staging} '
+                'ORDER BY document_id, ctid DESC) s '
+                'WHERE r.document_id = s.document_id'.format(table=table, staging=staging)
+            )
+            self.count += cursor.rowcount
 
-    def schedule_update(self, content):
-        document_id = content.get('document_id')
-        try:
-            reimbursement = Reimbursement.objects.get(document_id=document_id)
-        except Reimbursement.DoesNotExist:
-            pass
-        else:
-            reimbursement.receipt_text = content.get('receipt_text')
-            self.queue.append(reimbursement)
+    def update(self, batch):
+        """Updates the reimbursements of a batch with the ORM (for databases
+        other than PostgreSQL), looking all of them up at once."""
+        texts = {
+            content['document_id']: content['receipt_text']
+            for content in batch
+            if content['document_id'] is not None
+        }
+        reimbursements = Reimbursement.objects \
+            .filter(document_id__in=texts) \
+            .only('document_id')
+        queue = []
+        for reimbursement in reimbursements:
+            reimbursement.receipt_text = texts[reimbursement.document_id]
+            queue.append(reimbursement)
 
-    def update(self):
-        fields = ['receipt_text', ]
-        bulk_update(self.queue, update_fields=fields)
-        self.count += len(self.queue)
-        print('{:,} reimbursements updated.'.format(self.count), end='\r')
-        self.queue = []
+        bulk_update(queue, update_fields=['receipt_text'])
+        self.count += len(queue)
@@ -1,13 +1,19 @@
 from csv import DictReader
 
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+
 from jarbas.core.management.commands import LoadCommand
+from jarbas.core.postgres import copy, create_staging_table, is_postgres, quote
 from jarbas.chamber_of_deputies.models import Reimbursement
-from jarbas.chamber_of_deputies.tasks import serialize
+from jarbas.chamber_of_deputies.tasks import TYPES, deserialize, serialize
 
 
 class Command(LoadCommand):
     help = 'Load Serenata de Amor reimbursements dataset'
     BATCH_SIZE = 4096
+    STAGING_TABLE = 'reimbursements_staging'
+    UNIQUE_KEY = ('document_id', 'year', 'applicant_id')
 
     def add_arguments(self, parser):
         super().add_arguments(parser)
@@ -16,16 +22,32 @@ class Command(LoadCommand):
             default=self.BATCH_SIZE,
             help='Batch size for bulk update (default: 4096)'
         )
+        parser.add_argument(
+            '--sync', '-s', dest='sync', action='store_true',
+            help='Create new reimbursements and update the changed ones '
+                 '(PostgreSQL only)'
+        )
+        parser.add_argument(
+            '--table', dest='table',
+            help='Table to load into (default: the reimbursements table)'
+        )
 
     def handle(self, *args, **options):
         self.path = options['dataset']
         self.batch_size = options.get('batch_size', self.BATCH_SIZE)
         self.batch, self.count = [], 0
+        self.table = options.get('table') or Reimbursement._meta.db_table
+        self.sync = options.get('sync', False)
+        if self.sync and not is_postgres():
+            raise CommandError('Syncing reimbursements requires PostgreSQL')
 
         if options.get('drop', False):
             self.drop_all(Reimbursement)
 
-        self.create_batches()
+        if is_postgres():
+            self.copy()
+        else:
+            self.create_batches()
 
     @property
     def reimbursements(self):
@@ -37,8 +59,16 @@ class Command(LoadCommand):
                     yield obj
 
     def create_batches(self):
-        for count, reimbursement in enumerate(self.reimbursements, 1):
-            self.count = count
+        """Creates the reimbursements in batches, skipping the ones repeating
+        the unique key of a previous row (the first one wins, as in
+        `insert_sql`)."""
+        keys = set()
+        for reimbursement in self.reimbursements:
+            key = tuple(getattr(reimbursement, field) for field in self.UNIQUE_KEY)
+            if key in keys:
+                continue
+            keys.add(key)
+            self.count += 1
             self.batch.append(reimbursement)
             if len(self.batch) >= self.batch_size:
                 self.persist_batch()
@@ -52,3 +82,108 @@ class Command(LoadCommand):
             count=self.count,
             permanent=print_permanent
         )
+
+    def copy(self):
+        """
+        Loads the dataset with PostgreSQL `COPY` into a staging table (with
+        the same types of the reimbursements table) and then inserts all of
+        its rows at once, instead of creating model instances in batches.
+        With `sync`, existing reimbursements are updated instead (see
+        `upsert_sql`).
+        """
+        with open(self.path, 'rt') as file_handler:
+            reader = DictReader(file_handler)
+            columns = self.columns(reader.fieldnames)
+            rows = (
+                tuple(row[column] for column in columns)
+                for row in map(deserialize, reader)
+                if row
+            )
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                create_staging_table(cursor, self.STAGING_TABLE, self.table, columns)
+                total = copy(cursor, self.STAGING_TABLE, columns, rows)
+                if self.sync:
+                    cursor.execute(self.upsert_sql(self.table, columns))
+                    inserted, updated = cursor.fetchone()
+                else:
+                    cursor.execute(self.insert_sql(self.table, columns))
+                    inserted, updated = cursor.rowcount, 0
+                self.count = inserted + updated
+
+        if not self.sync and total > inserted:
+            print('{:,} repeated reimbursements skipped.'.format(total - inserted))
+        if self.sync:
+            print('{:,} reimbursements created, {:,} updated and {:,} unchanged.'.format(
+                inserted,
+                updated,
+                total - inserted - updated
+            ))
+        else:
+            self.print_count(Reimbursement, count=self.count, permanent=True)
+
+    @staticmethod
+    def columns(fieldnames):
+        """Returns the columns of the reimbursements table in the dataset
+        (and the ones `deserialize` adds to each row)."""
+        fields = {field.attname for field in Reimbursement._meta.concrete_fields}
+        columns = list(fieldnames) + [key for key, _ in TYPES if key not in fieldnames]
+        return [column for column in columns if column in fields]
+
+    @staticmethod
+    def content_hash_sql(columns):
+        """Hash of the contents of a row of the staging table (its columns
+        in alphabetical order, so it does not depend on the dataset)."""
+        columns = ', '.join(quote(column) for column in sorted(columns))
+        return 'md5(ROW({})::text)'.format(columns)
+
+    def insert_sql(self, table, columns):
+        """Inserts the staging table rows with their content hash and with
+        the values Django would set for the fields missing in the dataset
+        (`last_update` and `receipt_fetched`). Rows repeating a unique key
+        are inserted once (the first one of the dataset)."""
+        content_hash = self.content_hash_sql(columns)
+        key = ', '.join(quote(column) for column in self.UNIQUE_KEY)
+        columns = ', '.join(quote(column) for column in columns)
+        return (
+            'INSERT INTO {table} ({columns}, content_hash, last_update, receipt_fetched) '
+            'SELECT DISTINCT ON ({key}) {columns}, {content_hash}, now(), false '
+            'FROM {staging} ORDER BY {key}, ctid'
+        ).format(
+            table=quote(table),
+            columns=columns,
+            key=key,
+            content_hash=content_hash,
+            staging=quote(self.STAGING_TABLE)
+        )
+
+    def upsert_sql(self, table, columns):
+        """
+        Inserts the staging table rows that are new and updates the
+        reimbursements whose content hash changed (see `insert_sql`),
+        clearing their search vector and receipt state. Unchanged
+        reimbursements are not touched. The query returns the number of
+        reimbursements created and updated.
+        """
+        key = ', '.join(quote(column) for column in self.UNIQUE_KEY)
+        updates = ', '.join(
+            '{0} = EXCLUDED.{0}'.format(quote(column))
+            for column in columns
+            if column not in self.UNIQUE_KEY
+        )
+        return (
+            'WITH upserted AS ('
+            '{insert} '
+            'ON CONFLICT ({key}) DO UPDATE SET {updates}, '
+            'content_hash = EXCLUDED.content_hash, last_update = now(), '
+            'search_vector = NULL, receipt_fetched = false, receipt_url = NULL '
+            'WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash '
+            'RETURNING xmax = 0 AS inserted) '
+            'SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) '
+            'FROM upserted'
+        ).format(
+            insert=self.insert_sql(table, columns),
+            key=key,
+            updates=updates,
+            table=quote(table)
+        )
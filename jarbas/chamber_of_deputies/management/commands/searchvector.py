@@ -1,9 +1,41 @@
+from functools import reduce
+from operator import add
+
 from django.core.management.base import BaseCommand
 from django.contrib.postgres.search import SearchVector
 
 from tqdm import tqdm
 
 from jarbas.chamber_of_deputies.models import Reimbursement
+from jarbas.core.postgres import quote
+
+
+CONFIG = 'portuguese'
+WEIGHTS = (
+    ('congressperson_name', 'A'),
+    ('supplier', 'A'),
+    ('cnpj_cpf', 'A'),
+    ('party', 'A'),
+    ('state', 'B'),
+    ('receipt_text', 'B'),
+    ('passenger', 'C'),
+    ('leg_of_the_trip', 'C'),
+    ('subquota_description', 'D'),
+    ('subquota_group_description', 'D')
+)
+
+
+def update_sql(table):
+    """Returns the query creating the search vector (the same one of the
+    command) of every row of `table`, a table with the columns of the
+    reimbursements (e.g. one being loaded before replacing it)."""
+    vectors = (
+        "setweight(to_tsvector('{}'::regconfig, COALESCE({}, '')), '{}')".format(
+            CONFIG, quote(field), weight
+        )
+        for field, weight in WEIGHTS
+    )
+    return 'UPDATE {} SET search_vector = {}'.format(quote(table), ' || '.join(vectors))
 
 
 class Command(BaseCommand):
@@ -35,17 +67,10 @@ class Command(BaseCommand):
         if not queryset.exists():
             return
 
-        search_vector = \
-            SearchVector('congressperson_name', config='portuguese', weight='A') + \
-            SearchVector('supplier', config='portuguese', weight='A') + \
-            SearchVector('cnpj_cpf', config='portuguese', weight='A') + \
-            SearchVector('party', config='portuguese', weight='A') + \
-            SearchVector('state', config='portuguese', weight='B') + \
-            SearchVector('receipt_text', config='portuguese', weight='B') + \
-            SearchVector('passenger', config='portuguese', weight='C') + \
-            SearchVector('leg_of_the_trip', config='portuguese', weight='C') + \
-            SearchVector('subquota_description', config='portuguese', weight='D') + \
-            SearchVector('subquota_group_description', config='portuguese', weight='D')
+        search_vector = reduce(add, (
+            SearchVector(field, config=CONFIG, weight=weight)
+            for field, weight in WEIGHTS
+        ))
 
         pks = tuple(obj['pk'] for obj in queryset.values('pk'))
         total = len(pks)
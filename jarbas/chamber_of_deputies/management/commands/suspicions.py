@@ -1,18 +1,27 @@
 import csv
+import io
+import json
 import lzma
 import os
-from concurrent.futures import ThreadPoolExecutor
+import struct
+from collections import Counter, defaultdict
 
 from bulk_update.helper import bulk_update
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
 
 from jarbas.core.management.commands import LoadCommand
+from jarbas.core.postgres import copy, create_staging_table, is_postgres, quote
 from jarbas.chamber_of_deputies.models import Reimbursement
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 class Command(LoadCommand):
     help = 'Load Serenata de Amor suspicions dataset'
-    count = 0
+    STAGING_TABLE = 'suspicions_staging'
 
     def add_arguments(self, parser):
         super().add_arguments(parser, add_drop_all=False)
@@ -21,32 +30,84 @@ class Command(LoadCommand):
             help='Batch size for bulk update (default: 4096)'
         )
         parser.add_argument(
-            '--workers', '-w', dest='workers', type=int, default=8,
-            help='Number of workers for the thread pool executor (default: 8)'
+            '--table', dest='table',
+            help='Table to load into (default: the reimbursements table)'
         )
 
     def handle(self, *args, **options):
-        self.queue = []
         self.path = options['dataset']
         self.batch_size = options['batch_size']
-        self.workers = options['workers']
+        self.table = options.get('table') or Reimbursement._meta.db_table
+        self.matched = self.unmatched = self.duplicates = 0
         if not os.path.exists(self.path):
             raise FileNotFoundError(os.path.abspath(self.path))
 
-        self.main()
-        print('{:,} reimbursements updated.'.format(self.count))
-
-    def suspicions(self):
-        """Returns a Generator with batches of suspicions."""
         print('Loading suspicions dataset…', end='\r')
-        with lzma.open(self.path, mode='rt', encoding='utf-8') as file_handler:
-            batch = []
-            for row in csv.DictReader(file_handler):
-                batch.append(self.serialize(row))
-                if len(batch) >= self.batch_size:
-                    yield batch
-                    batch = []
-            yield batch
+        if is_postgres():
+            self.copy()
+        else:
+            self.update_in_batches()
+
+        print('{:,} reimbursements updated.'.format(self.matched))
+        print('{:,} suspicions without a reimbursement.'.format(self.unmatched))
+        print('{:,} suspicions skipped as duplicates.'.format(self.duplicates))
+
+    def rows(self):
+        """
+        Returns a Generator with the rows of the dataset as dicts of strings
+        (as `csv.DictReader` does), from a CSV or from a Rosie columnar file
+        (`.columns.xz` or `.columns.zst`).
+        """
+        if '.columns.' in os.path.basename(self.path):
+            with self.open_dataset(text=False) as file_handler:
+                yield from self.columnar_rows(file_handler)
+        else:
+            with self.open_dataset() as file_handler:
+                yield from csv.DictReader(file_handler)
+
+    def open_dataset(self, text=True):
+        """Opens the dataset compressed with zstd (`.zst`) or xz."""
+        if not self.path.endswith('.zst'):
+            if text:
+                return lzma.open(self.path, mode='rt', encoding='utf-8')
+            return lzma.open(self.path)
+
+        if zstandard is None:
+            raise ImportError('Reading zstd files requires the zstandard package')
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(self.path, 'rb'),
+            read_across_frames=True
+        )
+        file_handler = io.BufferedReader(reader)
+        if text:
+            return io.TextIOWrapper(file_handler, encoding='utf-8')
+        return file_handler
+
+    def columnar_rows(self, file_handler):
+        """
+        Reads Rosie columnar format: each block is a JSON line describing
+        its columns followed by their data (bit-packed booleans, 64-bit
+        integers or a JSON list of strings).
+        """
+        for line in iter(file_handler.readline, b''):
+            header = json.loads(line.decode('utf-8'))
+            columns = {}
+            for column in header['columns']:
+                data = file_handler.read(column['size'])
+                values = self.decode(column['type'], data, header['rows'])
+                columns[column['name']] = values
+
+            for values in zip(*columns.values()):
+                yield dict(zip(columns, values))
+
+    @staticmethod
+    def decode(kind, data, rows):
+        if kind == 'bits':
+            bits = (data[i // 8] >> (7 - i % 8) & 1 for i in range(rows))
+            return [str(bool(bit)) for bit in bits]
+        if kind == 'int64':
+            return [str(number) for number in struct.unpack(f'<{rows}q', data)]
+        return ['' if value is None else value for value in json.loads(data.decode('utf-8'))]
 
     def serialize(self, row):
         """
@@ -76,32 +137,86 @@ class Command(LoadCommand):
             suspicions=suspicions
         )
 
-    def main(self):
-        for batch in self.suspicions():
-            with ThreadPoolExecutor(max_workers=self.workers) as executor:
-                executor.map(self.schedule_update, batch)
-            self.update()
-
-    def schedule_update(self, content):
-        document_id = content.get('document_id')
-        if not document_id:
-            return None
-
-        try:
-            reimbursement = Reimbursement.objects.get(document_id=document_id)
-        except (ObjectDoesNotExist, Reimbursement.MultipleObjectsReturned):
-            pass
-        else:
-            reimbursement.suspicions = content.get('suspicions')
-            reimbursement.probability = content.get('probability')
-            self.queue.append(reimbursement)
-
-    def update(self):
-        fields = ['probability', 'suspicions']
-        bulk_update(self.queue, update_fields=fields)
-        self.count += len(self.queue)
-        print('{:,} reimbursements updated.'.format(self.count), end='\r')
-        self.queue = []
+    def copy(self):
+        """
+        Loads the dataset with PostgreSQL `COPY` into a staging table and
+        updates the reimbursements with a single `UPDATE ... FROM` joined on
+        `document_id`. Rows whose `document_id` is repeated in the dataset
+        or matches more than one reimbursement are skipped as duplicates.
+        """
+        columns = ('document_id', 'probability', 'suspicions')
+        rows = (
+            tuple(content[column] for column in columns)
+            for content in map(self.serialize, self.rows())
+        )
+        table, staging = quote(self.table), quote(self.STAGING_TABLE)
+        with transaction.atomic(), connection.cursor() as cursor:
+            create_staging_table(cursor, self.STAGING_TABLE, self.table, columns)
+            total = copy(cursor, self.STAGING_TABLE, columns, rows)
+
+            cursor.execute(
+                'DELETE FROM {staging} WHERE document_id IN ('
+                'SELECT document_id FROM {staging} WHERE document_id IS NOT NULL '
+                'GROUP BY document_id HAVING count(*) > 1)'.format(staging=staging)
+            )
+            self.duplicates = cursor.rowcount
+            cursor.execute(
+                'DELETE FROM {staging} WHERE document_id IN ('
+                'SELECT r.document_id FROM {table} r JOIN {staging} s USING (document_id) '
+                'GROUP BY r.document_id HAVING count(*) > 1)'.format(table=table, staging=staging)
+            )
+            self.duplicates += cursor.rowcount
+
+            cursor.execute(
+                'UPDATE {table} r SET probability = s.probability, suspicions = s.suspicions '
+                'FROM {staging} s WHERE r.document_id = s.document_id'.format(table=table, staging=staging)
+            )
+            self.matched = cursor.rowcount
+
+        self.unmatched = total - self.duplicates - self.matched
+
+    def update_in_batches(self):
+        """
+        Updates the reimbursements with the ORM (for databases other than
+        PostgreSQL), looking up `batch_size` of them at a time, skipping
+        duplicates the same way `copy` does.
+        """
+        contents, counts = {}, Counter()
+        for content in map(self.serialize, self.rows()):
+            document_id = content['document_id']
+            if document_id is None:
+                self.unmatched += 1
+                continue
+            contents[document_id] = content
+            counts[document_id] += 1
+
+        self.duplicates = sum(count for count in counts.values() if count > 1)
+        document_ids = [document_id for document_id, count in counts.items() if count == 1]
+        for start in range(0, len(document_ids), self.batch_size):
+            batch = document_ids[start:start + self.batch_size]
+            matches = defaultdict(list)
+            reimbursements = Reimbursement.objects \
+                .filter(document_id__in=batch) \
+                .only('document_id')
+            for reimbursement in reimbursements:
+                matches[reimbursement.document_id].append(reimbursement)
+
+            queue = []
+            for document_id in batch:
+                found = matches[document_id]
+                if not found:
+                    self.unmatched += 1
+                elif len(found) > 1:
+                    self.duplicates += 1
+                else:
+                    reimbursement, *_ = found
+                    reimbursement.probability = contents[document_id]['probability']
+                    reimbursement.suspicions = contents[document_id]['suspicions']
+                    queue.append(reimbursement)
+
+            bulk_update(queue, update_fields=['probability', 'suspicions'])
+            self.matched += len(queue)
+            print('{:,} reimbursements updated.'.format(self.matched), end='\r')
 
     @staticmethod
     def bool(string):
@@ -1,23 +1,32 @@
+import re
 from csv import DictReader, DictWriter
 from pathlib import Path
 from urllib.request import urlretrieve
 
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 
+from jarbas.chamber_of_deputies.management.commands.searchvector import update_sql
 from jarbas.chamber_of_deputies.models import Reimbursement, Tweet
+from jarbas.core.postgres import foreign_keys, indexes, is_postgres, quote, unique_constraints
 
 
 class Command(BaseCommand):
     help = (
         'Load Serenata de Amor reimbursements from a given directory. '
-        '(1) Does a backup of Twitter data to re-link reimbursements; '
-        '(2) Deletes all data from Reimbursement model; '
-        '(3) Loads all reimbursements-YYYY.csv files; '
-        '(4) Loads suspicions.xz file; '
-        '(5) Reload receipt texts; '
-        '(6) Rebuilds the search vector;'
-        '(7) Restores Twitter data.'
+        'With PostgreSQL, the reimbursements table is refreshed without '
+        'downtime: (1) Creates an empty copy of the reimbursements table; '
+        '(2) Loads all reimbursements-YYYY.csv files into it; '
+        '(3) Loads suspicions.xz file into it; '
+        '(4) Reload receipt texts into it; '
+        '(5) Builds its search vector; '
+        '(6) Builds its indexes; '
+        '(7) Re-links tweets and replaces the reimbursements table with it '
+        'in a single transaction. '
+        'Other databases are updated in place: Twitter data is backed up, '
+        'all data from Reimbursement model is deleted before loading the '
+        'same files and then Twitter data is restored.'
     )
     RECEIPT_TEXTS = '2017-02-15-receipts-texts.xz'
     SPACES_URL = 'https://serenata-de-amor-data.nyc3.digitaloceanspaces.com/'
@@ -27,7 +36,170 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         self.path = Path(options['path'])
+        if is_postgres():
+            self.refresh()
+        else:
+            self.update_in_place()
 
+    def refresh(self):
+        """Loads everything into a shadow table while the reimbursements
+        table is still served, and then replaces it."""
+        # (1) Creates an empty copy of the reimbursements table
+        self.create_shadow_table()
+
+        # (2) Loads all reimbursements-YYYY.csv files into it
+        for file in sorted(self.path.glob('reimbursements-*.csv')):
+            print(f'Importing {file}')
+            call_command('reimbursements', file, table=self.shadow)
+
+        # receipt texts are joined on document_id in batches (the definitive
+        # indexes are built after all updates)
+        self.create_lookup_index()
+
+        # (3) Loads suspicions.xz file into it
+        print(f'Importing {self.path / "suspicions.xz"}')
+        call_command('suspicions', self.path / 'suspicions.xz', table=self.shadow)
+
+        # (4) Reload receipt texts into it
+        self.download_receipt_texts()
+        print(f'Importing {self.path / self.RECEIPT_TEXTS}')
+        call_command('receipts_text', self.path / self.RECEIPT_TEXTS, table=self.shadow)
+
+        # (5) Builds its search vector
+        print('Building the search vector')
+        with connection.cursor() as cursor:
+            cursor.execute(update_sql(self.shadow))
+
+        # (6) Builds its indexes
+        print('Building the indexes')
+        self.create_indexes()
+
+        # (7) Re-links tweets and replaces the reimbursements table with it
+        print(f'Replacing {self.table}')
+        self.swap()
+
+    def create_shadow_table(self):
+        self.table = Reimbursement._meta.db_table
+        self.shadow = '{}_shadow'.format(self.table)
+        self.lookup_index = '{}_lookup'.format(self.shadow)
+
+        print(f'Creating {self.shadow}')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(quote(self.shadow)))
+            cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(
+                quote(self.shadow),
+                quote(self.table)
+            ))
+
+    def create_lookup_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE INDEX {} ON {} (document_id)'.format(
+                quote(self.lookup_index),
+                quote(self.shadow)
+            ))
+
+    def create_indexes(self):
+        """Creates the primary key, the unique constraints and the indexes of
+        the reimbursements table in the shadow table (named after the shadow
+        table until they are renamed by `swap`)."""
+        self.index_names, self.constraint_names = {}, {}
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX {}'.format(quote(self.lookup_index)))
+            cursor.execute('VACUUM ANALYZE {}'.format(quote(self.shadow)))
+            cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY (id)'.format(
+                quote(self.shadow),
+                quote('{}_pkey'.format(self.shadow))
+            ))
+            for number, (name, definition) in enumerate(indexes(cursor, self.table)):
+                shadow_name = '{}_{}'.format(self.shadow, number)
+                cursor.execute(self.index_sql(definition, shadow_name, self.shadow))
+                self.index_names[shadow_name] = name
+            for number, (name, definition) in enumerate(unique_constraints(cursor, self.table)):
+                shadow_name = '{}_unique_{}'.format(self.shadow, number)
+                cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(
+                    quote(self.shadow),
+                    quote(shadow_name),
+                    definition
+                ))
+                self.constraint_names[shadow_name] = name
+
+    @staticmethod
+    def index_sql(definition, name, table):
+        """Rewrites the definition of an index (as in `pg_indexes`) to create
+        it with another name on another table."""
+        return re.sub(
+            r'^(CREATE (?:UNIQUE )?INDEX )\S+ ON \S+ ',
+            lambda match: '{}{} ON {} '.format(match.group(1), quote(name), quote(table)),
+            definition,
+            count=1
+        )
+
+    def swap(self):
+        """
+        In a single transaction: points tweets to the reimbursements with
+        the same unique key (`document_id`, `year` and `applicant_id`) in the
+        shadow table (tweets without one are deleted, as they would be with
+        their reimbursement), replaces the
+        reimbursements table with the shadow table (which takes over its
+        sequence) and gives its primary key, indexes and foreign keys the
+        original names (and the ones of its unique constraints).
+        """
+        table, shadow = quote(self.table), quote(self.shadow)
+        tweets = quote(Tweet._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('LOCK TABLE {} IN ACCESS EXCLUSIVE MODE'.format(table))
+
+            keys = foreign_keys(cursor, self.table)
+            for referencing, name, _ in keys:
+                cursor.execute('ALTER TABLE {} DROP CONSTRAINT {}'.format(referencing, quote(name)))
+
+            key, = Reimbursement._meta.unique_together
+            cursor.execute(
+                'UPDATE {tweets} t SET reimbursement_id = n.id FROM {table} o '
+                'JOIN {shadow} n ON {join} WHERE t.reimbursement_id = o.id'.format(
+                    tweets=tweets,
+                    table=table,
+                    shadow=shadow,
+                    join=' AND '.join('n.{0} = o.{0}'.format(quote(column)) for column in key)
+                )
+            )
+            print(f'{cursor.rowcount} tweets re-linked')
+            cursor.execute('DELETE FROM {} WHERE reimbursement_id IN (SELECT id FROM {})'.format(tweets, table))
+
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                [self.table]
+            )
+            primary_key, = cursor.fetchone()
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [self.table, 'id'])
+            sequence, = cursor.fetchone()
+            cursor.execute('ALTER SEQUENCE {} OWNED BY {}.id'.format(sequence, shadow))
+
+            cursor.execute('DROP TABLE {}'.format(table))
+            cursor.execute('ALTER TABLE {} RENAME TO {}'.format(shadow, table))
+            cursor.execute('ALTER TABLE {} RENAME CONSTRAINT {} TO {}'.format(
+                table,
+                quote('{}_pkey'.format(self.shadow)),
+                quote(primary_key)
+            ))
+            for shadow_name, name in self.index_names.items():
+                cursor.execute('ALTER INDEX {} RENAME TO {}'.format(quote(shadow_name), quote(name)))
+            for shadow_name, name in self.constraint_names.items():
+                cursor.execute('ALTER TABLE {} RENAME CONSTRAINT {} TO {}'.format(
+                    table,
+                    quote(shadow_name),
+                    quote(name)
+                ))
+            for referencing, name, definition in keys:
+                cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(referencing, quote(name), definition))
+
+    def download_receipt_texts(self):
+        urlretrieve(
+            f'{self.SPACES_URL}{self.RECEIPT_TEXTS}',
+            self.path / self.RECEIPT_TEXTS
+        )
+
+    def update_in_place(self):
         # (1) Does a backup of Twitter data to re-link reimbursements
         print(f'Backing up {Tweet.objects.count()} tweets')
         with open(self.path / 'tweets.csv', 'w') as fobj:
@@ -52,10 +224,7 @@ class Command(BaseCommand):
         call_command('suspicions', self.path / 'suspicions.xz')
 
         # (5) Reload receipt texts
-        urlretrieve(
-            f'{self.SPACES_URL}{self.RECEIPT_TEXTS}',
-            self.path / self.RECEIPT_TEXTS
-        )
+        self.download_receipt_texts()
         print(f'Importing {self.path / self.RECEIPT_TEXTS}')
         call_command('receipts_text', self.path / self.RECEIPT_TEXTS)
 
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def forwards_func(apps, schema_editor):
+    """Removes the reimbursements repeating the unique key of another one,
+    keeping the first one created (as loading them does)."""
+    Reimbursement = apps.get_model("chamber_of_deputies", "Reimbursement")
+    db_alias = schema_editor.connection.alias
+    repeated = Reimbursement.objects.using(db_alias) \
+        .order_by() \
+        .values('document_id', 'year', 'applicant_id') \
+        .annotate(count=Count('id'), first=Min('id')) \
+        .filter(count__gt=1)
+    for key in repeated.iterator():
+        Reimbursement.objects.using(db_alias) \
+            .filter(document_id=key['document_id'], year=key['year'], applicant_id=key['applicant_id']) \
+            .exclude(id=key['first']) \
+            .delete()
+
+
+def reverse_func(*args, **kwargs):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamber_of_deputies', '0012_make_party_field_longer'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards_func, reverse_func),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.1.7 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chamber_of_deputies', '0013_remove_repeated_reimbursements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reimbursement',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=32, null=True, verbose_name='Hash do Conteúdo'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reimbursement',
+            unique_together={('document_id', 'year', 'applicant_id')},
+        ),
+    ]
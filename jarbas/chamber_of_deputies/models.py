@@ -105,6 +105,7 @@ class Reimbursement(models.Model):
     receipt_text = models.TextField('Texto do Recibo', blank=True, null=True)
 
     search_vector = SearchVectorField(null=True)
+    content_hash = models.CharField('Hash do Conteúdo', max_length=32, blank=True, null=True)
 
     objects = models.Manager.from_queryset(ReimbursementQuerySet)()
 
@@ -113,6 +114,7 @@ class Reimbursement(models.Model):
         verbose_name = 'reembolso'
         verbose_name_plural = 'reembolsos'
         index_together = [['year', 'issue_date', 'id']]
+        unique_together = [['document_id', 'year', 'applicant_id']]
         indexes = [GinIndex(fields=['search_vector'])]
 
     def get_receipt_url(self, force=False, bulk=False):
@@ -34,9 +34,10 @@ TYPES = tuple(chain(
 ))
 
 
-def serialize(row):
-    """Read the dict generated by the reimbursement command and returns a
-    Reimbursement model instance."""
+def deserialize(row):
+    """Read the dict generated by the reimbursement command and returns it
+    with the values converted to the types of the Reimbursement fields, or
+    None if it has no issue date."""
     for key, type_ in TYPES:
         value = row.get(key)
         row[key] = type_.deserialize(value)
@@ -45,4 +46,12 @@ def serialize(row):
         row[field] = row[field] if row[field] else 0.0
 
     if row['issue_date']:
+        return row
+
+
+def serialize(row):
+    """Read the dict generated by the reimbursement command and returns a
+    Reimbursement model instance."""
+    row = deserialize(row)
+    if row:
         return Reimbursement(**row)
@@ -1,10 +1,13 @@
 from io import StringIO
+from unittest import skipUnless
 from unittest.mock import Mock, call, patch
 
 from django.test import TestCase
+from mixer.backend.django import mixer
 
 from jarbas.chamber_of_deputies.management.commands.receipts_text import Command
 from jarbas.chamber_of_deputies.models import Reimbursement
+from jarbas.core.postgres import is_postgres
 
 
 class TestCommand(TestCase):
@@ -41,47 +44,49 @@ class TestSerializer(TestCommand):
 
 class TestCustomMethods(TestCommand):
 
+    def setUp(self):
+        super().setUp()
+        self.command.table = Reimbursement._meta.db_table
+        for document_id in (1, 2):
+            mixer.blend(Reimbursement, search_vector=None, document_id=document_id, receipt_text=None)
+        self.batch = [
+            {'document_id': 1, 'receipt_text': 'lorem'},
+            {'document_id': 1, 'receipt_text': 'lorem ipsum'},
+            {'document_id': 3, 'receipt_text': 'dolor'},
+            {'document_id': None, 'receipt_text': 'sit amet'}
+        ]
+
+    def assert_updated(self):
+        self.assertEqual(1, self.command.count)
+        texts = dict(Reimbursement.objects.values_list('document_id', 'receipt_text'))
+        self.assertEqual({1: 'lorem ipsum', 2: None}, texts)
+
     @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.Command.receipts')
-    @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.Command.schedule_update')
     @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.Command.update')
-    def test_main(self, update, schedule_update, receipts):
+    @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.is_postgres', return_value=False)
+    @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.print')
+    def test_main(self, print_, is_postgres, update, receipts):
         receipts.return_value = (range(21), range(21, 43))
         self.command.main()
-        update.assert_has_calls([call()] * 2)
-        schedule_update.assert_has_calls(call(i) for i in range(42))
-
-    @patch.object(Reimbursement.objects, 'get')
-    def test_schedule_update_existing_record(self, get):
-        reimbursement = Reimbursement()
-        get.return_value = reimbursement
-        content = {
-            'document_id': 42,
-            'receipt_text': 'lorem ipsum'
-        }
-        self.command.queue = []
-        self.command.schedule_update(content)
-        get.assert_called_once_with(document_id=42)
-        self.assertEqual(content['receipt_text'], reimbursement.receipt_text)
-
-    @patch.object(Reimbursement.objects, 'get')
-    def test_schedule_update_non_existing_record(self, get):
-        get.side_effect = Reimbursement.DoesNotExist
-        content = {'document_id': 42}
-        self.command.queue = []
-        self.command.schedule_update(content)
-        get.assert_called_once_with(document_id=42)
-        self.assertEqual([], self.command.queue)
-
-    @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.bulk_update')
+        update.assert_has_calls([call(range(21)), call(range(21, 43))])
+
+    @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.Command.receipts')
+    @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.Command.copy_batch')
+    @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.is_postgres', return_value=True)
     @patch('jarbas.chamber_of_deputies.management.commands.receipts_text.print')
-    def test_update(self, print_, bulk_update):
-        self.command.count = 40
-        self.command.queue = list(range(2))
-        self.command.update()
-        fields = ['receipt_text',]
-        bulk_update.assert_called_with([0, 1], update_fields=fields)
-        print_.assert_called_with('42 reimbursements updated.', end='\r')
-        self.assertEqual(42, self.command.count)
+    def test_main_with_postgres(self, print_, is_postgres, copy_batch, receipts):
+        receipts.return_value = (range(21), range(21, 43))
+        self.command.main()
+        copy_batch.assert_has_calls([call(range(21)), call(range(21, 43))])
+
+    def test_update(self):
+        self.command.update(self.batch)
+        self.assert_updated()
+
+    @skipUnless(is_postgres(), 'COPY requires PostgreSQL')
+    def test_copy_batch(self):
+        self.command.copy_batch(self.batch)
+        self.assert_updated()
 
 
 class TestConventionMethods(TestCommand):
@@ -140,4 +145,4 @@ class TestAddArguments(TestCase):
     def test_add_arguments(self):
         mock = Mock()
         Command().add_arguments(mock)
-        self.assertEqual(2, mock.add_argument.call_count)
+        self.assertEqual(3, mock.add_argument.call_count)
@@ -1,12 +1,26 @@
 import os
 from datetime import date
+from tempfile import NamedTemporaryFile
+from unittest import skipUnless
 from unittest.mock import Mock, PropertyMock, call, patch
 
 from django.conf import settings
+from django.core.management.base import CommandError
 from django.test import TestCase
 
 from jarbas.chamber_of_deputies.management.commands.reimbursements import Command
 from jarbas.chamber_of_deputies.models import Reimbursement
+from jarbas.core.postgres import is_postgres
+
+
+FIXTURE = os.path.join(
+    settings.BASE_DIR,
+    'jarbas',
+    'core',
+    'tests',
+    'fixtures',
+    'reimbursements.csv'
+)
 
 
 class TestCommand(TestCase):
@@ -22,55 +36,133 @@ class TestCreateBatches(TestCommand):
     @patch.object(Command, 'reimbursements', new_callable=PropertyMock)
     @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.print')
     def test_create_batches(self, print_, reimbursements, bulk_create, print_count):
-        reimbursements.return_value = (1, 2, 3)
+        reimbursements.return_value = [
+            Reimbursement(document_id=document_id, year=2018, applicant_id=1)
+            for document_id in (1, 2, 1, 3)
+        ]
+        first, second, _, third = reimbursements.return_value
         self.command.batch_size = 2
-        self.command.batch = []
+        self.command.batch, self.command.count = [], 0
         self.command.create_batches()
         bulk_create.assert_has_calls((
-            call([1, 2]),
-            call([3])
+            call([first, second]),
+            call([third])
         ))
+        self.assertEqual(3, self.command.count)
 
 
 class TestConventionMethods(TestCommand):
 
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.is_postgres', return_value=False)
     @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.Command.create_batches')
     @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.Command.drop_all')
-    def test_handler_with_options(self, drop_all, create):
+    def test_handler_with_options(self, drop_all, create, is_postgres):
         self.command.handle(dataset='reimbursements.xz')
         self.assertEqual('reimbursements.xz', self.command.path)
         self.assertEqual(4096, self.command.batch_size)
         create.assert_called_once_with()
 
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.is_postgres', return_value=False)
     @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.Command.create_batches')
     @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.Command.drop_all')
-    def test_handler_with_options(self, drop_all, create):
+    def test_handler_with_options(self, drop_all, create, is_postgres):
         self.command.handle(dataset='foobar.xz', batch_size=2)
         self.assertEqual('foobar.xz', self.command.path)
         self.assertEqual(2, self.command.batch_size)
         create.assert_called_once_with()
 
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.is_postgres', return_value=True)
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.Command.copy')
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.Command.create_batches')
+    def test_handler_with_postgres(self, create, copy, is_postgres):
+        self.command.handle(dataset='foobar.xz')
+        copy.assert_called_once_with()
+        create.assert_not_called()
+
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.is_postgres', return_value=False)
+    def test_handler_sync_without_postgres(self, is_postgres):
+        with self.assertRaises(CommandError):
+            self.command.handle(dataset='foobar.xz', sync=True)
+
+
+class TestCopy(TestCommand):
+
+    def test_columns(self):
+        columns = self.command.columns(('document_id', 'year', 'unknown'))
+        self.assertEqual(['document_id', 'year'], columns[:2])
+        self.assertNotIn('unknown', columns)
+        self.assertIn('total_value', columns)
+
+    @skipUnless(is_postgres(), 'COPY requires PostgreSQL')
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.print')
+    def test_copy(self, print_):
+        self.command.path = FIXTURE
+        self.command.table = Reimbursement._meta.db_table
+        self.command.sync = False
+        self.command.copy()
+        self.assertEqual(1, self.command.count)
+        reimbursement = Reimbursement.objects.get(document_id=6657248)
+        self.assertEqual(['6369'], reimbursement.numbers)
+        self.assertEqual(date(2018, 8, 15), reimbursement.issue_date)
+        self.assertEqual('LUIZ LAURO FILHO', reimbursement.congressperson_name)
+        self.assertFalse(reimbursement.receipt_fetched)
+        self.assertIsNotNone(reimbursement.last_update)
+        self.assertEqual(32, len(reimbursement.content_hash))
+
+    @skipUnless(is_postgres(), 'COPY requires PostgreSQL')
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.print')
+    def test_copy_with_repeated_keys(self, print_):
+        with open(FIXTURE) as fobj:
+            header, row, *_ = fobj.read().splitlines()
+        with NamedTemporaryFile('w', suffix='.csv') as dataset:
+            dataset.write('\n'.join((header, row, row.replace('LUIZ LAURO FILHO', 'LUIZ LAURO'))))
+            dataset.flush()
+            self.command.path = dataset.name
+            self.command.table = Reimbursement._meta.db_table
+            self.command.sync = False
+            self.command.copy()
+        self.assertEqual(1, self.command.count)
+        self.assertEqual('LUIZ LAURO FILHO', Reimbursement.objects.get().congressperson_name)
+        print_.assert_called_once_with('1 repeated reimbursements skipped.')
+
+    @skipUnless(is_postgres(), 'COPY requires PostgreSQL')
+    @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.print')
+    def test_sync(self, print_):
+        self.command.path = FIXTURE
+        self.command.table = Reimbursement._meta.db_table
+        self.command.sync = True
+        self.command.copy()
+        self.assertEqual(1, self.command.count)
+
+        receipt_url = 'https://www.camara.leg.br/'
+        Reimbursement.objects.update(receipt_url=receipt_url, receipt_fetched=True)
+        self.command.copy()
+        self.assertEqual(0, self.command.count)
+        self.assertEqual(receipt_url, Reimbursement.objects.get().receipt_url)
+
+        Reimbursement.objects.update(supplier='Acme', content_hash='outdated')
+        self.command.copy()
+        self.assertEqual(1, self.command.count)
+        reimbursement = Reimbursement.objects.get()
+        self.assertEqual('POSTO AVENIDA NOSSA SENHORA DE FÁTIMA CAMPINAS LTDA', reimbursement.supplier)
+        self.assertIsNone(reimbursement.receipt_url)
+        self.assertFalse(reimbursement.receipt_fetched)
+        self.assertIsNone(reimbursement.search_vector)
+
 
 class TestAddArguments(TestCase):
 
     def test_add_arguments(self):
         parser = Mock()
         Command().add_arguments(parser)
-        self.assertEqual(3, parser.add_argument.call_count)
+        self.assertEqual(5, parser.add_argument.call_count)
 
 
 class TestFileLoader(TestCommand):
 
     @patch('jarbas.chamber_of_deputies.management.commands.reimbursements.print')
     def test_reimbursement_property(self, print_):
-        self.command.path = os.path.join(
-            settings.BASE_DIR,
-            'jarbas',
-            'core',
-            'tests',
-            'fixtures',
-            'reimbursements.csv'
-        )
+        self.command.path = FIXTURE
         result, *_ = tuple(self.command.reimbursements)
         expected = Reimbursement(
             applicant_id=3052,
@@ -1,10 +1,15 @@
-from io import StringIO
+import json
+import struct
+from io import BytesIO, StringIO
+from unittest import skipUnless
 from unittest.mock import Mock, call, patch
 
 from django.test import TestCase
+from mixer.backend.django import mixer
 
 from jarbas.chamber_of_deputies.management.commands.suspicions import Command
 from jarbas.chamber_of_deputies.models import Reimbursement
+from jarbas.core.postgres import is_postgres
 
 
 class TestCommand(TestCase):
@@ -70,51 +75,54 @@ class TestSerializer(TestCommand):
 
 class TestCustomMethods(TestCommand):
 
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.suspicions')
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.schedule_update')
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.update')
-    def test_main(self, update, schedule_update, suspicions):
-        suspicions.return_value = (range(21), range(21, 43))
-        self.command.workers = 8
-        self.command.main()
-        update.assert_has_calls([call()] * 2)
-        schedule_update.assert_has_calls(call(i) for i in range(42))
-
-    @patch.object(Reimbursement.objects, 'get')
-    def test_schedule_update_existing_record(self, get):
-        reimbursement = Reimbursement()
-        get.return_value = reimbursement
-        content = {
-            'document_id': 42,
-            'probability': 0.618,
-            'suspicions': {'answer': 42}
-        }
-        self.command.queue = []
-        self.command.schedule_update(content)
-        get.assert_called_once_with(document_id=42)
-        self.assertEqual(0.618, reimbursement.probability)
-        self.assertEqual({'answer': 42}, reimbursement.suspicions)
-        self.assertEqual([reimbursement], self.command.queue)
-
-    @patch.object(Reimbursement.objects, 'get')
-    def test_schedule_update_non_existing_record(self, get):
-        get.side_effect = Reimbursement.DoesNotExist
-        content = {'document_id': 42}
-        self.command.queue = []
-        self.command.schedule_update(content)
-        get.assert_called_once_with(document_id=42)
-        self.assertEqual([], self.command.queue)
-
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.bulk_update')
+    def setUp(self):
+        super().setUp()
+        self.command.batch_size = 2
+        self.command.table = Reimbursement._meta.db_table
+        self.command.matched = self.command.unmatched = self.command.duplicates = 0
+        for document_id in (1, 2, 3, 4, 4):
+            mixer.blend(Reimbursement, search_vector=None, document_id=document_id,
+                        probability=None, suspicions=None)
+
+    def rows(self):
+        return (
+            {'document_id': '1', 'hypothesis_1': 'True', 'probability': '0.5'},
+            {'document_id': '2', 'hypothesis_1': 'False', 'probability': '0.1'},
+            {'document_id': '3', 'hypothesis_1': 'True', 'probability': '0.9'},
+            {'document_id': '3', 'hypothesis_1': 'False', 'probability': '0.2'},
+            {'document_id': '4', 'hypothesis_1': 'True', 'probability': '0.7'},
+            {'document_id': '5', 'hypothesis_1': 'True', 'probability': '0.8'},
+            {'document_id': '', 'hypothesis_1': 'True', 'probability': '0.8'}
+        )
+
+    def assert_updated(self):
+        self.assertEqual(2, self.command.matched)
+        self.assertEqual(2, self.command.unmatched)
+        self.assertEqual(3, self.command.duplicates)
+
+        first = Reimbursement.objects.get(document_id=1)
+        self.assertEqual({'hypothesis_1': True}, first.suspicions)
+        self.assertAlmostEqual(0.5, float(first.probability))
+        second = Reimbursement.objects.get(document_id=2)
+        self.assertIsNone(second.suspicions)
+        self.assertAlmostEqual(0.1, float(second.probability))
+        for document_id in (3, 4):
+            for reimbursement in Reimbursement.objects.filter(document_id=document_id):
+                with self.subTest():
+                    self.assertIsNone(reimbursement.suspicions)
+                    self.assertIsNone(reimbursement.probability)
+
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.print')
-    def test_update(self, print_, bulk_update):
-        self.command.count = 40
-        self.command.queue = list(range(2))
-        self.command.update()
-        fields = ['probability', 'suspicions']
-        bulk_update.assert_called_with([0, 1], update_fields=fields)
-        print_.assert_called_with('42 reimbursements updated.', end='\r')
-        self.assertEqual(42, self.command.count)
+    def test_update_in_batches(self, print_):
+        with patch.object(Command, 'rows', return_value=self.rows()):
+            self.command.update_in_batches()
+        self.assert_updated()
+
+    @skipUnless(is_postgres(), 'COPY requires PostgreSQL')
+    def test_copy(self):
+        with patch.object(Command, 'rows', return_value=self.rows()):
+            self.command.copy()
+        self.assert_updated()
 
     def test_bool(self):
         self.assertTrue(self.command.bool('True'))
@@ -134,55 +142,82 @@ class TestCustomMethods(TestCommand):
 
 class TestConventionMethods(TestCommand):
 
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.suspicions')
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.main')
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.is_postgres', return_value=True)
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.update_in_batches')
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.copy')
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.os.path.exists')
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.print')
-    def test_handler_with_options(self, print_, exists, main, suspicions):
-        self.command.handle(dataset='suspicions.xz', batch_size=42, workers=7)
-        main.assert_called_once_with()
-        print_.assert_called_once_with('0 reimbursements updated.')
+    def test_handler_with_options(self, print_, exists, copy, update_in_batches, is_postgres):
+        self.command.handle(dataset='suspicions.xz', batch_size=42)
+        copy.assert_called_once_with()
+        update_in_batches.assert_not_called()
+        print_.assert_has_calls((
+            call('0 reimbursements updated.'),
+            call('0 suspicions without a reimbursement.'),
+            call('0 suspicions skipped as duplicates.')
+        ))
         self.assertEqual(self.command.path, 'suspicions.xz')
         self.assertEqual(self.command.batch_size, 42)
-        self.assertEqual(self.command.workers, 7)
 
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.suspicions')
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.main')
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.is_postgres', return_value=False)
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.update_in_batches')
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.copy')
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.os.path.exists')
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.print')
-    def test_handler_without_options(self, print_, exists, main, suspicions):
-        self.command.handle(dataset='suspicions.xz', batch_size=4096, workers=8)
-        main.assert_called_once_with()
-        print_.assert_called_once_with('0 reimbursements updated.')
-        self.assertEqual(self.command.path, 'suspicions.xz')
+    def test_handler_without_postgres(self, print_, exists, copy, update_in_batches, is_postgres):
+        self.command.handle(dataset='suspicions.xz', batch_size=4096)
+        update_in_batches.assert_called_once_with()
+        copy.assert_not_called()
         self.assertEqual(self.command.batch_size, 4096)
-        self.assertEqual(self.command.workers, 8)
 
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.suspicions')
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.main')
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.copy')
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.os.path.exists')
-    def test_handler_with_non_existing_file(self, exists, update, suspicions):
+    def test_handler_with_non_existing_file(self, exists, copy):
         exists.return_value = False
         with self.assertRaises(FileNotFoundError):
-            self.command.handle(dataset='suspicions.xz', batch_size=4096, workers=8)
-        update.assert_not_called()
+            self.command.handle(dataset='suspicions.xz', batch_size=4096)
+        copy.assert_not_called()
 
 
 class TestFileLoader(TestCommand):
 
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.print')
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.lzma')
     @patch('jarbas.chamber_of_deputies.management.commands.suspicions.csv.DictReader')
-    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.Command.serialize')
-    def test_suspicions(self, serialize, rows, lzma, print_):
-        serialize.return_value = '.'
-        lzma.return_value = StringIO()
-        rows.return_value = range(42)
-        self.command.batch_size = 10
+    def test_rows(self, rows, lzma):
+        lzma.open.return_value = StringIO()
+        rows.return_value = iter(({'document_id': '42'},))
         self.command.path = 'suspicions.xz'
-        expected = [['.'] * 10, ['.'] * 10, ['.'] * 10, ['.'] * 10, ['.'] * 2]
-        self.assertEqual(expected, list(self.command.suspicions()))
-        self.assertEqual(42, serialize.call_count)
+        self.assertEqual([{'document_id': '42'}], list(self.command.rows()))
+
+    def test_columnar_rows(self):
+        columns = (
+            ('applicant_id', 'json', json.dumps(['1', None]).encode('utf-8')),
+            ('document_id', 'int64', struct.pack('<2q', 42, 43)),
+            ('hypothesis_1', 'bits', bytes((0b01000000,)))
+        )
+        header = {
+            'format': 'rosie-columnar',
+            'version': 1,
+            'rows': 2,
+            'columns': [
+                {'name': name, 'type': kind, 'size': len(data)}
+                for name, kind, data in columns
+            ]
+        }
+        block = json.dumps(header).encode('utf-8') + b'\n' + \
+            b''.join(data for *_, data in columns)
+        expected = [
+            {'applicant_id': '1', 'document_id': '42', 'hypothesis_1': 'False'},
+            {'applicant_id': '', 'document_id': '43', 'hypothesis_1': 'True'}
+        ] * 2
+        rows = self.command.columnar_rows(BytesIO(block * 2))
+        self.assertEqual(expected, list(rows))
+
+    @patch('jarbas.chamber_of_deputies.management.commands.suspicions.zstandard', None)
+    def test_open_zstd_dataset_without_zstandard(self):
+        self.command.path = 'suspicions.columns.zst'
+        with self.assertRaises(ImportError):
+            self.command.open_dataset()
 
 
 class TestAddArguments(TestCase):
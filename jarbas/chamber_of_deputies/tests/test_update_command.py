@@ -0,0 +1,147 @@
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import Mock, call, patch
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from mixer.backend.django import mixer
+
+from jarbas.chamber_of_deputies.management.commands.update import Command
+from jarbas.chamber_of_deputies.models import Reimbursement, Tweet
+from jarbas.core.postgres import foreign_keys, indexes, is_postgres, quote, unique_constraints
+
+
+class TestCommand(TestCase):
+
+    def setUp(self):
+        self.command = Command()
+
+
+class TestConventionMethods(TestCommand):
+
+    @patch('jarbas.chamber_of_deputies.management.commands.update.is_postgres', return_value=True)
+    @patch.object(Command, 'update_in_place')
+    @patch.object(Command, 'refresh')
+    def test_handler_with_postgres(self, refresh, update_in_place, is_postgres):
+        self.command.handle(path='/tmp/serenata-data')
+        self.assertEqual(Path('/tmp/serenata-data'), self.command.path)
+        refresh.assert_called_once_with()
+        update_in_place.assert_not_called()
+
+    @patch('jarbas.chamber_of_deputies.management.commands.update.is_postgres', return_value=False)
+    @patch.object(Command, 'update_in_place')
+    @patch.object(Command, 'refresh')
+    def test_handler_without_postgres(self, refresh, update_in_place, is_postgres):
+        self.command.handle(path='/tmp/serenata-data')
+        update_in_place.assert_called_once_with()
+        refresh.assert_not_called()
+
+
+class TestRefresh(TestCommand):
+
+    @patch('jarbas.chamber_of_deputies.management.commands.update.print')
+    @patch('jarbas.chamber_of_deputies.management.commands.update.connection')
+    @patch('jarbas.chamber_of_deputies.management.commands.update.call_command')
+    @patch.object(Command, 'download_receipt_texts')
+    @patch.object(Command, 'create_indexes')
+    @patch.object(Command, 'swap')
+    @patch.object(Path, 'glob')
+    def test_refresh_loads_the_shadow_table(self, glob, swap, create_indexes, download, call_command,
+                                            connection, print_):
+        glob.return_value = (Path('reimbursements-2010.csv'), Path('reimbursements-2009.csv'))
+        self.command.path = Path('data')
+        self.command.refresh()
+
+        shadow = 'chamber_of_deputies_reimbursement_shadow'
+        call_command.assert_has_calls((
+            call('reimbursements', Path('reimbursements-2009.csv'), table=shadow),
+            call('reimbursements', Path('reimbursements-2010.csv'), table=shadow),
+            call('suspicions', Path('data') / 'suspicions.xz', table=shadow),
+            call('receipts_text', Path('data') / Command.RECEIPT_TEXTS, table=shadow)
+        ))
+        create_indexes.assert_called_once_with()
+        swap.assert_called_once_with()
+
+    def test_index_sql(self):
+        definition = (
+            'CREATE INDEX chamber_of_deputies_reimbursement_year_6a9b0d1e '
+            'ON public.chamber_of_deputies_reimbursement USING btree (year)'
+        )
+        expected = 'CREATE INDEX "shadow_0" ON "shadow" USING btree (year)'
+        self.assertEqual(expected, Command.index_sql(definition, 'shadow_0', 'shadow'))
+
+        definition = 'CREATE UNIQUE INDEX foo ON bar USING gin (search_vector)'
+        expected = 'CREATE UNIQUE INDEX "shadow_1" ON "shadow" USING gin (search_vector)'
+        self.assertEqual(expected, Command.index_sql(definition, 'shadow_1', 'shadow'))
+
+
+@skipUnless(is_postgres(), 'Refreshing requires PostgreSQL')
+class TestSwap(TransactionTestCase):
+    """Refreshes the reimbursements table with a shadow table holding the
+    same reimbursements (with new ids) and replaces it (as the VACUUM of
+    `create_indexes` cannot run in a transaction, neither can the test)."""
+
+    def setUp(self):
+        self.command = Command()
+        self.table = Reimbursement._meta.db_table
+
+    def schema(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+                [self.table]
+            )
+            primary_key, = cursor.fetchone()
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [self.table, 'id'])
+            sequence, = cursor.fetchone()
+            return {
+                'primary_key': primary_key,
+                'sequence': sequence,
+                'indexes': sorted(name for name, _ in indexes(cursor, self.table)),
+                'unique_constraints': sorted(name for name, _ in unique_constraints(cursor, self.table)),
+                'foreign_keys': sorted(name for _, name, _ in foreign_keys(cursor, self.table))
+            }
+
+    @patch('jarbas.chamber_of_deputies.management.commands.update.print')
+    def test_swap(self, print_):
+        mixer.blend(Reimbursement, search_vector=None, document_id=42, year=2017, applicant_id=1)
+        tweeted = mixer.blend(Reimbursement, search_vector=None, document_id=42, year=2018, applicant_id=1)
+        mixer.blend(Tweet, status=42, reimbursement=tweeted)
+        ids = set(Reimbursement.objects.values_list('id', flat=True))
+        schema = self.schema()
+
+        self.command.create_shadow_table()
+        columns = ', '.join(
+            quote(field.column)
+            for field in Reimbursement._meta.concrete_fields
+            if field.column != 'id'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO {} ({columns}) SELECT {columns} FROM {} ORDER BY id DESC'.format(
+                quote(self.command.shadow),
+                quote(self.table),
+                columns=columns
+            ))
+        self.command.create_lookup_index()
+        self.command.create_indexes()
+        self.command.swap()
+
+        self.assertEqual(2, Reimbursement.objects.count())
+        self.assertFalse(ids & set(Reimbursement.objects.values_list('id', flat=True)))
+        reimbursement = Tweet.objects.get().reimbursement
+        self.assertEqual((42, 2018, 1), (reimbursement.document_id, reimbursement.year, reimbursement.applicant_id))
+        self.assertEqual(schema, self.schema())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s)', [self.command.shadow])
+            self.assertEqual((None,), cursor.fetchone())
+
+        created = mixer.blend(Reimbursement, search_vector=None)
+        self.assertGreater(created.id, max(Reimbursement.objects.exclude(id=created.id).values_list('id', flat=True)))
+
+
+class TestAddArguments(TestCase):
+
+    def test_add_arguments(self):
+        mock = Mock()
+        Command().add_arguments(mock)
+        self.assertEqual(1, mock.add_argument.call_count)
@@ -0,0 +1,131 @@
+import json
+from datetime import date
+
+from django.db import connection
+
+
+def is_postgres():
+    """Whether the default database is PostgreSQL (e.g. not SQLite)."""
+    return connection.vendor == 'postgresql'
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def create_staging_table(cursor, name, table, columns):
+    """Creates a temporary table with the `columns` (and their types) of
+    `table`, dropped at the end of the transaction (or replaced when created
+    again in the same transaction)."""
+    cursor.execute('DROP TABLE IF EXISTS pg_temp.{}'.format(quote(name)))
+    cursor.execute('CREATE TEMPORARY TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA'.format(
+        quote(name),
+        ', '.join(quote(column) for column in columns),
+        quote(table)
+    ))
+
+
+def copy(cursor, table, columns, rows):
+    """Loads `rows` (sequences of values in the order of `columns`) into
+    `table` with `COPY FROM STDIN`. Returns the number of rows loaded."""
+    stream = CopyStream(rows)
+    cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(
+        quote(table),
+        ', '.join(quote(column) for column in columns)
+    ), stream)
+    return stream.count
+
+
+class CopyStream:
+    """
+    File-like object reading rows in PostgreSQL `COPY` text format as
+    `cursor.copy_expert` asks for them, so the rows are never all in memory.
+
+    Values are encoded as `COPY` expects them: `None` as null, lists as
+    arrays, dicts as JSON and dates in ISO format.
+    """
+
+    ESCAPES = str.maketrans({'\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t'})
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = b''
+        self.count = 0
+
+    def read(self, size=-1):
+        lines = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = ('\t'.join(self.encode(value) for value in row) + '\n').encode('utf-8')
+            lines.append(line)
+            length += len(line)
+            self.count += 1
+
+        data = b''.join(lines)
+        if size < 0:
+            size = len(data)
+        self.buffer = data[size:]
+        return data[:size]
+
+    @classmethod
+    def encode(cls, value):
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, (list, tuple)):
+            value = cls.array(value)
+        elif isinstance(value, dict):
+            value = json.dumps(value)
+        elif isinstance(value, date):
+            value = value.isoformat()
+        return str(value).translate(cls.ESCAPES)
+
+    @staticmethod
+    def array(values):
+        elements = []
+        for value in values:
+            if value is None:
+                elements.append('NULL')
+                continue
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            elements.append('"{}"'.format(value))
+        return '{' + ','.join(elements) + '}'
+
+
+def indexes(cursor, table):
+    """Returns the name and the definition of each index of `table`, except
+    the ones backing a constraint (e.g. the primary key)."""
+    cursor.execute(
+        'SELECT indexname, indexdef FROM pg_indexes '
+        'WHERE schemaname = current_schema() AND tablename = %s '
+        'AND indexname NOT IN ('
+        'SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)',
+        [table, table]
+    )
+    return cursor.fetchall()
+
+
+def foreign_keys(cursor, table):
+    """Returns the table, the name and the definition of each foreign key
+    referencing `table`."""
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) "
+        "FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'",
+        [table]
+    )
+    return cursor.fetchall()
+
+
+def unique_constraints(cursor, table):
+    """Returns the name and the definition of each unique constraint of
+    `table`."""
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'u'",
+        [table]
+    )
+    return cursor.fetchall()
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.test import TestCase
+
+from jarbas.core.postgres import CopyStream
+
+
+class TestCopyStream(TestCase):
+
+    def test_encode(self):
+        values = (
+            (None, '\\N'),
+            (True, 't'),
+            (False, 'f'),
+            (42, '42'),
+            (4.2, '4.2'),
+            (date(2018, 8, 15), '2018-08-15'),
+            ('tab\tnew\nline\\', 'tab\\tnew\\nline\\\\'),
+            (['6369', None, 'a"b'], '{"6369",NULL,"a\\\\"b"}'),
+            ({'meal_price_outlier': True}, '{"meal_price_outlier": true}')
+        )
+        for value, expected in values:
+            with self.subTest():
+                self.assertEqual(expected, CopyStream.encode(value))
+
+    def test_read(self):
+        stream = CopyStream(((1, 'one'), (2, None)))
+        self.assertEqual(b'1\tone\n2\t\\N\n', stream.read())
+        self.assertEqual(b'', stream.read())
+        self.assertEqual(2, stream.count)
+
+    def test_read_in_chunks(self):
+        stream = CopyStream((number, 'ção') for number in range(100))
+        chunks = list(iter(lambda: stream.read(7), b''))
+        self.assertTrue(all(len(chunk) <= 7 for chunk in chunks))
+        expected = ''.join(f'{number}\tção\n' for number in range(100))
+        self.assertEqual(expected, b''.join(chunks).decode('utf-8'))
+        self.assertEqual(100, stream.count)
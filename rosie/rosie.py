@@ -5,21 +5,52 @@ I'm a proof-of-concept for the usage of artificial intelligence for social
 control of public administration.
 
 Usage:
-  rosie.py run (chamber_of_deputies|federal_senate) [--output=<directory>]
+  rosie.py run (chamber_of_deputies|federal_senate) [--output=<directory>] [--workers=<number>] [--incremental] [--chunk-size=<rows>] [--format=<format>] [--compression=<type>] [--years=<years>] [--offline] [--classifiers=<names>] [--backend=<backend>] [--uncompressed-models]
+  rosie.py models (list|prune) [--output=<directory>] [--max-size=<megabytes>]
+  rosie.py benchmark [--output=<directory>] [--rows=<numbers>] [--repeat=<number>]
   rosie.py test [chamber_of_deputies|federal_senate|core]
 
 Options:
   --help                Show this screen
   --output=<directory>  Output directory [default: /tmp/serenata-data]
+  --workers=<number>    Number of classifiers running in parallel (defaults to
+                        the number of CPUs)
+  --incremental         Analyze only what changed since the last run
+  --chunk-size=<rows>   Analyze and save the dataset in chunks of about this
+                        number of rows
+  --format=<format>     Format of the suspicions file, csv or columnar
+                        [default: csv]
+  --compression=<type>  Compression of the suspicions file, xz or zstd
+                        [default: xz]
+  --years=<years>       Comma-separated years (or ranges, e.g. 2009-2012) of
+                        the reimbursements to update and analyze
+  --offline             Do not download anything, use the datasets already in
+                        the output directory
+  --classifiers=<names>  Comma-separated names of the classifiers to run (the
+                        suspicions of the others are kept from the last run,
+                        not with --incremental)
+  --backend=<backend>   How the dataset is processed, pandas (in memory) or
+                        dask (in partitions) [default: pandas]
+  --uncompressed-models  Store trained models uncompressed, so they are
+                        memory-mapped when loaded (faster to load, larger)
+  --max-size=<megabytes>  Size of the most recently used models kept when
+                        pruning [default: 1024]
+  --rows=<numbers>      Comma-separated sizes of the synthetic datasets
+                        [default: 10000,100000,1000000,5000000]
+  --repeat=<number>     Times each classifier runs (the fastest is kept)
+                        [default: 3]
 """
 import os
 import unittest
+from datetime import datetime
 
 from docopt import docopt
 
 import rosie
+import rosie.benchmarks
 import rosie.chamber_of_deputies
 import rosie.federal_senate
+from rosie.core.models import ModelStore
 
 
 def get_module(arguments):
@@ -29,9 +60,48 @@ def get_module(arguments):
             return module
 
 
-def run(module, directory):
+def get_years(years):
+    """Parses comma-separated years or ranges of years (e.g. 2009-2012)."""
+    if not years:
+        return None
+
+    parsed = set()
+    for value in years.split(','):
+        first, _, last = value.partition('-')
+        parsed.update(range(int(first), int(last or first) + 1))
+    return sorted(parsed)
+
+
+def run(module, directory, workers=None, incremental=False, chunk_size=None,
+        output_format='csv', compression='xz', years=None, offline=False,
+        classifiers=None, backend='pandas', uncompressed_models=False):
     module = getattr(rosie, module)
-    module.main(directory)
+    workers = int(workers) if workers else os.cpu_count()
+    chunk_size = int(chunk_size) if chunk_size else None
+    classifiers = classifiers.split(',') if classifiers else None
+    module.main(directory, workers, incremental, chunk_size, output_format,
+                compression, get_years(years), offline, classifiers, backend,
+                not uncompressed_models)
+
+
+def models(directory, prune=False, max_size=ModelStore.MAX_SIZE // 2 ** 20):
+    store = ModelStore(os.path.join(directory, 'models'))
+    entries = store.prune(int(max_size) * 2 ** 20) if prune else store.entries()
+    for entry in entries:
+        last_used = datetime.fromtimestamp(entry['last_used'])
+        print('{:<12} {:<34} {:>8.1f} KB  {:%Y-%m-%d %H:%M}  {}'.format(
+            'Removed' if prune else entry['key'][:12],
+            entry['classifier'],
+            entry['size'] / 2 ** 10,
+            last_used,
+            entry['data'][:12]
+        ))
+
+
+def benchmark(directory, rows, repeat):
+    scales = tuple(int(number) for number in rows.split(','))
+    path = rosie.benchmarks.main(directory, scales, int(repeat))
+    print(f'Benchmark saved as {path}')
 
 
 def test(module=None):
@@ -55,9 +125,28 @@ def main():
     if arguments['test']:
         test(module)
 
+    if arguments['models']:
+        models(arguments['--output'], arguments['prune'], arguments['--max-size'])
+
+    if arguments['benchmark']:
+        benchmark(arguments['--output'], arguments['--rows'], arguments['--repeat'])
+
     if arguments['run']:
         module = module if module != 'core' else None
-        run(module, arguments['--output'])
+        run(
+            module,
+            arguments['--output'],
+            arguments['--workers'],
+            arguments['--incremental'],
+            arguments['--chunk-size'],
+            arguments['--format'],
+            arguments['--compression'],
+            arguments['--years'],
+            arguments['--offline'],
+            arguments['--classifiers'],
+            arguments['--backend'],
+            arguments['--uncompressed-models']
+        )
 
 
 if __name__ == '__main__':
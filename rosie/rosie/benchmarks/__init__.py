@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+import platform
+import subprocess
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from rosie.benchmarks import synthetic
+from rosie.chamber_of_deputies import settings as chamber_of_deputies
+from rosie.core import classifiers as core_classifiers
+from rosie.core.report import RunReport
+
+SCALES = (10000, 100000, 1000000, 5000000)
+
+
+def suites():
+    """Returns the synthetic dataset generator and the classifiers of each
+    benchmark suite."""
+    core = OrderedDict(
+        (name, classifier) for name, classifier in vars(core_classifiers).items()
+        if isinstance(classifier, type)
+    )
+    return OrderedDict((
+        ('chamber_of_deputies', (synthetic.chamber_of_deputies, chamber_of_deputies.CLASSIFIERS)),
+        ('federal_senate', (synthetic.federal_senate, core)),
+    ))
+
+
+def benchmark(classifier, dataset, repeat=3, seed=42):
+    """Returns the fastest of `repeat` measurements of the `fit` and of the
+    `predict` (including `transform`) phases of a classifier."""
+    best = OrderedDict()
+    for _ in range(repeat):
+        report = RunReport()
+        np.random.seed(seed)  # e.g. KMeans initialization
+        model = classifier()
+        with report.measure('fit'):
+            model.fit(dataset)
+        with report.measure('predict'):
+            model.transform(dataset)
+            model.predict(dataset)
+
+        for phase, metrics in report.stages.items():
+            if phase not in best or metrics['wall'] < best[phase]['wall']:
+                best[phase] = metrics
+    return best
+
+
+def run(scales=SCALES, repeat=3, seed=42):
+    """Returns a list with the measurements of each classifier of each suite
+    (see `suites`) at each scale (number of rows)."""
+    log = logging.getLogger(__name__)
+    results = []
+    for suite, (generate, classifiers) in suites().items():
+        for rows in scales:
+            log.info(f'Generating {suite} dataset with {rows} rows')
+            dataset = generate(rows, seed)
+            for name, classifier in classifiers.items():
+                log.info(f'Benchmarking {name} with {rows} rows')
+                for phase, metrics in benchmark(classifier, dataset, repeat, seed).items():
+                    results.append(OrderedDict(
+                        suite=suite,
+                        rows=rows,
+                        classifier=name,
+                        phase=phase,
+                        wall=metrics['wall'],
+                        cpu=metrics['cpu'],
+                        peak_rss_delta=metrics['peak_rss_delta']
+                    ))
+    return results
+
+
+def commit():
+    """Returns the current git commit (or None outside a git repository)."""
+    try:
+        output = subprocess.check_output(('git', 'rev-parse', 'HEAD'),
+                                         stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def main(target_directory='/tmp/serenata-data', scales=SCALES, repeat=3, seed=42):
+    """Runs the benchmarks and saves them, with the versions and the machine
+    they ran on, as `benchmark-<commit>.json` in `target_directory`."""
+    revision = commit()
+    results = OrderedDict((
+        ('commit', revision),
+        ('date', datetime.now().isoformat()),
+        ('seed', seed),
+        ('repeat', repeat),
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('pandas', pd.__version__),
+        ('sklearn', sklearn.__version__),
+        ('platform', platform.platform()),
+        ('cpus', os.cpu_count()),
+        ('results', run(scales, repeat, seed)),
+    ))
+
+    os.makedirs(target_directory, exist_ok=True)
+    name = f'benchmark-{revision[:10]}.json' if revision else 'benchmark.json'
+    path = os.path.join(target_directory, name)
+    with open(path, 'w') as fobj:
+        json.dump(results, fobj, indent=2)
+    return path
@@ -0,0 +1,194 @@
+"""
+Deterministic synthetic datasets shaped like the ones built by the adapters,
+with cardinalities close to the real ones (e.g. thousands of applicants,
+hundreds of thousands of recipients, a few recipients concentrating most of
+the expenses). The same number of rows and seed always generate the same
+dataset.
+"""
+import numpy as np
+import pandas as pd
+
+from rosie.core.classifiers import InvalidCnpjCpfClassifier
+
+# subquota number, description (as renamed by the adapter), weight and
+# typical net value
+SUBQUOTAS = (
+    ('1', 'Maintenance of office supporting parliamentary activity', 8, 700),
+    ('3', 'Fuels and lubricants', 25, 180),
+    ('4', 'Consultancy, research and technical work', 3, 6000),
+    ('5', 'Publicity of parliamentary activity', 5, 4000),
+    ('8', 'Security service provided by specialized company', 1, 3500),
+    ('9', 'Flight tickets', 10, 900),
+    ('10', 'Telecommunication', 8, 250),
+    ('11', 'Postal services', 3, 150),
+    ('12', 'Office supplies', 2, 300),
+    ('13', 'Meal', 15, 60),
+    ('14', 'Lodging, except for congressperson from Distrito Federal', 4, 350),
+    ('119', 'Aircraft renting or charter of aircraft', 1, 9000),
+    ('120', 'Automotive vehicle renting or charter', 4, 5000),
+    ('122', 'Taxi, toll and parking', 8, 60),
+    ('123', 'Terrestrial, maritime and fluvial tickets', 1, 120),
+    ('137', 'Participation in course, talk or similar event', 1, 1000),
+    ('999', 'Flight ticket issue', 1, 900),
+)
+
+SENATE_EXPENSE_TYPES = (
+    'Rent of real estate for political office, comprising communal areas, electricity, water and sewage',
+    'Acquisition of consumables for use in the office',
+    'Consultancy, research and technical work',
+    'Publicity of parliamentary activity',
+    'Locomotion, meal and lodging',
+    'National air, water and land transport',
+    'Private Security Services',
+)
+
+RECIPIENT_NAMES = ('Restaurante', 'Hotel', 'Hotéis', 'Posto', 'Auto Locadora',
+                   'Gráfica', 'Táxi', 'Telefonia', 'Comércio', 'Consultoria')
+LEGAL_ENTITIES = ('206-2 - SOCIEDADE EMPRESARIA LIMITADA',
+                  '213-5 - EMPRESARIO (INDIVIDUAL)',
+                  '230-5 - EMPRESA INDIVIDUAL DE RESPONSABILIDADE LIMITADA',
+                  '205-4 - SOCIEDADE ANONIMA FECHADA',
+                  '409-0 - CANDIDATO A CARGO POLITICO ELETIVO')
+SITUATIONS = ('ATIVA', 'BAIXADA', 'SUSPENSA', 'INAPTA', 'NULA')
+STATES = ('AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG',
+          'MS', 'MT', 'PA', 'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR',
+          'RS', 'SC', 'SE', 'SP', 'TO')
+PARTIES = ('PT', 'PSDB', 'MDB', 'PP', 'PSD', 'PR', 'PSB', 'DEM', 'PDT', 'PTB',
+           'PRB', 'SD', 'PSC', 'PCdoB', 'PPS', 'PV', 'PSOL', 'REDE', 'NOVO')
+
+
+def chamber_of_deputies(rows, seed=42):
+    """Returns a dataset like the one built by the Chamber of Deputies
+    adapter, with `rows` reimbursements."""
+    r = np.random.RandomState(seed)
+    applicants = int(np.clip(rows // 1500, 20, 2000))
+    recipients = int(np.clip(rows // 15, 50, 300000))
+
+    # recipients: documents, names, subquotas (at least one recipient of
+    # each one, sorted by subquota) and companies' data
+    recipient_ids = documents(r, recipients)
+    weights = np.array([weight for _, _, weight, _ in SUBQUOTAS], dtype=np.float64)
+    weights /= weights.sum()
+    recipient_subquotas = np.sort(np.r_[
+        np.arange(len(SUBQUOTAS)),
+        r.choice(len(SUBQUOTAS), recipients - len(SUBQUOTAS), p=weights)
+    ])
+    counts = np.bincount(recipient_subquotas, minlength=len(SUBQUOTAS))
+    starts = np.cumsum(counts) - counts
+    names = r.choice(len(RECIPIENT_NAMES), recipients)
+    recipient_names = np.char.add(
+        np.array(RECIPIENT_NAMES, dtype=object)[names].astype(str),
+        np.char.mod(' %d', np.arange(recipients))
+    )
+    is_company = np.char.str_len(recipient_ids) == 14
+
+    # reimbursements: in each subquota, a few recipients concentrate most of
+    # them
+    subquota = r.choice(len(SUBQUOTAS), rows, p=weights)
+    recipient = starts[subquota] + \
+        (counts[subquota] * r.random_sample(rows) ** 3).astype(np.int64)
+    applicant = (applicants * r.random_sample(rows) ** 1.5).astype(np.int64)
+    year = r.randint(2009, 2020, rows).astype(np.int16)
+    month = r.randint(1, 13, rows).astype(np.int8)
+    # meals are concentrated in a few days of each month (i.e. trips), so
+    # applicants have several meals on the same day
+    is_meal = np.array([description == 'Meal' for _, description, *_ in SUBQUOTAS])[subquota]
+    day = np.where(is_meal, r.randint(0, 3, rows), r.randint(-20, 28, rows))
+    issue_date = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': 1})) + \
+        pd.to_timedelta(day, unit='D')
+    values = np.array([value for *_, value in SUBQUOTAS], dtype=np.float64)
+    net_value = np.round(values[subquota] * r.lognormal(0, .6, rows), 2)
+
+    cities = r.uniform((-30, -70), (-3, -38), size=(80, 2))
+    recipient_city = r.randint(0, len(cities), recipients)
+    latitude = cities[recipient_city, 0] + r.normal(0, .05, recipients)
+    longitude = cities[recipient_city, 1] + r.normal(0, .05, recipients)
+    legal_entity = r.choice(len(LEGAL_ENTITIES), recipients, p=(.6, .2, .1, .095, .005))
+    situation = r.choice(len(SITUATIONS), recipients, p=(.9, .06, .02, .015, .005))
+    situation_date = pd.Timestamp('2005-01-01') + \
+        pd.to_timedelta(r.randint(0, 5000, recipients), unit='D')
+
+    party = r.choice(len(PARTIES), applicants)
+    state = r.choice(len(STATES), applicants)
+    is_party_expense = r.random_sample(rows) < .01
+
+    dataset = pd.DataFrame({
+        'applicant_id': applicant.astype(str),
+        'category': pd.Categorical.from_codes(
+            subquota, [description for _, description, *_ in SUBQUOTAS]),
+        'congressperson_id': np.where(is_party_expense, None, (applicant + 100000).astype(str)),
+        'document_id': np.arange(rows) + 1000000,
+        'document_type': pd.Categorical.from_codes(
+            r.choice(3, rows, p=(.7, .25, .05)),
+            ('bill_of_sale', 'simple_receipt', 'expense_made_abroad')),
+        'is_party_expense': is_party_expense,
+        'issue_date': issue_date,
+        'month': month,
+        'net_value': net_value,
+        'party': pd.Categorical.from_codes(party[applicant], PARTIES),
+        'recipient': pd.Categorical(recipient_names[recipient]),
+        'recipient_id': recipient_ids[recipient].astype(object),
+        'state': pd.Categorical.from_codes(state[applicant], STATES),
+        'subquota_number': np.array([number for number, *_ in SUBQUOTAS], dtype=object)[subquota],
+        'year': year,
+    })
+
+    # companies' data is only available for CNPJs
+    company = is_company[recipient]
+    dataset['cnpj'] = np.where(company, dataset['recipient_id'], None)
+    dataset['latitude'] = np.where(company, latitude[recipient], np.nan).astype(np.float32)
+    dataset['longitude'] = np.where(company, longitude[recipient], np.nan).astype(np.float32)
+    dataset['legal_entity'] = pd.Categorical.from_codes(
+        np.where(company, legal_entity[recipient], -1), LEGAL_ENTITIES)
+    dataset['situation'] = pd.Categorical.from_codes(
+        np.where(company, situation[recipient], -1), SITUATIONS)
+    dataset['situation_date'] = situation_date[recipient].where(company)
+    return dataset
+
+
+def federal_senate(rows, seed=42):
+    """Returns a dataset like the one built by the Federal Senate adapter,
+    with `rows` reimbursements."""
+    r = np.random.RandomState(seed)
+    senators = int(np.clip(rows // 2000, 10, 250))
+    recipients = int(np.clip(rows // 10, 50, 100000))
+
+    recipient_ids = documents(r, recipients)
+    recipient = (recipients * r.random_sample(rows) ** 3).astype(np.int64)
+    year = r.randint(2008, 2020, rows).astype(np.int64)
+    month = r.randint(1, 13, rows).astype(np.int64)
+    date = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': 1})) + \
+        pd.to_timedelta(r.randint(0, 28, rows), unit='D')
+
+    return pd.DataFrame({
+        'year': year,
+        'month': month,
+        'congressperson_name': np.char.mod('SENATOR %d', r.randint(0, senators, rows)).astype(object),
+        'expense_type': np.array(SENATE_EXPENSE_TYPES, dtype=object)[
+            r.randint(0, len(SENATE_EXPENSE_TYPES), rows)],
+        'recipient_id': recipient_ids[recipient].astype(object),
+        'recipient': np.char.mod('Supplier %d', recipient).astype(object),
+        'document_id': np.where(r.random_sample(rows) < .1, None,
+                                np.char.mod('%d', r.randint(0, 10 ** 6, rows))),
+        'date': date.dt.strftime('%Y-%m-%d'),
+        'expense_details': None,
+        'net_value': np.round(r.lognormal(6, 1, rows), 2),
+        'document_type': 'unknown',
+    })
+
+
+def documents(r, count):
+    """Returns an array of CNPJs (85%), CPFs (13%) and invalid documents."""
+    kinds = r.choice(3, count, p=(.85, .13, .02))
+    result = np.empty(count, dtype='U14')
+    for kind, size, weights in ((0, 14, InvalidCnpjCpfClassifier.CNPJ_WEIGHTS),
+                                (1, 11, InvalidCnpjCpfClassifier.CPF_WEIGHTS),
+                                (2, 14, None)):
+        selected = kinds == kind
+        digits = r.randint(0, 10, (selected.sum(), size))
+        for weight in weights or ():
+            remainder = digits[:, :len(weight)] @ weight % 11
+            digits[:, len(weight)] = np.where(remainder < 2, 0, 11 - remainder)
+        text = (digits + ord('0')).astype(np.uint8).view(f'S{size}').ravel()
+        result[selected] = text.astype(f'U{size}')
+    return result
@@ -0,0 +1,53 @@
+import json
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import patch
+
+import rosie.benchmarks
+from rosie.benchmarks import benchmark, run, suites, synthetic
+from rosie.core.classifiers import InvalidCnpjCpfClassifier
+
+
+class TestBenchmarks(TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_benchmark(self):
+        dataset = synthetic.federal_senate(1000)
+        result = benchmark(InvalidCnpjCpfClassifier, dataset, repeat=2)
+        self.assertEqual(['fit', 'predict'], list(result))
+        self.assertEqual(1, result['predict']['calls'])
+        self.assertGreater(result['predict']['wall'], 0)
+
+    def test_run_covers_every_classifier(self):
+        results = run((2000,), repeat=1)
+        expected = {
+            (suite, name, phase)
+            for suite, (_, classifiers) in suites().items()
+            for name in classifiers
+            for phase in ('fit', 'predict')
+        }
+        measured = {(result['suite'], result['classifier'], result['phase'])
+                    for result in results}
+        self.assertEqual(expected, measured)
+        self.assertEqual({2000}, {result['rows'] for result in results})
+
+    @patch.object(rosie.benchmarks, 'run')
+    @patch.object(rosie.benchmarks, 'commit')
+    def test_main(self, commit, run):
+        commit.return_value = '0123456789abcdef'
+        run.return_value = [{'classifier': 'InvalidCnpjCpfClassifier'}]
+        path = rosie.benchmarks.main(self.path, (100,), repeat=1, seed=7)
+        self.assertEqual(os.path.join(self.path, 'benchmark-0123456789.json'), path)
+        run.assert_called_once_with((100,), 1, 7)
+        with open(path) as fobj:
+            saved = json.load(fobj)
+        self.assertEqual('0123456789abcdef', saved['commit'])
+        self.assertEqual(7, saved['seed'])
+        self.assertEqual(run.return_value, saved['results'])
@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from rosie.benchmarks import synthetic
+from rosie.core.classifiers import InvalidCnpjCpfClassifier
+
+
+class TestSynthetic(TestCase):
+
+    def test_chamber_of_deputies(self):
+        dataset = synthetic.chamber_of_deputies(2000)
+        self.assertEqual(2000, len(dataset))
+        self.assertEqual(2000, dataset['document_id'].nunique())
+        self.assertEqual(len(synthetic.SUBQUOTAS), dataset['category'].nunique())
+        self.assertTrue(dataset['latitude'].isnull().equals(dataset['cnpj'].isnull()))
+
+    def test_federal_senate(self):
+        dataset = synthetic.federal_senate(2000)
+        self.assertEqual(2000, len(dataset))
+        self.assertEqual(set(synthetic.SENATE_EXPENSE_TYPES), set(dataset['expense_type']))
+
+    def test_same_seed_same_dataset(self):
+        self.assertTrue(synthetic.chamber_of_deputies(500).equals(
+            synthetic.chamber_of_deputies(500)))
+        self.assertFalse(synthetic.chamber_of_deputies(500).equals(
+            synthetic.chamber_of_deputies(500, seed=1)))
+        self.assertTrue(synthetic.federal_senate(500).equals(
+            synthetic.federal_senate(500)))
+
+    def test_documents(self):
+        documents = synthetic.documents(np.random.RandomState(42), 1000)
+        self.assertEqual({11, 14}, set(np.char.str_len(documents)))
+        dataset = pd.DataFrame({'recipient_id': documents,
+                                'document_type': 'bill_of_sale'})
+        invalid = InvalidCnpjCpfClassifier().predict(dataset)
+        self.assertTrue(0 < invalid.mean() < .05)
@@ -1,22 +1,31 @@
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from pathlib import Path
 from re import match
 
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from urllib.error import HTTPError
 
-from serenata_toolbox.chamber_of_deputies.reimbursements import Reimbursements
+from serenata_toolbox.chamber_of_deputies.reimbursements import Reimbursements, URL
 from serenata_toolbox.datasets import fetch
 
+from rosie.core.backends import require_dask
+from rosie.core.cache import DatasetCache
+from rosie.core.downloads import Downloads
+from rosie.core.report import RunReport
+
 
 class Adapter:
 
     STARTING_YEAR = 2009
     COMPANIES_DATASET = '2016-09-03-companies.xz'
-    REIMBURSEMENTS_PATTERN = r'reimbursements-\d{4}\.csv'
+    REIMBURSEMENTS_PATTERN = r'reimbursements-(\d{4})\.csv$'
+    REIMBURSEMENTS_URL = URL
+    DOWNLOADS = 'chamber-of-deputies-downloads.json'
     RENAME_COLUMNS = {
         'subquota_description': 'category',
         'total_net_value': 'net_value',
@@ -27,48 +36,210 @@ class Adapter:
         'applicant_id': np.str,
         'cnpj_cpf': np.str,
         'congressperson_id': np.str,
-        'subquota_number': np.str
+        'month': np.int8,
+        'subquota_number': np.str,
+        'year': np.int16
+    }
+    # without every block of the CSV files at hand, Dask cannot infer the
+    # types of the columns: values are numbers and everything else is text
+    PARTITIONED_DTYPE = {
+        'document_id': np.int64,
+        'document_type': np.float64,
+        'document_value': np.float64,
+        'remark_value': np.float64,
+        'total_net_value': np.float64
+    }
+    CATEGORIES = ('party', 'state', 'subquota_description', 'supplier')
+    COMPANIES_DTYPE = {
+        'cnpj': np.str,
+        'latitude': np.float32,
+        'legal_entity': 'category',
+        'longitude': np.float32,
+        'situation': 'category'
     }
 
-    def __init__(self, path):
+    # increase it whenever `prepare_dataset` changes, so cached datasets
+    # prepared by previous versions are built again
+    VERSION = 1
+
+    # columns used to prepare the dataset, loaded even if not requested
+    REQUIRED_COLUMNS = (
+        'cnpj',
+        'cnpj_cpf',
+        'congressperson_id',
+        'document_type',
+        'subquota_description'
+    )
+
+    def __init__(self, path, workers=1, columns=None, years=None, offline=False,
+                 backend='pandas'):
+        """
+        The optional `columns` (named after Serenata de Amor standard) limits
+        the dataset to these columns, loading and merging only what they
+        require.
+
+        The optional `years` limits the reimbursements updated and loaded to
+        these years. With `offline`, nothing is downloaded and the dataset is
+        built from the files already in `path`.
+
+        With the `dask` `backend`, the dataset is a partitioned (Dask)
+        DataFrame read lazily from the CSV files, and it is not cached.
+        """
         self.path = path
+        self.workers = workers
+        self.columns = sorted(columns) if columns else None
+        self.years = sorted(years) if years else None
+        self.offline = offline
+        self.backend = backend
         self.log = logging.getLogger(__name__)
+        self.cache = DatasetCache(path, 'chamber-of-deputies-dataset')
+        self.report = RunReport()
 
     @property
     def dataset(self):
-        self.update_datasets()
-        df = self.reimbursements.merge(
-            self.companies,
+        if self.offline:
+            self.log.info('Offline mode: using the datasets already downloaded')
+        else:
+            with self.report.measure('download'):
+                self.update_datasets()
+
+        if self.backend == 'dask':
+            return self.partitioned_dataset
+
+        sources = self.sources
+        with self.report.measure('cache'):
+            df = self.cache.load(sources, columns=self.columns, schema=self.schema)
+
+        if df is None:
+            with self.report.measure('reimbursements'):
+                reimbursements = self.reimbursements
+            with self.report.measure('companies'):
+                companies = self.companies
+            with self.report.measure('merge'):
+                df = reimbursements.merge(
+                    companies,
+                    how='left',
+                    left_on='cnpj_cpf',
+                    right_on='cnpj'
+                )
+            with self.report.measure('prepare'):
+                self.prepare_dataset(df)
+                if self.columns:
+                    df = df[[col for col in df.columns if col in self.columns]]
+            with self.report.measure('cache'):
+                self.cache.save(df, sources, columns=self.columns, schema=self.schema)
+
+        self.log.info('Dataset ready! Rosie starts her analysis now :)')
+        return df
+
+    @property
+    def partitioned_dataset(self):
+        """Reimbursements (read in blocks of the CSV files) merged with the
+        companies (small enough to be in memory) and prepared partition by
+        partition. Repeated strings are not categories, as each partition
+        would have its own ones."""
+        dd = require_dask()
+        paths = sorted(self.reimbursements_paths)
+        if not paths:
+            return dd.from_pandas(pd.DataFrame(), npartitions=1)
+
+        self.log.info('Loading reimbursements in partitions')
+        header = pd.read_csv(paths[0], nrows=0, usecols=self.usecols).columns
+        dtype = {column: np.object for column in header}
+        dtype.update(self.PARTITIONED_DTYPE)
+        dtype.update(self.DTYPE)
+        reimbursements = dd.read_csv(paths, dtype=dtype, usecols=self.usecols)
+        with self.report.measure('companies'):
+            companies = self.companies
+        df = reimbursements.merge(
+            companies,
             how='left',
             left_on='cnpj_cpf',
             right_on='cnpj'
         )
+        return df.map_partitions(self.prepared)
+
+    def prepared(self, df):
+        """Returns a prepared copy of a partition of the dataset."""
+        df = df.copy()
         self.prepare_dataset(df)
-        self.log.info('Dataset ready! Rosie starts her analysis now :)')
+        if self.columns:
+            df = df[[col for col in df.columns if col in self.columns]]
         return df
 
+    @property
+    def schema(self):
+        return DatasetCache.schema(self.VERSION, self.DTYPE, self.CATEGORIES, self.COMPANIES_DTYPE)
+
+    @property
+    def sources(self):
+        """Files the dataset is built from, used to invalidate its cache."""
+        companies = Path(self.path) / self.COMPANIES_DATASET
+        return [companies] + sorted(self.reimbursements_paths)
+
+    def usecols(self, column):
+        """Filter for columns to be loaded from the CSV files."""
+        if not self.columns:
+            return True
+
+        original_names = {v: k for k, v in self.RENAME_COLUMNS.items()}
+        columns = {original_names.get(col, col) for col in self.columns}
+        return column in columns or column in self.REQUIRED_COLUMNS
+
     @property
     def companies(self):
         self.log.info('Loading companies')
         path = Path(self.path) / self.COMPANIES_DATASET
-        df = pd.read_csv(path, dtype={'cnpj': np.str}, low_memory=False)
+        df = pd.read_csv(
+            path,
+            dtype=self.COMPANIES_DTYPE,
+            usecols=self.usecols,
+            low_memory=False
+        )
         df['cnpj'] = df['cnpj'].str.replace(r'\D', '')
         return df
 
+    @property
+    def reimbursements_paths(self):
+        paths = []
+        for path in Path(self.path).glob('*.csv'):
+            matches = match(self.REIMBURSEMENTS_PATTERN, path.name)
+            if matches and (not self.years or int(matches.group(1)) in self.years):
+                paths.append(str(path))
+        return paths
+
     @property
     def reimbursements(self):
-        df = pd.DataFrame()
-        paths = (
-            str(path) for path in Path(self.path).glob('*.csv')
-            if match(self.REIMBURSEMENTS_PATTERN, path.name)
-        )
+        paths = self.reimbursements_paths
+        if not paths:
+            return pd.DataFrame()
 
-        for path in paths:
-            self.log.info(f'Loading reimbursements from {path}')
-            year_df = pd.read_csv(path, dtype=self.DTYPE, low_memory=False)
-            df = df.append(year_df)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            dfs = list(executor.map(self.read_reimbursements, paths))
 
-        return df
+        # categories must be the same in every year, otherwise concatenating
+        # them would fall back to (heavy) Python strings
+        for column in self.CATEGORIES:
+            columns = [df[column] for df in dfs if column in df.columns]
+            if not columns:
+                continue
+            categories = union_categoricals(columns).categories
+            for df in dfs:
+                if column in df.columns:
+                    df[column] = df[column].cat.set_categories(categories)
+
+        return pd.concat(dfs, ignore_index=True, sort=False)
+
+    def read_reimbursements(self, path):
+        self.log.info(f'Loading reimbursements from {path}')
+        dtype = dict(self.DTYPE)
+        dtype.update({column: 'category' for column in self.CATEGORIES})
+        return pd.read_csv(
+            path,
+            dtype=dtype,
+            usecols=self.usecols,
+            low_memory=False
+        )
 
     def update_datasets(self):
         self.update_companies()
@@ -80,16 +251,42 @@ class Adapter:
         fetch(self.COMPANIES_DATASET, self.path)
 
     def update_reimbursements(self, years=None):
+        """Updates the reimbursements of each year, `workers` years at a
+        time. Years whose file did not change since they were downloaded
+        (see `is_up_to_date`) are skipped."""
         if not years:
             next_year = date.today().year + 1
-            years = range(self.STARTING_YEAR, next_year)
+            years = self.years or range(self.STARTING_YEAR, next_year)
+
+        self.downloads = Downloads(Path(self.path) / self.DOWNLOADS)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            tuple(executor.map(self.update_reimbursements_from, years))
+        self.downloads.save()
 
-        for year in years:
-            self.log.info(f'Updating reimbursements from {year}')
-            try:
-                Reimbursements(year, self.path)()
-            except HTTPError as e:
-                self.log.error(f'Could not update Reimbursements from year {year}: {e} - {e.filename}')
+    def update_reimbursements_from(self, year):
+        remote = self.remote_version(year)
+        if self.is_up_to_date(year, remote):
+            self.log.info(f'Reimbursements from {year} are up to date')
+            return
+
+        self.log.info(f'Updating reimbursements from {year}')
+        try:
+            Reimbursements(year, self.path)()
+        except HTTPError as e:
+            self.log.error(f'Could not update Reimbursements from year {year}: {e} - {e.filename}')
+        else:
+            self.downloads.record(year, remote)
+
+    def remote_version(self, year):
+        return self.downloads.remote(self.REIMBURSEMENTS_URL.format(year))
+
+    def is_up_to_date(self, year, remote):
+        """Whether the reimbursements of a year were prepared from an archive
+        matching the remote one (see `Downloads.is_up_to_date`)."""
+        path = Path(self.path)
+        if not (path / f'reimbursements-{year}.csv').exists():
+            return False
+        return self.downloads.is_up_to_date(year, remote, path / f'Ano-{year}.zip')
 
     def prepare_dataset(self, df):
         self.rename_categories(df)
@@ -104,12 +301,14 @@ class Adapter:
         self.log.info('Categorizing reimbursements')
 
         # There's no documented type for `3`, `4` and `5`, thus we assume it's
-        # an input error until we hear back from Chamber of Deputies
+        # an input error until we hear back from Chamber of Deputies (they
+        # become nulls). Types are mapped by number, so a subset of the years
+        # missing one of them still gets the right names.
         types = ('bill_of_sale', 'simple_receipt', 'expense_made_abroad')
-        converters = {number: None for number in range(3, 6)}
-        df['document_type'].replace(converters, inplace=True)
-        df['document_type'] = df['document_type'].astype('category')
-        df['document_type'].cat.rename_categories(types, inplace=True)
+        df['document_type'] = pd.Categorical(
+            df['document_type'].map(dict(enumerate(types))),
+            categories=types
+        )
 
         # Some classifiers expect a more broad category name for meals
         rename = {'Congressperson meal': 'Meal'}
@@ -118,5 +317,7 @@ class Adapter:
 
     def coerce_dates(self, df):
         for field, fmt in (('issue_date', '%Y-%m-%d'), ('situation_date', '%d/%m/%Y')):
+            if field not in df.columns:
+                continue
             self.log.info(f'Coercing {field} column to date data type')
             df[field] = pd.to_datetime(df[field], format=fmt, errors='coerce')
@@ -16,6 +16,8 @@ class ElectionExpensesClassifier(TransformerMixin):
         Brazilian Federal Revenue category of companies, preceded by its code.
     """
 
+    COLS = ['legal_entity']
+
     def fit(self, dataframe):
         pass
 
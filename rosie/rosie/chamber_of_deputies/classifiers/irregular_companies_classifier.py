@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 from sklearn.base import TransformerMixin
 
 
@@ -22,6 +23,11 @@ class IrregularCompaniesClassifier(TransformerMixin):
         Date when the situation was last updated.
     """
 
+    COLS = ['issue_date',
+            'situation',
+            'situation_date']
+    STATUSES = ('BAIXADA', 'NULA', 'SUSPENSA', 'INAPTA')
+
     def fit(self, X):
         return self
 
@@ -29,9 +35,12 @@ class IrregularCompaniesClassifier(TransformerMixin):
         return self
 
     def predict(self, X):
-        statuses = ['BAIXADA', 'NULA', 'SUSPENSA', 'INAPTA']
-        self._X = X.apply(self.__compare_date, axis=1)
-        return np.r_[self._X & X['situation'].isin(statuses)]
-
-    def __compare_date(self, row):
-        return (row['situation_date'] < row['issue_date'])
+        situation_date = pd.to_datetime(X['situation_date'], errors='coerce')
+        issue_date = pd.to_datetime(X['issue_date'], errors='coerce')
+        return np.r_[(situation_date < issue_date) & self.__is_irregular(X)]
+
+    def __is_irregular(self, X):
+        # companies repeat a lot, so each distinct situation is checked once
+        codes, situations = pd.factorize(X['situation'])
+        is_irregular = np.append(np.isin(situations, self.STATUSES), False)
+        return is_irregular[codes]  # code -1 (missing situation) is False
@@ -28,6 +28,7 @@ class MealPriceOutlierClassifier(TransformerMixin):
 
     HOTEL_REGEX = r'hote(?:(?:ls?)|is)'
     CLUSTER_KEYS = ['mean', 'std']
+    GROUP_KEYS = ['recipient_id']
     COLS = ['applicant_id',
             'category',
             'net_value',
@@ -35,16 +36,14 @@ class MealPriceOutlierClassifier(TransformerMixin):
             'recipient_id']
 
     def fit(self, X):
-        _X = X[self.__applicable_rows(X)]
-        companies = _X.groupby('recipient_id').apply(self.__company_stats) \
-            .reset_index()
+        companies = self.__company_stats(X[self.__applicable_rows(X)])
         companies = companies[self.__applicable_company_rows(companies)]
 
         self.cluster_model = KMeans(n_clusters=3)
         self.cluster_model.fit(companies[self.CLUSTER_KEYS])
         companies['cluster'] = self.cluster_model.predict(companies[self.CLUSTER_KEYS])
-        self.clusters = companies.groupby('cluster') \
-            .apply(self.__cluster_stats) \
+        self.clusters = companies.groupby('cluster')[self.CLUSTER_KEYS] \
+            .mean() \
             .reset_index()
         self.clusters['threshold'] = \
             self.clusters['mean'] + 4 * self.clusters['std']
@@ -54,52 +53,51 @@ class MealPriceOutlierClassifier(TransformerMixin):
         pass
 
     def predict(self, X):
-        _X = X[self.COLS].copy()
-        companies = _X[self.__applicable_rows(_X)] \
-            .groupby('recipient_id').apply(self.__company_stats) \
-            .reset_index()
+        is_applicable = self.__applicable_rows(X)
+        companies = self.__company_stats(X[is_applicable])
+        if companies.empty:
+            return np.ones(len(X), dtype=np.int)
+
         companies['cluster'] = \
             self.cluster_model.predict(companies[self.CLUSTER_KEYS])
         companies = pd.merge(companies,
                              self.clusters[['cluster', 'threshold']],
                              how='left')
-        _X = pd.merge(_X, companies[['recipient_id', 'threshold']], how='left')
-        known_companies = companies[self.__applicable_company_rows(companies)]
-        known_thresholds = known_companies \
-            .groupby('recipient_id') \
-            .apply(lambda x: x['mean'] + 3 * x['std']) \
-            .reset_index() \
-            .rename(columns={0: 'cnpj_threshold'})
-        _X = pd.merge(_X, known_thresholds, how='left')
-        if 'cnpj_threshold' in _X.columns:
-            _X.loc[_X['cnpj_threshold'].notnull(),
-                   'threshold'] = _X['cnpj_threshold']
-        _X['y'] = 1
-        is_outlier = self.__applicable_rows(_X) & \
-            _X['threshold'].notnull() & \
-            (_X['net_value'] > _X['threshold'])
-        _X.loc[is_outlier, 'y'] = -1
-        return _X['y']
+
+        # companies with enough records have their own threshold
+        is_known = self.__applicable_company_rows(companies)
+        companies.loc[is_known, 'threshold'] = \
+            companies['mean'] + 3 * companies['std']
+
+        thresholds = pd.merge(X[['recipient_id']],
+                              companies[['recipient_id', 'threshold']],
+                              how='left')['threshold'].values
+        is_outlier = is_applicable.values & (X['net_value'].values > thresholds)
+        return np.where(is_outlier, -1, 1)
 
     def __applicable_rows(self, X):
         return (X['category'] == 'Meal') & \
             (X['recipient_id'].str.len() == 14) & \
-            (~X['recipient'].fillna('').apply(self.__normalize_string).str.contains(self.HOTEL_REGEX))
+            ~self.__is_hotel(X['recipient'])
 
     def __applicable_company_rows(self, companies):
         return (companies['congresspeople'] > 3) & (companies['records'] > 20)
 
     def __company_stats(self, X):
-        stats = {'mean': np.mean(X['net_value']),
-                 'std': np.std(X['net_value']),
-                 'congresspeople': len(np.unique(X['applicant_id'])),
-                 'records': len(X)}
-        return pd.Series(stats)
-
-    def __cluster_stats(self, X):
-        stats = {'mean': np.mean(X['mean']),
-                 'std': np.mean(X['std'])}
-        return pd.Series(stats)
+        groups = X.groupby('recipient_id')
+        return pd.DataFrame({
+            'mean': groups['net_value'].mean(),
+            'std': groups['net_value'].std(ddof=0),
+            'congresspeople': groups['applicant_id'].nunique(),
+            'records': groups.size()
+        }).reset_index()
+
+    def __is_hotel(self, recipients):
+        # recipients repeat a lot, so each distinct name is normalized once
+        codes, names = pd.factorize(recipients)
+        names = pd.Series(np.asarray(names, dtype=object)).apply(self.__normalize_string)
+        is_hotel = np.append(names.str.contains(self.HOTEL_REGEX).values, False)
+        return is_hotel.astype(np.bool)[codes]  # code -1 (missing name) is False
 
     def __normalize_string(self, string):
         nfkd_form = unicodedata.normalize('NFKD', string.lower())
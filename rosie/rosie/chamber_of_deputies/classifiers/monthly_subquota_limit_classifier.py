@@ -1,3 +1,5 @@
+from datetime import date
+
 import numpy as np
 import pandas as pd
 from sklearn.base import TransformerMixin
@@ -26,6 +28,7 @@ class MonthlySubquotaLimitClassifier(TransformerMixin):
     """
 
     KEYS = ['applicant_id', 'month', 'year']
+    GROUP_KEYS = KEYS
     COLS = ['applicant_id',
             'issue_date',
             'month',
@@ -33,125 +36,83 @@ class MonthlySubquotaLimitClassifier(TransformerMixin):
             'subquota_number',
             'year']
 
-    def fit(self, X):
-        self.X = X
-        self._X = self.X[self.COLS].copy()
-        self.__create_columns()
+    # Monthly limits (in cents) of each subquota: subquota number, first and
+    # last month of the period (None meaning no end) and limit
+    LIMITS = (
+        # Automotive vehicle renting or charter
+        ('120', date(2013, 12, 1), date(2015, 3, 1), 1000000),
+        ('120', date(2015, 4, 1), date(2017, 4, 1), 1090000),
+        ('120', date(2017, 5, 1), None, 1271300),
+
+        # Taxi, toll and parking
+        ('122', date(2013, 12, 1), date(2015, 3, 1), 250000),
+        ('122', date(2015, 4, 1), None, 270000),
+
+        # Fuels and lubricants
+        ('3', date(2009, 7, 1), date(2015, 3, 1), 450000),
+        ('3', date(2015, 4, 1), date(2015, 8, 1), 490000),
+        ('3', date(2015, 9, 1), None, 600000),
+
+        # Security service provided by specialized company
+        ('8', date(2009, 7, 1), date(2014, 4, 1), 450000),
+        ('8', date(2014, 5, 1), date(2015, 3, 1), 800000),
+        ('8', date(2015, 4, 1), None, 870000),
+
+        # Participation in course, talk or similar event
+        ('137', date(2015, 10, 1), None, 769716),
+    )
+
+    def fit(self, X=None):
+        """The limits are the only fitted state: expenses are summed up in
+        `predict`, so the model does not keep any data."""
+        self.limits = pd.DataFrame(
+            list(self.LIMITS),
+            columns=('subquota_number', 'start', 'end', 'monthly_limit')
+        )
+        self.limits['start'] = pd.to_datetime(self.limits['start'])
+        self.limits['end'] = pd.to_datetime(self.limits['end'])
         return self
 
     def transform(self, X=None):
-        self.limits = [
-            {
-                # Automotive vehicle renting or charter (From 12/2013 to 03/2015)
-                'data': self._X.query('(subquota_number == "120") & '
-                                      '(reimbursement_month >= datetime(2013, 12, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 1000000,
-            },
-            {
-                # Automotive vehicle renting or charter (From 04/2015 to 04/2017)
-                'data': self._X.query('(subquota_number == "120") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1)) & '
-                                      '(reimbursement_month <= datetime(2017, 4, 1))'),
-                'monthly_limit': 1090000,
-            },
-            {
-                # Automotive vehicle renting or charter (From 05/2017)
-                'data': self._X.query('(subquota_number == "120") & '
-                                      '(reimbursement_month >= datetime(2017, 5, 1))'),
-                'monthly_limit': 1271300,
-            },
-            {
-                # Taxi, toll and parking (From 12/2013 to 03/2015)
-                'data': self._X.query('(subquota_number == "122") & '
-                                      '(reimbursement_month >= datetime(2013, 12, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 250000,
-            },
-            {
-                # Taxi, toll and parking (From 04/2015)
-                'data': self._X.query('(subquota_number == "122") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1))'),
-                'monthly_limit': 270000,
-            },
-            {
-                # Fuels and lubricants (From 07/2009 to 03/2015)
-                'data': self._X.query('(subquota_number == "3") & '
-                                      '(reimbursement_month >= datetime(2009, 7, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 450000,
-            },
-            {
-                # Fuels and lubricants (From 04/2015 to 08/2015)
-                'data': self._X.query('(subquota_number == "3") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 8, 1))'),
-                'monthly_limit': 490000,
-            },
-            {
-                # Fuels and lubricants (From 9/2015)
-                'data': self._X.query('(subquota_number == "3") & '
-                                      '(reimbursement_month >= datetime(2015, 9, 1))'),
-                'monthly_limit': 600000,
-            },
-            {
-                # Security service provided by specialized company (From 07/2009 to 4/2014)
-                'data': self._X.query('(subquota_number == "8") & '
-                                      '(reimbursement_month >= datetime(2009, 7, 1)) & '
-                                      '(reimbursement_month <= datetime(2014, 4, 1))'),
-                'monthly_limit': 450000,
-            },
-            {
-                # Security service provided by specialized company (From 05/2014 to 3/2015)
-                'data': self._X.query('(subquota_number == "8") & '
-                                      '(reimbursement_month >= datetime(2014, 5, 1)) & '
-                                      '(reimbursement_month <= datetime(2015, 3, 1))'),
-                'monthly_limit': 800000,
-            },
-            {
-                # Security service provided by specialized company (From 04/2015)
-                'data': self._X.query('(subquota_number == "8") & '
-                                      '(reimbursement_month >= datetime(2015, 4, 1))'),
-                'monthly_limit': 870000,
-            },
-            {
-                # Participation in course, talk or similar event (From 10/2015)
-                'data': self._X.query('(subquota_number == "137") & '
-                                      '(reimbursement_month >= datetime(2015, 10, 1))'),
-                'monthly_limit': 769716,
-            },
-        ]
         return self
 
-    def predict(self, X=None):
-        self._X['is_over_monthly_subquota_limit'] = False
-        for metadata in self.limits:
-            data, monthly_limit = metadata['data'], metadata['monthly_limit']
-            if len(data):
-                surplus_reimbursements = self.__find_surplus_reimbursements(data, monthly_limit)
-                self._X.loc[surplus_reimbursements.index,
-                            'is_over_monthly_subquota_limit'] = True
-        results = self._X.loc[self.X.index, 'is_over_monthly_subquota_limit']
-        return np.r_[results]
+    def predict(self, X):
+        data = self.__create_columns(X)
+        data = data[data['monthly_limit'].notnull()]
+
+        # sorting is stable, so expenses on the same date keep their order
+        data = data.sort_values(self.KEYS + ['subquota_number', 'coerced_issue_date'])
+        cumsum = data.groupby(self.KEYS + ['subquota_number'], sort=False)['net_value_int'].cumsum()
+
+        results = np.zeros(len(X), dtype=np.bool)
+        results[data['position'][cumsum > data['monthly_limit']]] = True
+        return results
 
     def predict_proba(self, X=None):
         return 1.
 
-    def __create_columns(self):
-        self._X['net_value_int'] = (self._X['net_value'] * 100).apply(int)
+    def __create_columns(self, X):
+        data = X[self.COLS].copy()
+        data['position'] = np.arange(len(data))
+        data['net_value_int'] = (data['net_value'] * 100).astype(np.int64)
+        data['coerced_issue_date'] = \
+            pd.to_datetime(data['issue_date'], errors='coerce')
 
-        self._X['coerced_issue_date'] = \
-            pd.to_datetime(self._X['issue_date'], errors='coerce')
-        self._X.sort_values('coerced_issue_date', kind='mergesort', inplace=True)
-
-        reimbursement_month = self._X[['year', 'month']].copy()
+        reimbursement_month = data[['year', 'month']].copy()
         reimbursement_month['day'] = 1
-        self._X['reimbursement_month'] = pd.to_datetime(reimbursement_month)
-
-    def __find_surplus_reimbursements(self, data, monthly_limit):
-        grouped = data.groupby(self.KEYS).apply(self.__create_cumsum_cols)
-        return grouped[grouped['cumsum_net_value'] > monthly_limit]
-
-    def __create_cumsum_cols(self, subset):
-        subset['cumsum_net_value'] = subset['net_value_int'].cumsum()
-        return subset
+        data['reimbursement_month'] = pd.to_datetime(reimbursement_month)
+        data['monthly_limit'] = self.__find_monthly_limits(data)
+        return data
+
+    def __find_monthly_limits(self, X):
+        """Looks up the limit of each row in the interval table of limits
+        (at most one period of each subquota matches a month)."""
+        rows = X[['position', 'subquota_number', 'reimbursement_month']]
+        rows = pd.merge(rows, self.limits, on='subquota_number')
+        in_period = (rows['reimbursement_month'] >= rows['start']) & \
+            ((rows['reimbursement_month'] <= rows['end']) | rows['end'].isnull())
+        rows = rows[in_period]
+
+        limits = np.full(len(X), np.nan)
+        limits[rows['position']] = rows['monthly_limit']
+        return limits
@@ -33,9 +33,20 @@ class TraveledSpeedsClassifier(TransformerMixin):
 
     longitude : float column
         Longitude of the place where the expense was made.
+
+    Parameters
+    ----------
+    contamination : float
+        Expected proportion of outliers in the dataset.
+
+    exact_distances : bool
+        Use geopy's Vincenty (slow, one call per pair of points) instead of
+        the vectorized haversine distance. Meant for validation.
     """
 
+    EARTH_RADIUS = 6371.0088  # mean radius of the WGS-84 ellipsoid in km
     AGG_KEYS = ['applicant_id', 'issue_date']
+    GROUP_KEYS = []  # the contamination threshold comes from all the rows
     COLS = ['applicant_id',
             'category',
             'is_party_expense',
@@ -43,11 +54,12 @@ class TraveledSpeedsClassifier(TransformerMixin):
             'latitude',
             'longitude']
 
-    def __init__(self, contamination=.001):
+    def __init__(self, contamination=.001, exact_distances=False):
         if contamination in [0, 1]:
             raise ValueError('contamination must be greater than 0 and less than 1')
 
         self.contamination = contamination
+        self.exact_distances = exact_distances
 
     def fit(self, X):
         _X = self.__aggregate_dataset(X)
@@ -74,9 +86,12 @@ class TraveledSpeedsClassifier(TransformerMixin):
 
     def __aggregate_dataset(self, X):
         X = X[self.__applicable_rows(X)]
-        distances_traveled = X.groupby(self.AGG_KEYS) \
-            .apply(self.__calculate_sum_distances).reset_index() \
-            .rename(columns={0: 'distance_traveled'})
+        if self.exact_distances:
+            distances_traveled = X.groupby(self.AGG_KEYS) \
+                .apply(self.__calculate_sum_distances).reset_index() \
+                .rename(columns={0: 'distance_traveled'})
+        else:
+            distances_traveled = self.__calculate_sum_distances_in_batch(X)
         expenses = X.groupby(self.AGG_KEYS)['applicant_id'].agg(len) \
             .rename('expenses').reset_index()
         _X = pd.merge(distances_traveled, expenses,
@@ -104,6 +119,35 @@ class TraveledSpeedsClassifier(TransformerMixin):
         edges = list(combinations(coordinate_list, 2))
         return np.sum([distance(edge[0][1:], edge[1][1:]).km for edge in edges])
 
+    def __calculate_sum_distances_in_batch(self, X):
+        points = X[self.AGG_KEYS + ['latitude', 'longitude']] \
+            .reset_index(drop=True)
+        points['point'] = points.index
+
+        # every pair of points of the same group, each edge counted once
+        edges = pd.merge(points, points, on=self.AGG_KEYS, suffixes=('', '_to'))
+        edges = edges[edges['point'] < edges['point_to']]
+
+        # same points measured by the exact mode: geopy takes the one-item
+        # sequences `edge[n][1:]` as a latitude (the longitude) on meridian 0
+        meridian = np.zeros(len(edges))
+        edges['distance_traveled'] = self.__haversine(
+            edges['longitude'].values, meridian,
+            edges['longitude_to'].values, meridian)
+
+        groups = points.groupby(self.AGG_KEYS).size().index
+        return edges.groupby(self.AGG_KEYS)['distance_traveled'].sum() \
+            .reindex(groups, fill_value=0.) \
+            .reset_index()
+
+    def __haversine(self, latitude, longitude, latitude_to, longitude_to):
+        latitude, longitude, latitude_to, longitude_to = \
+            map(np.radians, (latitude, longitude, latitude_to, longitude_to))
+        a = np.sin((latitude_to - latitude) / 2) ** 2 + \
+            np.cos(latitude) * np.cos(latitude_to) * \
+            np.sin((longitude_to - longitude) / 2) ** 2
+        return 2 * self.EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
     def __threshold_for_contamination(self, X, expected_contamination):
         possible_thresholds = range(1, int(X['expected_distance'].max()), 50)
         results = [(self.__contamination(X, t), t) for t in possible_thresholds]
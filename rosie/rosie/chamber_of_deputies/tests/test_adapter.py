@@ -1,14 +1,19 @@
+import json
 import shutil
 from datetime import date
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
 from tempfile import mkdtemp
-from unittest import TestCase
-from unittest.mock import call, patch
+from threading import Thread
+from unittest import TestCase, skipIf
+from unittest.mock import PropertyMock, call, patch
 
 import pandas as pd
 from freezegun import freeze_time
 
 from rosie.chamber_of_deputies.adapter import Adapter
+from rosie.core.backends import dd
+from rosie.core.cache import DatasetCache
 
 
 FIXTURES = Path() / 'rosie' / 'chamber_of_deputies' / 'tests' / 'fixtures'
@@ -69,10 +74,84 @@ class TestAdapter(TestCase):
         party_expenses = self.dataset[self.dataset.is_party_expense == True]
         self.assertEqual(1, len(party_expenses))
 
+    def test_repeated_strings_are_categories(self):
+        for column in ('category', 'party', 'recipient'):
+            with self.subTest():
+                self.assertEqual('category', self.dataset[column].dtype.name)
+
+    def test_reimbursements_in_parallel(self):
+        adapter = Adapter(self.temp_path, workers=4)
+        adapter.log.disabled = True
+        df = adapter.reimbursements
+        self.assertEqual(6, len(df))
+        self.assertEqual(list(range(6)), df.index.tolist())
+
+    def test_dataset_with_selected_columns(self):
+        columns = ('applicant_id', 'category', 'is_party_expense', 'latitude')
+        with patch.object(Adapter, 'update_datasets'):
+            adapter = Adapter(self.temp_path, columns=columns)
+            adapter.log.disabled = True
+            df = adapter.dataset
+        self.assertEqual(sorted(columns), sorted(df.columns))
+        self.assertEqual(6, len(df))
+        self.assertEqual(1, df['is_party_expense'].sum())
+        self.assertEqual(1, df['latitude'].isnull().sum())
+
+    def test_dataset_is_cached(self):
+        with patch.object(Adapter, 'update_datasets'):
+            adapter = Adapter(self.temp_path)
+            adapter.log.disabled = True
+            with patch.object(Adapter, 'reimbursements', new_callable=PropertyMock) as reimbursements:
+                df = adapter.dataset
+                reimbursements.assert_not_called()
+        self.assertTrue(self.dataset.equals(df))
+
+    def test_dataset_cache_depends_on_schema(self):
+        with patch.object(Adapter, 'update_datasets'), \
+                patch.object(Adapter, 'VERSION', Adapter.VERSION + 1), \
+                patch.object(DatasetCache, 'save') as save:
+            adapter = Adapter(self.temp_path)
+            adapter.log.disabled = True
+            df = adapter.dataset
+        save.assert_called_once()
+        self.assertTrue(self.dataset.equals(df))
+
+    def test_dataset_with_selected_years(self):
+        with patch.object(Adapter, 'update_datasets'):
+            adapter = Adapter(self.temp_path, years=(2011, 2016))
+            adapter.log.disabled = True
+            df = adapter.dataset
+        self.assertEqual([2011, 2011, 2016], sorted(df['year']))
+
+    @skipIf(dd is None, 'Dask DataFrame is not installed')
+    def test_partitioned_dataset(self):
+        with patch.object(Adapter, 'update_datasets'):
+            adapter = Adapter(self.temp_path, backend='dask')
+            adapter.log.disabled = True
+            partitioned = adapter.dataset
+        self.assertIsInstance(partitioned, dd.DataFrame)
+        self.assertEqual(1, partitioned['legal_entity'].isnull().sum().compute())
+
+        # types of columns Dask does not infer may differ, but not values
+        def values(df):
+            df = df.sort_values(['year', 'document_id', 'applicant_id']).reset_index(drop=True)
+            df = df[sorted(df.columns)].astype(object)
+            return df.where(df.notnull(), None).astype(str)
+
+        self.assertTrue(values(self.dataset).equals(values(partitioned.compute())))
+
+    @patch.object(Adapter, 'update_datasets')
+    def test_offline_dataset(self, update_datasets):
+        adapter = Adapter(self.temp_path, offline=True)
+        adapter.log.disabled = True
+        self.assertEqual(6, len(adapter.dataset))
+        update_datasets.assert_not_called()
+
     @freeze_time('2010-11-12')
     @patch('rosie.chamber_of_deputies.adapter.fetch')
     @patch('rosie.chamber_of_deputies.adapter.Reimbursements')
-    def test_update(self, reimbursements, fetch):
+    @patch.object(Adapter, 'remote_version', return_value=None)
+    def test_update(self, remote_version, reimbursements, fetch):
         adapter = Adapter(self.temp_path)
         adapter.dataset  # triggers update methods
 
@@ -86,8 +165,102 @@ class TestAdapter(TestCase):
 
     @patch('rosie.chamber_of_deputies.adapter.fetch')
     @patch('rosie.chamber_of_deputies.adapter.Reimbursements')
-    def test_coerce_dates(self, reimbursements, fetch):
+    @patch.object(Adapter, 'remote_version', return_value=None)
+    def test_coerce_dates(self, remote_version, reimbursements, fetch):
         adapter = Adapter(self.temp_path)
         df = adapter.dataset
         self.assertIn(date(2011, 9, 6), [ts.date() for ts in df.situation_date])
         self.assertIn(date(2009, 6, 1), [ts.date() for ts in df.issue_date])
+
+
+class RemoteFiles(BaseHTTPRequestHandler):
+    """Stands in for the Chamber of Deputies server, answering the ETag and
+    size of each file in `files`."""
+
+    files = {}
+
+    def do_HEAD(self):
+        etag, size = self.files[self.path]
+        self.send_response(200)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestUpdateReimbursements(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), RemoteFiles)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = 'http://127.0.0.1:{}/Ano-{{}}.csv.zip'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.temp_path = mkdtemp()
+        RemoteFiles.files = {
+            '/Ano-2009.csv.zip': ('"a"', 42),
+            '/Ano-2010.csv.zip': ('"b"', 42)
+        }
+        self.adapter = Adapter(self.temp_path, workers=2)
+        self.adapter.log.disabled = True
+        self.adapter.REIMBURSEMENTS_URL = self.url
+
+        patcher = patch('rosie.chamber_of_deputies.adapter.Reimbursements')
+        self.reimbursements = patcher.start()
+        self.reimbursements.side_effect = self.download
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_path)
+
+    def download(self, year, path):
+        """Creates the files the real `Reimbursements` would."""
+        (Path(path) / f'Ano-{year}.zip').write_bytes(b'0' * 42)
+        (Path(path) / f'reimbursements-{year}.csv').write_text('year\n{}\n'.format(year))
+        return lambda: None
+
+    def downloaded_years(self):
+        return sorted(args[0] for args, _ in self.reimbursements.call_args_list)
+
+    def test_downloads_every_year(self):
+        self.adapter.update_reimbursements((2009, 2010))
+        self.assertEqual([2009, 2010], self.downloaded_years())
+        with open(Path(self.temp_path) / Adapter.DOWNLOADS) as fobj:
+            self.assertEqual({'2009': '"a"', '2010': '"b"'}, json.load(fobj))
+
+    def test_skips_years_with_the_same_etag(self):
+        self.adapter.update_reimbursements((2009, 2010))
+        RemoteFiles.files['/Ano-2010.csv.zip'] = ('"c"', 42)
+        self.reimbursements.reset_mock()
+        self.adapter.update_reimbursements((2009, 2010))
+        self.assertEqual([2010], self.downloaded_years())
+
+    def test_skips_years_with_the_same_size_without_etag(self):
+        self.download(2009, self.temp_path)
+        self.download(2010, self.temp_path)
+        RemoteFiles.files['/Ano-2009.csv.zip'] = (None, 42)
+        RemoteFiles.files['/Ano-2010.csv.zip'] = (None, 43)
+        self.adapter.update_reimbursements((2009, 2010))
+        self.assertEqual([2010], self.downloaded_years())
+
+    def test_downloads_when_the_remote_file_is_unknown(self):
+        self.download(2009, self.temp_path)
+        self.adapter.REIMBURSEMENTS_URL = 'http://127.0.0.1:1/Ano-{}.csv.zip'
+        self.adapter.update_reimbursements((2009,))
+        self.assertEqual([2009], self.downloaded_years())
+
+    def test_downloads_selected_years(self):
+        adapter = Adapter(self.temp_path, years=(2010,))
+        adapter.log.disabled = True
+        adapter.REIMBURSEMENTS_URL = self.url
+        adapter.update_reimbursements()
+        self.assertEqual([2010], self.downloaded_years())
@@ -1,6 +1,4 @@
-import os
 import shutil
-from pathlib import Path
 from tempfile import mkdtemp
 from unittest import TestCase
 from unittest.mock import MagicMock, PropertyMock, patch
@@ -10,6 +8,7 @@ import pandas as pd
 from rosie.chamber_of_deputies import settings
 from rosie.chamber_of_deputies.adapter import Adapter
 from rosie.core import Core
+from rosie.core.models import ModelStore
 
 
 class TestChamberOfDeputies(TestCase):
@@ -27,7 +26,7 @@ class TestChamberOfDeputies(TestCase):
         shutil.rmtree(self.temp_dir)
 
     @patch.object(Adapter, 'dataset', new_callable=PropertyMock)
-    @patch('rosie.core.joblib')
+    @patch.object(ModelStore, 'save')
     def test_load_trained_model_trains_model_when_not_persisted(self, _, dataset):
         dataset.return_value = self.dataset
         adapter = Adapter(self.temp_dir)
@@ -36,11 +35,11 @@ class TestChamberOfDeputies(TestCase):
         self.classifier.return_value.fit.assert_called_once_with(self.dataset)
 
     @patch.object(Adapter, 'dataset', new_callable=PropertyMock)
-    @patch('rosie.core.joblib')
-    def test_load_trained_model_doesnt_train_model_when_already_persisted(self, _, dataset):
+    @patch.object(ModelStore, 'load')
+    def test_load_trained_model_doesnt_train_model_when_already_persisted(self, load, dataset):
         dataset.return_value = self.dataset
         adapter = Adapter(self.temp_dir)
         subject = Core(settings, adapter)
-        Path(os.path.join(subject.data_path, 'mockedclassifier.pkl')).touch()
         model = subject.load_trained_model(self.classifier)
-        model.fit.assert_not_called()
+        self.assertEqual(load.return_value, model)
+        self.classifier.return_value.fit.assert_not_called()
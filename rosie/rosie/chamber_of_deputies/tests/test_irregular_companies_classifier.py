@@ -59,3 +59,8 @@ class TestIrregularCompaniesClassifier(TestCase):
             result, *_ = self.subject.predict(company)
             with self.subTest():
                 self.assertEqual(result, status.expected, msg=company)
+
+    def test_company_without_situation(self):
+        company = self._get_company_dataset(situation=None)
+        result, *_ = self.subject.predict(company)
+        self.assertFalse(result)
@@ -1,3 +1,4 @@
+import pickle
 from unittest import TestCase
 
 import numpy as np
@@ -65,4 +66,9 @@ class TestMonthlySubquotaLimitClassifier(TestCase):
             self.assertEqual(
                 self.prediction[index],
                 row['expected_prediction'],
-                msg='Line {0}: {1}'.format(row, row['test_case_description']))
\ No newline at end of file
+                msg='Line {0}: {1}'.format(row, row['test_case_description']))
+
+    def test_fitted_model_does_not_keep_the_dataset(self):
+        model = pickle.loads(pickle.dumps(self.subject))
+        self.assertEqual({'limits'}, set(vars(model)))
+        self.assertEqual(self.prediction.tolist(), model.predict(self.dataset).tolist())
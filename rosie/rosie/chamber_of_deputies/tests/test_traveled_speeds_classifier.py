@@ -78,6 +78,14 @@ class TestTraveledSpeedsClassifier(TestCase):
         with self.assertRaises(ValueError):
             TraveledSpeedsClassifier(contamination=1)
 
+    def test_predict_with_exact_distances_matches_vectorized_distances(self):
+        subject = TraveledSpeedsClassifier(exact_distances=True)
+        subject.fit(self.dataset)
+        assert_array_equal(
+            self.subject.predict(self.dataset), subject.predict(self.dataset))
+        np.testing.assert_allclose(
+            self.subject.polynomial, subject.polynomial, rtol=.01)
+
     def test_is_company_coordinates_in_brazil(self):
         prediction = self.subject.predict(self.dataset)
         self.assertEqual(1, prediction[28])
@@ -1,9 +1,29 @@
 import logging
+import multiprocessing
 import os.path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import numpy as np
+import pandas as pd
 from sklearn.externals import joblib
 
+from rosie.core.backends import BACKENDS, DaskBackend
+from rosie.core.models import ModelStore
+from rosie.core.report import RunReport
+from rosie.core.writers import WRITERS
+
+
+# Reference to the running Core shared with forked workers: as they inherit
+# the parent's memory (copy-on-write), the dataset is never pickled.
+_shared_core = None
+
+
+def _classify(name):
+    _shared_core.report = RunReport()  # only this worker's measurements
+    model = _shared_core.load_trained_model(_shared_core.classifiers[name])
+    return name, _shared_core.classify(model), _shared_core.report
+
 
 class Core:
     """
@@ -24,54 +44,445 @@ class Core:
     * A `dataset` property with the main dataset to be analyzed;
     * A `path` property with the path to the datasets (where the output will be
     saved).
+
+    Fitted models are kept in a `ModelStore` (in the `models` directory of
+    the adapter path) and only trained again when the classifier, its
+    parameters or its training data change.
+
+    The optional `workers` argument sets how many classifiers run at the same
+    time, each one in its own process.
+
+    The optional `incremental` argument (only available when there are
+    UNIQUE_IDS) scores only rows that are new or changed since the last run,
+    plus the rows sharing a group with them: classifiers whose prediction for
+    a row depends on other rows declare these groups in a `GROUP_KEYS`
+    attribute (an empty list meaning the whole dataset). Besides
+    `suspicions.xz`, incremental runs save `suspicions-delta.xz` with the new
+    and changed rows, and the rows whose suspicions changed, and a state file
+    for the next run.
+
+    The optional `chunk_size` argument scores the dataset in chunks of about
+    this number of rows, partitioned by `PARTITION_KEY`, writing each chunk
+    of suspicions to `suspicions.xz` as soon as it is scored (rows are
+    written grouped by partition). Classifiers with groups not contained in
+    a partition (see `is_partitioned`) score the whole dataset at once, with
+    only the columns they declare in `COLS`.
+
+    The optional `output_format` (`csv` or `columnar`, see `rosie.core.writers`)
+    and `compression` (`xz` or `zstd`) arguments set how suspicions are
+    saved. The default is a CSV compressed with xz (`suspicions.xz`).
+
+    Each run saves a `RunReport` (`rosie-report.json`) with the time and
+    memory used to load the dataset, by each phase of each classifier and to
+    save the suspicions.
+
+    The optional `classifiers` argument runs only these classifiers (names
+    from CLASSIFIERS). The suspicions of the other classifiers are kept from
+    the last suspicions file saved in the same format (matching rows by
+    UNIQUE_IDS), so it still has every classifier. Incremental runs score
+    every classifier, so they cannot be limited to some of them (the
+    dataset is loaded with the columns of the selected ones only).
+
+    Models are stored compressed, unless `compress_models` is False: then
+    they take more disk space, but their arrays are memory-mapped when they
+    are loaded instead of read into memory (see `ModelStore`).
+
+    The optional `backend` argument sets how the dataset is processed:
+    `pandas` (default) keeps it in memory, and `dask` (it requires Dask
+    DataFrame) processes a partitioned dataset (e.g. built by the adapter
+    with Dask) a few partitions at a time (see `rosie.core.backends`).
     """
 
-    def __init__(self, settings, adapter):
+    STATE = 'rosie-state.pkl'
+    REPORT = 'rosie-report.json'
+    PARTITION_KEY = 'applicant_id'
+
+    def __init__(self, settings, adapter, workers=1, incremental=False,
+                 chunk_size=None, output_format='csv', compression='xz',
+                 classifiers=None, backend='pandas', compress_models=True):
         self.log = logging.getLogger(__name__)
         self.settings = settings
-        self.dataset = adapter.dataset
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend: {backend}')
+        self.backend = backend
+        self.selected = tuple(classifiers) if classifiers else None
+        if self.selected:
+            unknown = set(self.selected) - set(settings.CLASSIFIERS)
+            if unknown:
+                raise ValueError(f'Unknown classifiers: {", ".join(sorted(unknown))}')
+            if incremental:
+                raise ValueError('Incremental runs require every classifier')
+        self.workers = workers
+        self.incremental = incremental
+        self.chunk_size = chunk_size
+        self.output_format = output_format
+        self.compression = compression
+        self.previous = None
+        self.report = RunReport()
+        with self.report.measure('dataset'):
+            self.dataset = adapter.dataset
+        if isinstance(getattr(adapter, 'report', None), RunReport):
+            self.report.update(adapter.report)
         self.data_path = adapter.path
-        if self.settings.UNIQUE_IDS:
+        self.models = ModelStore(os.path.join(self.data_path, 'models'),
+                                 compress=ModelStore.COMPRESS if compress_models else 0)
+        self.model_keys = {}
+        if self.backend != 'pandas':
+            self.rows = None  # counted while running
+            self.suspicions = None  # written partition by partition
+            return
+
+        self.rows = len(self.dataset)
+        if self.chunk_size and not self.incremental:
+            self.suspicions = None  # written chunk by chunk
+        elif self.settings.UNIQUE_IDS:
             self.suspicions = self.dataset[self.settings.UNIQUE_IDS].copy()
         else:
             self.suspicions = self.dataset.copy()
 
     def __call__(self):
-        total = len(self.settings.CLASSIFIERS)
+        if self.incremental and not self.settings.UNIQUE_IDS:
+            self.log.warning('Incremental runs require UNIQUE_IDS, running all rows')
+            self.incremental = False
+
+        if self.chunk_size and self.incremental:
+            self.log.warning('Incremental runs are not chunked, running all rows at once')
+
+        if self.backend != 'pandas' and (self.incremental or self.chunk_size):
+            self.log.warning(f'The {self.backend} backend is not incremental nor chunked, '
+                             'running all rows in partitions')
+            self.incremental, self.chunk_size = False, None
+
+        if self.selected:
+            self.previous = self.previous_suspicions()
+
+        if self.backend == 'dask':
+            DaskBackend(self)()
+        elif self.chunk_size and not self.incremental:
+            self.run_in_chunks()
+        else:
+            if self.incremental:
+                self.run_incrementally()
+            elif self.workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+                self.run_in_parallel()
+            else:
+                self.run_sequentially()
+
+            with self.report.measure('output'), self.writer('suspicions') as writer:
+                writer.write(self.keep_previous(self.suspicions))
+
+        self.save_report()
+
+    def save_report(self):
+        path = os.path.join(self.data_path, self.REPORT)
+        self.log.info(f'Saving run report at {path}')
+        self.report.save(
+            path,
+            rows=self.rows,
+            workers=self.workers,
+            backend=self.backend,
+            incremental=self.incremental,
+            chunk_size=self.chunk_size,
+            output_format=self.output_format,
+            compression=self.compression,
+            classifiers=list(self.classifiers)
+        )
+
+    @property
+    def classifiers(self):
+        """The CLASSIFIERS of the settings selected for this run."""
+        if not self.selected:
+            return self.settings.CLASSIFIERS
+        return OrderedDict(
+            (name, classifier)
+            for name, classifier in self.settings.CLASSIFIERS.items()
+            if name in self.selected
+        )
+
+    def previous_suspicions(self):
+        """Returns the suspicions of the classifiers not selected for this run
+        from the last suspicions file, indexed by UNIQUE_IDS (or None if
+        they are not available)."""
+        ids = self.settings.UNIQUE_IDS
+        ids = [ids] if isinstance(ids, str) else list(ids or ())
+        writer = WRITERS[self.output_format]
+        path = os.path.join(self.data_path, writer.filename('suspicions', self.compression))
+        if not ids or not os.path.isfile(path):
+            self.log.warning('No previous suspicions to keep, saving only the selected classifiers')
+            return None
+
+        self.log.info(f'Keeping suspicions of the other classifiers from {path}')
+        dtype = {key: np.str for key in ids if self.dataset[key].dtype == np.object}
+        with self.report.measure('previous'):
+            previous = writer.read(path, dtype)
+        others = [name for name in self.settings.CLASSIFIERS
+                  if name in previous.columns and name not in self.selected]
+        previous = previous.drop_duplicates(ids)
+        previous.index = pd.MultiIndex.from_frame(previous[ids])
+        return previous[others]
+
+    def keep_previous(self, suspicions):
+        """Adds the previous suspicions of the classifiers not selected for
+        this run to `suspicions` (rows without them are not suspicious)."""
+        if self.previous is None:
+            return suspicions
+
+        ids = list(self.previous.index.names)
+        keys = pd.MultiIndex.from_frame(suspicions[ids])
+        previous = self.previous.reindex(keys)
+        suspicions = suspicions.copy()
+        for name in previous.columns:
+            suspicions[name] = previous[name].fillna(False).values.astype(np.bool)
+
+        order = ids + [name for name in self.settings.CLASSIFIERS if name in suspicions.columns]
+        return suspicions[order + [col for col in suspicions.columns if col not in order]]
+
+    def run_sequentially(self):
+        total = len(self.classifiers)
         running = 1
-        for name, classifier in self.settings.CLASSIFIERS.items():
+        for name, classifier in self.classifiers.items():
             self.log.info(f'Running classifier {running} of {total}: {name}')
             model = self.load_trained_model(classifier)
             self.predict(model, name)
             running += 1
 
-        output = os.path.join(self.data_path, 'suspicions.xz')
-        kwargs = dict(compression='xz', encoding='utf-8', index=False)
-        self.suspicions.to_csv(output, **kwargs)
+    def run_in_chunks(self):
+        ids = self.settings.UNIQUE_IDS
+        ids = [ids] if isinstance(ids, str) else ids
+        partitions = self.partitions()
+        models = {
+            name: self.load_trained_model(classifier)
+            for name, classifier in self.classifiers.items()
+        }
+
+        whole = {}
+        for name, classifier in self.classifiers.items():
+            if not self.is_partitioned(classifier):
+                self.log.info(f'Running classifier {name} on the whole dataset')
+                whole[name] = self.classify(models[name], self.training_data(classifier))
+
+        # only writing is measured as output, classifiers are measured apart
+        writer = self.writer('suspicions')
+        try:
+            for number, rows in enumerate(partitions, 1):
+                self.log.info(f'Running chunk {number} of {len(partitions)} ({len(rows)} rows)')
+                chunk = self.dataset.iloc[rows]
+                suspicions = chunk[ids].copy() if ids else chunk.copy()
+                for name in self.classifiers:
+                    if name in whole:
+                        suspicions[name] = whole[name][rows]
+                    else:
+                        suspicions[name] = self.classify(models[name], chunk)
+                suspicions = self.keep_previous(suspicions)
+                with self.report.measure('output'):
+                    writer.write(suspicions)
+        finally:
+            with self.report.measure('output'):
+                writer.close()
+
+    def writer(self, name):
+        """Returns the writer for the output file `name` (without
+        extension), compressing with as many threads as workers."""
+        writer = WRITERS[self.output_format]
+        path = os.path.join(self.data_path, writer.filename(name, self.compression))
+        return writer(path, self.workers, self.compression)
+
+    def partitions(self):
+        """Returns a list of arrays with the positions of the rows of each
+        chunk: rows with the same `PARTITION_KEY` are always in the same
+        chunk (without it, chunks are just consecutive rows)."""
+        if self.PARTITION_KEY not in self.dataset.columns:
+            positions = np.arange(len(self.dataset))
+            return [positions[start:start + self.chunk_size]
+                    for start in range(0, len(positions), self.chunk_size)]
+
+        codes, _ = pd.factorize(self.dataset[self.PARTITION_KEY])
+        codes += 1  # missing values (-1) become a partition of their own
+        positions = np.argsort(codes, kind='mergesort')
+        ends = np.cumsum(np.bincount(codes))
+
+        partitions, start = [], 0
+        for end in ends[ends > 0]:
+            if end - start >= self.chunk_size or end == len(positions):
+                partitions.append(positions[start:end])
+                start = end
+        return partitions
 
-    def load_trained_model(self, classifier):
-        filename = '{}.pkl'.format(classifier.__name__.lower())
-        path = os.path.join(self.data_path, filename)
+    def is_partitioned(self, classifier):
+        """Whether a classifier can score each chunk on its own: when its
+        predictions do not depend on other rows, or only on rows of the same
+        partition."""
+        keys = getattr(classifier, 'GROUP_KEYS', None)
+        if keys is None:
+            return True
+        return self.PARTITION_KEY in keys and self.PARTITION_KEY in self.dataset.columns
 
-        # palliative: this outputs a model too large for joblib
-        if classifier.__name__ == 'MonthlySubquotaLimitClassifier':
-            model = classifier()
-            model.fit(self.dataset)
+    def run_in_parallel(self):
+        global _shared_core
+        _shared_core = self
 
+        total = len(self.classifiers)
+        workers = min(self.workers, total)
+        self.log.info(f'Running {total} classifiers in {workers} processes')
+        context = multiprocessing.get_context('fork')
+        try:
+            with ProcessPoolExecutor(workers, mp_context=context) as executor:
+                futures = tuple(
+                    executor.submit(_classify, name)
+                    for name in self.classifiers
+                )
+                predictions = {}
+                for finished, future in enumerate(as_completed(futures), 1):
+                    name, prediction, report = future.result()
+                    self.log.info(f'Finished classifier {finished} of {total}: {name}')
+                    predictions[name] = prediction
+                    self.report.update(report)
+        finally:
+            _shared_core = None
+
+        for name in self.classifiers:
+            self.suspicions[name] = predictions[name]
+
+    def run_incrementally(self):
+        ids = self.settings.UNIQUE_IDS
+        ids = [ids] if isinstance(ids, str) else list(ids)
+        path = os.path.join(self.data_path, self.STATE)
+        state = joblib.load(path) if os.path.isfile(path) else {}
+        models = state.get('models', {})  # keys of the models in the store
+        previous = state.get('rows')
+
+        keys = set()
+        for classifier in self.classifiers.values():
+            keys.update(getattr(classifier, 'GROUP_KEYS', None) or ())
+        keys = sorted(keys - set(ids))
+
+        current = self.dataset[ids + keys].copy()
+        current['hash'] = pd.util.hash_pandas_object(self.dataset, index=False).values
+
+        if previous is None:
+            merged, removed = current, current.iloc[:0]
+            changed = np.ones(len(current), dtype=np.bool)
         else:
-            if os.path.isfile(path):
-                model = joblib.load(path)
+            previous = previous.drop_duplicates(ids)
+            classifiers = [c for c in previous.columns if c in self.classifiers]
+            merged = pd.merge(current, previous[ids + ['hash'] + classifiers],
+                              how='left', on=ids + ['hash'], indicator=True)
+            changed = (merged['_merge'] != 'both').values
+
+            # removed rows might affect the groups they used to be part of
+            removed = pd.merge(previous[ids + keys], current[ids],
+                               how='left', on=ids, indicator=True)
+            removed = removed[removed['_merge'] == 'left_only']
+
+        self.log.info(f'{changed.sum()} new or changed rows, {len(removed)} removed rows')
+
+        updated = changed.copy()
+        total = len(self.classifiers)
+        running = 1
+        for name, classifier in self.classifiers.items():
+            if name in merged.columns:
+                rows = self.rows_to_score(classifier, changed, removed)
+                values = merged[name].fillna(False).values.astype(np.bool)
             else:
-                model = classifier()
-                model.fit(self.dataset)
-                joblib.dump(model, path)
+                rows = np.ones(len(current), dtype=np.bool)
+                values = np.zeros(len(current), dtype=np.bool)
+
+            self.log.info(f'Running classifier {running} of {total}: {name} ({rows.sum()} rows)')
+            if rows.any():
+                # models are kept between runs, so they agree with the rows
+                # that are not scored again
+                model = self.models.load(models[name]) if name in models else None
+                if model is None:
+                    model = self.load_trained_model(classifier)
+                    models[name] = self.model_keys[classifier]
+                prediction = self.classify(model, self.dataset[rows])
+                updated[rows] |= prediction != values[rows]
+                values[rows] = prediction
+
+            self.suspicions[name] = values
+            running += 1
+
+        with self.report.measure('output'), self.writer('suspicions-delta') as writer:
+            writer.write(self.suspicions[updated])
+
+        rows = pd.concat([self.suspicions, current[keys + ['hash']]], axis=1)
+        joblib.dump({'rows': rows, 'models': models}, path)
 
-        return model
+    def rows_to_score(self, classifier, changed, removed):
+        """Returns a boolean array with the changed rows, and with the rows
+        sharing a group with any changed or removed row."""
+        keys = getattr(classifier, 'GROUP_KEYS', None)
+        if keys is None:
+            return changed
+        if not keys:
+            return np.repeat(changed.any() or not removed.empty, len(changed))
+
+        groups = pd.concat([self.dataset.loc[changed, keys], removed[keys]])
+        groups = pd.MultiIndex.from_arrays([groups[key] for key in keys])
+        rows = pd.MultiIndex.from_arrays([self.dataset[key] for key in keys])
+        return changed | rows.isin(groups)
+
+    @staticmethod
+    def required_columns(settings, classifiers=None):
+        """Returns the columns needed by the classifiers (declared in their
+        `COLS` attribute) and by UNIQUE_IDS, or None (meaning all columns) if
+        any classifier does not declare them. The optional `classifiers`
+        limits it to these classifiers (names from CLASSIFIERS)."""
+        ids = settings.UNIQUE_IDS or []
+        columns = set([ids] if isinstance(ids, str) else ids)
+        for name, classifier in settings.CLASSIFIERS.items():
+            if classifiers and name not in classifiers:
+                continue
+            if not hasattr(classifier, 'COLS'):
+                return None
+            columns.update(classifier.COLS)
+            columns.update(getattr(classifier, 'GROUP_KEYS', None) or ())
+        return columns
+
+    def load_trained_model(self, classifier, dataset=None):
+        """Returns the model of a classifier from the model store, or trains
+        (and stores) it with `dataset` (the whole dataset by default)."""
+        dataset = self.dataset if dataset is None else dataset
+        model = classifier()
+        name = type(model).__name__
+        with self.report.measure('load', name):
+            self.models.remove_legacy([classifier])
+            key, metadata = self.models.key(model, self.training_data(classifier, dataset))
+            self.model_keys[classifier] = key
+            trained = self.models.load(key)
+
+        if trained is None:
+            with self.report.measure('fit', name):
+                model.fit(dataset)
+                self.models.save(key, model, metadata)
+            trained = model
+
+        return trained
+
+    def training_data(self, classifier, dataset=None):
+        """Returns the part of the dataset (or of `dataset`) a classifier is
+        trained with: the columns declared in its `COLS` attribute, or the
+        whole dataset."""
+        dataset = self.dataset if dataset is None else dataset
+        columns = getattr(classifier, 'COLS', None)
+        if not isinstance(columns, (list, tuple)):
+            return dataset
+        if not set(columns) <= set(dataset.columns):
+            return dataset
+        return dataset[columns]
 
     def predict(self, model, name):
-        model.transform(self.dataset)
-        prediction = model.predict(self.dataset)
-        self.suspicions[name] = prediction
+        self.suspicions[name] = self.classify(model)
+
+    def classify(self, model, dataset=None):
+        """Returns a boolean array flagging the suspicious rows of the
+        dataset (models returning 1 and -1 have -1 mapped as suspicious)."""
+        dataset = self.dataset if dataset is None else dataset
+        name = type(model).__name__
+        with self.report.measure('transform', name):
+            model.transform(dataset)
+        with self.report.measure('predict', name):
+            prediction = np.r_[model.predict(dataset)]
         if prediction.dtype == np.int:
-            self.suspicions.loc[prediction == 1, name] = False
-            self.suspicions.loc[prediction == -1, name] = True
+            return prediction == -1
+        return prediction
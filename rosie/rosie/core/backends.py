@@ -0,0 +1,163 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+try:
+    import dask
+    import dask.dataframe as dd
+except ImportError:
+    dask = dd = None
+
+BACKENDS = ('pandas', 'dask')
+
+
+def require_dask():
+    """Returns `dask.dataframe`, raising an ImportError explaining how to
+    install it if it is not available."""
+    if dd is None:
+        raise ImportError(
+            'The dask backend requires Dask DataFrame: '
+            'pip install "dask[dataframe]"'
+        )
+    return dd
+
+
+def is_partitioned(dataset):
+    """Whether a dataset is a partitioned (Dask) DataFrame."""
+    return dd is not None and isinstance(dataset, dd.DataFrame)
+
+
+class DaskBackend:
+    """
+    Runs the classifiers of a `Core` on a partitioned (Dask) dataset, so only
+    a few partitions are in memory at the same time, and `workers` of them
+    are processed at once (by Dask's scheduler: threads, unless the
+    `DASK_SCHEDULER` environment variable sets another one).
+
+    * Models are trained with the columns their classifiers declare in
+    `COLS` (see `Core.training_data`), loaded in memory.
+    * Classifiers whose predictions do not depend on other rows (without
+    `GROUP_KEYS`) score each partition of the dataset.
+    * Classifiers with `GROUP_KEYS` score partitions of their columns
+    shuffled (on disk) by these keys, so each group is in a single partition.
+    * Classifiers whose predictions depend on the whole dataset (empty
+    `GROUP_KEYS`) score their columns at once, in memory.
+
+    Predictions of shuffled or whole-dataset classifiers are kept as a
+    boolean array indexed by row number (one byte per row), and suspicions
+    are written partition by partition in the order of the dataset.
+    """
+
+    def __init__(self, core):
+        require_dask()
+        self.log = logging.getLogger(__name__)
+        self.core = core
+        self.scheduler = dask.config.get('scheduler', None) or 'threads'
+
+    def __call__(self):
+        core = self.core
+        with dask.config.set(scheduler=self.scheduler, num_workers=core.workers):
+            dataset, core.rows = self.numbered(self.partitioned(core.dataset))
+            self.log.info(f'{core.rows} rows in {dataset.npartitions} partitions')
+
+            models, predictions = {}, {}
+            for name, classifier in core.classifiers.items():
+                keys = getattr(classifier, 'GROUP_KEYS', None)
+                columns = self.columns(classifier, dataset)
+                self.log.info(f'Training classifier {name}')
+                training = dataset[columns].compute() if columns else dataset.compute()
+                models[name] = core.load_trained_model(classifier, training)
+                if keys is None:
+                    continue
+
+                self.log.info(f'Running classifier {name}')
+                if keys:
+                    shuffled = dataset[columns or list(dataset.columns)] \
+                        .shuffle(on=keys, shuffle='disk')
+                    scored = shuffled.map_partitions(
+                        self.classify, models[name], meta=(name, np.bool)
+                    ).compute()
+                else:
+                    scored = pd.Series(core.classify(models[name], training), index=training.index)
+                del training
+
+                predictions[name] = np.zeros(core.rows, dtype=np.bool)
+                predictions[name][scored.index.values] = scored.values
+
+            partitions = dataset.map_partitions(
+                self.suspicions, models, predictions,
+                meta=self.suspicions(dataset._meta, models, predictions)
+            ).to_delayed()
+            writer = core.writer('suspicions')
+            try:
+                for start in range(0, len(partitions), core.workers):
+                    self.log.info(f'Running partitions {start + 1} to '
+                                  f'{min(start + core.workers, len(partitions))} '
+                                  f'of {len(partitions)}')
+                    for suspicions in dask.compute(*partitions[start:start + core.workers]):
+                        with core.report.measure('output'):
+                            writer.write(suspicions)
+            finally:
+                with core.report.measure('output'):
+                    writer.close()
+
+    def partitioned(self, dataset):
+        if is_partitioned(dataset):
+            return dataset
+        partitions = max(self.core.workers, 1)
+        return dd.from_pandas(dataset.reset_index(drop=True), npartitions=partitions)
+
+    def numbered(self, dataset):
+        """Indexes the rows of the dataset by their position (`0` to
+        `len - 1`), with known divisions (empty partitions are dropped).
+        Returns the dataset and its number of rows."""
+        lengths = dataset.map_partitions(len).compute().tolist()
+        nonempty = [number for number, length in enumerate(lengths) if length]
+        lengths = [lengths[number] for number in nonempty]
+        if not nonempty:
+            return dd.from_pandas(dataset._meta.reset_index(drop=True), npartitions=1), 0
+
+        starts = np.r_[0, np.cumsum(lengths)[:-1]].tolist()
+        dataset = dataset.partitions[nonempty]
+
+        def number(df, partition_info=None):
+            start = starts[partition_info['number']]
+            return df.set_index(pd.RangeIndex(start, start + len(df)))
+
+        numbered = dataset.map_partitions(number, meta=dataset._meta.reset_index(drop=True))
+        numbered.divisions = tuple(starts) + (starts[-1] + lengths[-1] - 1,)
+        return numbered, sum(lengths)
+
+    def columns(self, classifier, dataset):
+        """Returns the columns a classifier declares in `COLS` and
+        `GROUP_KEYS`, or None (meaning all columns) if they are not in the
+        dataset."""
+        columns = getattr(classifier, 'COLS', None)
+        if not isinstance(columns, (list, tuple)):
+            return None
+        columns = list(columns) + [key for key in getattr(classifier, 'GROUP_KEYS', None) or ()
+                                   if key not in columns]
+        if not set(columns) <= set(dataset.columns):
+            return None
+        return columns
+
+    def classify(self, df, model):
+        """Scores a partition, keeping its row numbers."""
+        if df.empty:
+            return pd.Series([], dtype=np.bool, index=df.index)
+        return pd.Series(self.core.classify(model, df), index=df.index)
+
+    def suspicions(self, df, models, predictions):
+        """Returns the suspicions of a partition."""
+        core = self.core
+        ids = core.settings.UNIQUE_IDS
+        suspicions = df[ids].copy() if ids else df.copy()
+        for name in core.classifiers:
+            if name in predictions:
+                suspicions[name] = predictions[name][df.index.values]
+            elif df.empty:
+                suspicions[name] = np.zeros(0, dtype=np.bool)
+            else:
+                suspicions[name] = core.classify(models[name], df)
+        return core.keep_previous(suspicions)
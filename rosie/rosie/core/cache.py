@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+
+class DatasetCache:
+    """
+    Keeps a prepared dataset on disk while the files it was built from do not
+    change. The dataset is stored as a pickle (keeping dtypes such as
+    categories and dates) and a JSON file keeps the fingerprint of each source
+    file (size, modification time and SHA-1) and any extra parameters used to
+    build it (e.g. the selected columns).
+
+    Sources with the same size and modification time are taken as unchanged;
+    otherwise their hash is compared, so touching a file does not invalidate
+    the cache.
+
+    A `columns` parameter is special: a dataset cached with all columns
+    (None) or with more columns than requested is loaded with only the
+    requested ones.
+
+    A `schema` parameter (see `DatasetCache.schema`) describes the code
+    building the dataset (e.g. its dtypes), so a dataset cached by another
+    version of it is stale even if the sources did not change.
+    """
+
+    CHUNK_SIZE = 2 ** 20
+
+    def __init__(self, path, name):
+        self.log = logging.getLogger(__name__)
+        self.path = Path(path) / f'{name}.pkl'
+        self.metadata_path = Path(path) / f'{name}.json'
+
+    def load(self, sources, **params):
+        """Returns the cached dataset or None if it is missing or stale."""
+        if not self.path.exists() or not self.metadata_path.exists():
+            return None
+
+        with open(self.metadata_path) as fobj:
+            metadata = json.load(fobj)
+
+        cached, params = metadata.get('params') or {}, self.serialize(params)
+        if not self.covers(cached, params):
+            return None
+
+        fingerprints = metadata.get('sources', {})
+        if set(fingerprints) != set(str(source) for source in sources):
+            return None
+
+        refreshed = {}
+        for source in sources:
+            known = fingerprints[str(source)]
+            refreshed[str(source)] = self.fingerprint(source, known)
+            if refreshed[str(source)]['sha1'] != known.get('sha1'):
+                return None
+
+        if refreshed != fingerprints:  # touched, but the contents are the same
+            metadata['sources'] = refreshed
+            with open(self.metadata_path, 'w') as fobj:
+                json.dump(metadata, fobj)
+
+        self.log.info(f'Loading cached dataset from {self.path}')
+        df = pd.read_pickle(str(self.path))
+        if params.get('columns') and params['columns'] != cached.get('columns'):
+            df = df[[col for col in df.columns if col in params['columns']]]
+        return df
+
+    def save(self, df, sources, **params):
+        self.log.info(f'Caching dataset at {self.path}')
+        metadata = {
+            'params': self.serialize(params),
+            'sources': {str(source): self.fingerprint(source) for source in sources}
+        }
+
+        tmp = self.path.with_suffix('.tmp')
+        df.to_pickle(str(tmp))
+        os.replace(str(tmp), str(self.path))
+        with open(self.metadata_path, 'w') as fobj:
+            json.dump(metadata, fobj)
+
+    def fingerprint(self, source, known=None):
+        """Returns size, modification time and SHA-1 of a file. The hash is
+        only calculated if the size or the modification time differ from the
+        `known` fingerprint."""
+        stat = os.stat(str(source))
+        fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        if known and all(known.get(key) == value for key, value in fingerprint.items()):
+            fingerprint['sha1'] = known.get('sha1')
+            return fingerprint
+
+        sha1 = hashlib.sha1()
+        with open(str(source), 'rb') as fobj:
+            for chunk in iter(lambda: fobj.read(self.CHUNK_SIZE), b''):
+                sha1.update(chunk)
+        fingerprint['sha1'] = sha1.hexdigest()
+        return fingerprint
+
+    @staticmethod
+    def covers(cached, params):
+        """Whether a dataset cached with `cached` params has the dataset
+        requested with `params`."""
+        cached, params = dict(cached), dict(params)
+        if cached.pop('schema', None) != params.pop('schema', None):
+            return False
+        cached_columns, columns = cached.pop('columns', None), params.pop('columns', None)
+        if cached != params:
+            return False
+        if cached_columns is None:
+            return True
+        return bool(columns) and set(columns) <= set(cached_columns)
+
+    @staticmethod
+    def schema(version, *definitions):
+        """Returns the SHA-1 of a version number (to be increased whenever
+        the preparation of the dataset changes) and of the definitions it
+        is built with (e.g. dtypes and categories)."""
+        contents = json.dumps([version, *definitions], sort_keys=True, default=str)
+        return hashlib.sha1(contents.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def serialize(params):
+        return json.loads(json.dumps(params, sort_keys=True, default=str))
@@ -1,6 +1,6 @@
 import numpy as np
+import pandas as pd
 from sklearn.base import TransformerMixin
-from brutils import cpf, cnpj
 
 
 class InvalidCnpjCpfClassifier(TransformerMixin):
@@ -10,6 +10,9 @@ class InvalidCnpjCpfClassifier(TransformerMixin):
     Validate a `recipient_id` field by calculating its expected check digit
     and verifying the authenticity of the provided ones.
 
+    Check digits are calculated for all distinct values of `recipient_id` at
+    once, using a matrix with one digit per column.
+
     Dataset
     -------
     document_type : category column
@@ -19,6 +22,15 @@ class InvalidCnpjCpfClassifier(TransformerMixin):
     recipient_id : string column
         A CNPJ (Brazilian company ID) or CPF (Brazilian personal tax ID).
     """
+
+    COLS = ['document_type',
+            'recipient_id']
+    DOCUMENT_TYPES = ('bill_of_sale', 'simple_receipt', 'unknown')
+    CPF_WEIGHTS = (np.arange(10, 1, -1),
+                   np.arange(11, 1, -1))
+    CNPJ_WEIGHTS = (np.array((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)),
+                    np.array((6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)))
+
     def fit(self, dataframe):
         return self
 
@@ -26,9 +38,31 @@ class InvalidCnpjCpfClassifier(TransformerMixin):
         return self
 
     def predict(self, dataframe):
-        def is_invalid(row):
-            valid_cpf = cpf.validate(str(row['recipient_id']).zfill(11))
-            valid_cnpj = cnpj.validate(str(row['recipient_id']).zfill(14))
-            good_doctype = row['document_type'] in ('bill_of_sale', 'simple_receipt', 'unknown')
-            return good_doctype and (not (valid_cpf or valid_cnpj))
-        return np.r_[dataframe.apply(is_invalid, axis=1)]
+        # recipients repeat a lot, so each distinct one is validated once
+        codes, recipient_ids = pd.factorize(dataframe['recipient_id'].astype(str))
+        recipient_ids = pd.Series(recipient_ids)
+        is_valid = self.__validate(recipient_ids.str.zfill(11), self.CPF_WEIGHTS) | \
+            self.__validate(recipient_ids.str.zfill(14), self.CNPJ_WEIGHTS)
+
+        good_doctype = dataframe['document_type'].isin(self.DOCUMENT_TYPES).values
+        return np.r_[good_doctype & ~is_valid[codes]]
+
+    def __validate(self, numbers, weights):
+        size = len(weights[-1]) + 1
+        is_valid = np.zeros(len(numbers), dtype=np.bool)
+        candidates = (numbers.str.len() == size) & \
+            numbers.str.match(r'^[0-9]+$').fillna(False)
+        if not candidates.any():
+            return is_valid
+
+        text = ''.join(numbers[candidates]).encode('ascii')
+        digits = np.frombuffer(text, dtype=np.uint8).reshape(-1, size) - ord('0')
+        is_valid[candidates.values] = \
+            (self.__check_digit(digits, weights[0]) == digits[:, -2]) & \
+            (self.__check_digit(digits, weights[1]) == digits[:, -1]) & \
+            (digits != digits[:, :1]).any(axis=1)  # e.g. 111.111.111-11
+        return is_valid
+
+    def __check_digit(self, digits, weights):
+        remainder = digits[:, :len(weights)].astype(np.int) @ weights % 11
+        return np.where(remainder < 2, 0, 11 - remainder)
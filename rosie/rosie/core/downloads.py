@@ -0,0 +1,58 @@
+import json
+import logging
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+
+class Downloads:
+    """
+    Keeps the versions (ETags) of the files downloaded by an adapter in a
+    JSON file, so files that did not change on the server are not downloaded
+    again. Files from servers that do not send ETags are compared by size.
+    """
+
+    TIMEOUT = 30
+
+    def __init__(self, path):
+        self.log = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.versions = {}
+        if self.path.exists():
+            with open(str(self.path)) as fobj:
+                self.versions = json.load(fobj)
+
+    def remote(self, url):
+        """Returns the ETag and the size of a remote file (or None if the
+        server could not tell them)."""
+        request = Request(url, method='HEAD')
+        try:
+            with urlopen(request, timeout=self.TIMEOUT) as response:
+                size = response.headers.get('Content-Length')
+                return {
+                    'etag': response.headers.get('ETag'),
+                    'size': int(size) if size else None
+                }
+        except (URLError, OSError) as e:  # HTTPError is an URLError
+            self.log.warning(f'Could not check {url}: {e}')
+            return None
+
+    def is_up_to_date(self, key, remote, downloaded):
+        """Whether the `downloaded` file matches the `remote` one: same ETag
+        as the one recorded for `key` or, without ETags, same size."""
+        downloaded = Path(downloaded)
+        if not remote or not downloaded.exists():
+            return False
+
+        known = self.versions.get(str(key))
+        if remote['etag'] and known:
+            return remote['etag'] == known
+        return bool(remote['size']) and downloaded.stat().st_size == remote['size']
+
+    def record(self, key, remote):
+        """Records the version of the file downloaded for `key`."""
+        self.versions[str(key)] = remote['etag'] if remote else None
+
+    def save(self):
+        with open(str(self.path), 'w') as fobj:
+            json.dump(self.versions, fobj)
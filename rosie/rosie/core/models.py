@@ -0,0 +1,166 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+from sklearn.externals import joblib
+
+
+class ModelStore:
+    """
+    Keeps fitted classifiers on disk, so they are only trained again when
+    their inputs change. Each model is stored under a key made of:
+
+    * the classifier name;
+    * the classifier parameters (the attributes of a new instance);
+    * the hash of the classifier source code;
+    * the fingerprint of the training data.
+
+    Each entry is a joblib file (compressed, unless `compress` is 0, in which
+    case arrays are memory-mapped when loading it, as with `rosie.py run
+    --uncompressed-models`) and a JSON file with its
+    metadata, including when it was last used: once the entries take more
+    than `max_size` bytes, the least recently used ones are removed.
+
+    Models saved by older versions as `<classifier>.pkl` next to the store
+    directory are never loaded again, and are removed by `remove_legacy`.
+    """
+
+    MAX_SIZE = 2 ** 30
+    COMPRESS = 3
+
+    def __init__(self, path, max_size=MAX_SIZE, compress=COMPRESS):
+        self.log = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.max_size = max_size
+        self.compress = compress
+
+    def key(self, model, data):
+        """Returns the key of a (not fitted) model and its training data,
+        besides the metadata describing it."""
+        metadata = {
+            'classifier': type(model).__name__,
+            'params': self.params(model),
+            'source': self.source(type(model)),
+            'data': self.fingerprint(data)
+        }
+        contents = json.dumps(metadata, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(contents).hexdigest(), metadata
+
+    def load(self, key):
+        """Returns the model stored with this key, or None."""
+        model_path, metadata_path = self.paths(key)
+        try:
+            with open(str(metadata_path)) as fobj:
+                metadata = json.load(fobj)
+            mmap_mode = None if metadata.get('compress') else 'r'
+            model = joblib.load(str(model_path), mmap_mode=mmap_mode)
+        except (OSError, ValueError, EOFError):
+            return None
+
+        metadata['last_used'] = time.time()
+        self.write_metadata(key, metadata)
+        self.log.info(f'Loading {metadata["classifier"]} model from {model_path}')
+        return model
+
+    def save(self, key, model, metadata):
+        model_path, _ = self.paths(key)
+        self.log.info(f'Saving {metadata["classifier"]} model at {model_path}')
+        os.makedirs(str(self.path), exist_ok=True)
+
+        tmp = model_path.with_suffix('.tmp')
+        joblib.dump(model, str(tmp), compress=self.compress)
+        os.replace(str(tmp), str(model_path))
+
+        metadata = dict(metadata, key=key, compress=self.compress,
+                        size=model_path.stat().st_size, created=time.time(),
+                        last_used=time.time())
+        self.write_metadata(key, metadata)
+        self.prune(self.max_size, keep=key)
+
+    def entries(self):
+        """Returns the metadata of the stored models, most recently used
+        first."""
+        entries = []
+        for path in self.path.glob('*.json'):
+            try:
+                with open(str(path)) as fobj:
+                    entries.append(json.load(fobj))
+            except (OSError, ValueError):  # removed by another process
+                continue
+        return sorted(entries, key=lambda entry: entry['last_used'], reverse=True)
+
+    def prune(self, max_size=None, keep=None):
+        """Removes the least recently used models until the remaining ones
+        take at most `max_size` bytes (the store `max_size` by default),
+        except the one with the `keep` key. Returns the metadata of the
+        removed ones."""
+        if max_size is None:
+            max_size = self.max_size
+        removed, total = [], 0
+        for entry in self.entries():
+            total += entry['size']
+            if total > max_size and entry['key'] != keep:
+                self.remove(entry['key'])
+                removed.append(entry)
+        return removed
+
+    def remove_legacy(self, classifiers):
+        """Removes the models of these classifiers (classes) saved by older
+        versions. Returns the paths of the removed files."""
+        removed = []
+        for classifier in classifiers:
+            path = self.path.parent / f'{classifier.__name__.lower()}.pkl'
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self.log.info(f'Removed legacy {classifier.__name__} model {path}')
+            removed.append(path)
+        return removed
+
+    def remove(self, key):
+        for path in self.paths(key):
+            try:
+                path.unlink()
+            except FileNotFoundError:  # removed by another process
+                pass
+
+    def paths(self, key):
+        return self.path / f'{key}.pkl', self.path / f'{key}.json'
+
+    def write_metadata(self, key, metadata):
+        _, path = self.paths(key)
+        tmp = path.with_suffix('.json.tmp')
+        with open(str(tmp), 'w') as fobj:
+            json.dump(metadata, fobj)
+        os.replace(str(tmp), str(path))
+
+    @staticmethod
+    def params(model):
+        params = getattr(model, 'get_params', None)
+        params = params() if callable(params) else vars(model)
+        return json.loads(json.dumps(params, sort_keys=True, default=str))
+
+    @staticmethod
+    def source(cls):
+        """Returns the SHA-1 of the source code of the module defining the
+        class (or an empty string if it is not available)."""
+        try:
+            source = inspect.getsource(inspect.getmodule(cls))
+        except (OSError, TypeError):
+            return ''
+        return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def fingerprint(df):
+        """Returns the SHA-1 of the contents of a dataset."""
+        sha1 = hashlib.sha1(str(df.shape).encode('utf-8'))
+        for column in sorted(df.columns):
+            sha1.update(str(column).encode('utf-8'))
+            sha1.update(pd.util.hash_pandas_object(df[column], index=False).values.tobytes())
+        return sha1.hexdigest()
@@ -0,0 +1,78 @@
+import json
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss():
+    """Returns the peak resident set size of the process in bytes (or None
+    if it is not available)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # KB on Linux
+
+
+class RunReport:
+    """
+    Measures the stages of a run (e.g. loading the dataset) and the phases of
+    each classifier (loading or fitting its model, transform and predict).
+    For each of them it keeps the wall time and CPU time (in seconds), how
+    much the peak resident set size of the process grew (in bytes) and the
+    number of calls: repeated stages (e.g. predicting each chunk) are added
+    up.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.stages = OrderedDict()
+        self.classifiers = OrderedDict()
+
+    @contextmanager
+    def measure(self, stage, classifier=None):
+        wall, cpu, rss = time.perf_counter(), time.process_time(), peak_rss()
+        try:
+            yield
+        finally:
+            delta = None if rss is None else peak_rss() - rss
+            self.add(stage, classifier,
+                     wall=time.perf_counter() - wall,
+                     cpu=time.process_time() - cpu,
+                     peak_rss_delta=delta)
+
+    def add(self, stage, classifier=None, wall=0., cpu=0., peak_rss_delta=None, calls=1):
+        if classifier:
+            stages = self.classifiers.setdefault(classifier, OrderedDict())
+        else:
+            stages = self.stages
+        metrics = stages.setdefault(stage, dict(wall=0., cpu=0., peak_rss_delta=None, calls=0))
+        metrics['wall'] += wall
+        metrics['cpu'] += cpu
+        metrics['calls'] += calls
+        if peak_rss_delta is not None:
+            metrics['peak_rss_delta'] = max(metrics['peak_rss_delta'] or 0, peak_rss_delta)
+
+    def update(self, other):
+        """Adds the measurements of another report (e.g. from a worker)."""
+        for stage, metrics in other.stages.items():
+            self.add(stage, **metrics)
+        for classifier, stages in other.classifiers.items():
+            for stage, metrics in stages.items():
+                self.add(stage, classifier, **metrics)
+
+    def save(self, path, **info):
+        """Saves the report as JSON, with any extra `info` about the run."""
+        report = OrderedDict(info)
+        report['started'] = self.started.isoformat()
+        report['finished'] = datetime.now().isoformat()
+        report['stages'] = self.stages
+        report['classifiers'] = self.classifiers
+        with open(path, 'w') as fobj:
+            json.dump(report, fobj, indent=2)
@@ -0,0 +1,86 @@
+import os
+from unittest import TestCase, skipIf
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+from rosie.core import Core
+from rosie.core.backends import dd, require_dask
+from rosie.core.tests.test_core_init import EvenNumberClassifier, PartitionedTestCase
+
+
+class LargestNumberClassifier(EvenNumberClassifier):
+    """Suspicious if it is the largest number of its applicant."""
+
+    COLS = ['number']
+    GROUP_KEYS = ['applicant_id']
+
+    def predict(self, X):
+        largest = X.groupby('applicant_id')['number'].transform('max')
+        return (X['number'] == largest).values
+
+
+class AboveAverageClassifier(EvenNumberClassifier):
+    """Suspicious if it is above the average of the whole dataset."""
+
+    COLS = ['number']
+    GROUP_KEYS = []
+
+    def predict(self, X):
+        return (X['number'] > X['number'].mean()).values
+
+
+@skipIf(dd is None, 'Dask DataFrame is not installed')
+class TestDaskBackend(PartitionedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.settings.CLASSIFIERS = {
+            'even': EvenNumberClassifier,
+            'largest': LargestNumberClassifier,
+            'above_average': AboveAverageClassifier
+        }
+
+    def suspicions(self):
+        path = os.path.join(self.adapter.path, 'suspicions.xz')
+        return pd.read_csv(path)
+
+    def test_same_suspicions_as_pandas(self):
+        Core(self.settings, self.adapter)()
+        expected = self.suspicions()
+        self.adapter.dataset = dd.from_pandas(self.adapter.dataset, npartitions=3)
+        Core(self.settings, self.adapter, workers=2, backend='dask')()
+        self.assertTrue(expected.equals(self.suspicions()))
+
+    def test_dataset_in_memory_is_partitioned(self):
+        Core(self.settings, self.adapter)()
+        expected = self.suspicions()
+        Core(self.settings, self.adapter, workers=3, backend='dask')()
+        self.assertTrue(expected.equals(self.suspicions()))
+
+    def test_empty_partitions(self):
+        Core(self.settings, self.adapter)()
+        expected = self.suspicions()
+        dataset = dd.from_pandas(self.adapter.dataset, npartitions=2)
+        self.adapter.dataset = dataset[dataset['number'] < 5]
+        Core(self.settings, self.adapter, backend='dask')()
+        self.assertEqual(expected['text'][:4].tolist(), self.suspicions()['text'].tolist())
+
+    def test_report(self):
+        core = Core(self.settings, self.adapter, backend='dask')
+        self.assertIsNone(core.rows)
+        core()
+        self.assertEqual(6, core.rows)
+
+
+class TestBackends(TestCase):
+
+    def test_unknown_backend(self):
+        adapter = MagicMock()
+        adapter.dataset = pd.DataFrame({'number': (1, 2)})
+        with self.assertRaises(ValueError):
+            Core(MagicMock(), adapter, backend='spark')
+
+    def test_require_dask(self):
+        with patch('rosie.core.backends.dd', None), self.assertRaises(ImportError):
+            require_dask()
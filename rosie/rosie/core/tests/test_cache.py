@@ -0,0 +1,72 @@
+import os
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import patch
+
+import pandas as pd
+
+from rosie.core.cache import DatasetCache
+
+
+class TestDatasetCache(TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.source = Path(self.path) / 'source.csv'
+        self.source.write_text('number\n1\n2\n')
+        self.dataset = pd.DataFrame({'number': (1, 2)})
+        self.dataset['date'] = pd.to_datetime(('2018-01-01', '2018-01-02'))
+        self.cache = DatasetCache(self.path, 'dataset')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_load_without_cache(self):
+        self.assertIsNone(self.cache.load([self.source]))
+
+    def test_load_from_cache(self):
+        self.cache.save(self.dataset, [self.source])
+        cached = self.cache.load([self.source])
+        self.assertTrue(self.dataset.equals(cached))
+
+    def test_load_after_source_changed(self):
+        self.cache.save(self.dataset, [self.source])
+        self.source.write_text('number\n1\n2\n3\n')
+        self.assertIsNone(self.cache.load([self.source]))
+
+    def test_load_after_source_touched(self):
+        self.cache.save(self.dataset, [self.source])
+        os.utime(str(self.source), ns=(0, 0))
+        self.assertTrue(self.dataset.equals(self.cache.load([self.source])))
+        with patch('rosie.core.cache.hashlib') as hashlib:
+            self.cache.load([self.source])
+            hashlib.sha1.assert_not_called()
+
+    def test_load_with_different_sources(self):
+        self.cache.save(self.dataset, [self.source])
+        other = Path(self.path) / 'other.csv'
+        other.write_text('number\n3\n')
+        self.assertIsNone(self.cache.load([self.source, other]))
+
+    def test_load_with_different_params(self):
+        self.cache.save(self.dataset, [self.source], columns=['number'])
+        self.assertIsNone(self.cache.load([self.source], columns=['date']))
+        self.assertIsNotNone(self.cache.load([self.source], columns=['number']))
+
+    def test_load_with_different_schema(self):
+        schema = DatasetCache.schema(1, {'number': 'int8'})
+        self.cache.save(self.dataset, [self.source], schema=schema)
+        self.assertIsNone(self.cache.load([self.source]))
+        self.assertIsNone(self.cache.load([self.source], schema=DatasetCache.schema(2, {'number': 'int8'})))
+        self.assertIsNone(self.cache.load([self.source], schema=DatasetCache.schema(1, {'number': 'int16'})))
+        self.assertIsNotNone(self.cache.load([self.source], schema=schema))
+
+    def test_load_subset_of_columns(self):
+        self.cache.save(self.dataset, [self.source], columns=None)
+        cached = self.cache.load([self.source], columns=['date'])
+        self.assertEqual(['date'], list(cached.columns))
+        self.cache.save(self.dataset, [self.source], columns=['date', 'number'])
+        self.assertEqual(['number'], list(self.cache.load([self.source], columns=['number']).columns))
+        self.assertIsNone(self.cache.load([self.source], columns=None))
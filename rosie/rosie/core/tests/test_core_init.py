@@ -1,4 +1,8 @@
+import json
 import os
+import shutil
+from contextlib import contextmanager
+from tempfile import mkdtemp
 from unittest import TestCase
 from unittest.mock import MagicMock, call, patch
 
@@ -6,10 +10,33 @@ import numpy as np
 import pandas as pd
 
 from rosie.core import Core
+from rosie.core.models import ModelStore
+from rosie.core.report import RunReport
+from rosie.core.writers import ColumnarWriter, CsvWriter
 
 DATAFRAME = pd.DataFrame({'number': (1, 2), 'text': ('one', 'two')})
 
 
+class EvenNumberClassifier:
+
+    GROUP_KEYS = None
+
+    def fit(self, X):
+        return self
+
+    def transform(self, X=None):
+        pass
+
+    def predict(self, X):
+        return (X['number'] % 2 == 0).values
+
+
+class OddNumberClassifier(EvenNumberClassifier):
+
+    def predict(self, X):
+        return (X['number'] % 2 == 1).values
+
+
 class TestCore(TestCase):
 
     def setUp(self):
@@ -23,15 +50,22 @@ class TestCore(TestCase):
         core = Core(settings, self.adapter)
         self.assertTrue(core.suspicions.equals(DATAFRAME[['number']]))
 
+    def test_init_with_uncompressed_models(self):
+        settings = MagicMock()
+        self.assertEqual(ModelStore.COMPRESS, Core(settings, self.adapter).models.compress)
+        self.assertEqual(0, Core(settings, self.adapter, compress_models=False).models.compress)
+
     def test_init_without_unique_ids(self):
         settings = MagicMock()
         settings.UNIQUE_IDS = None
         core = Core(settings, self.adapter)
         self.assertTrue(core.suspicions.equals(DATAFRAME))
 
+    @patch.object(Core, 'save_report')
+    @patch.object(Core, 'writer')
     @patch.object(Core, 'load_trained_model')
     @patch.object(Core, 'predict')
-    def test_call(self, mocked_predict, mocked_load):
+    def test_call(self, mocked_predict, mocked_load, mocked_writer, mocked_save_report):
         mocked_load.return_value = 'model'
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
@@ -47,62 +81,84 @@ class TestCore(TestCase):
             call('model', 'another')
         ), any_order=True)
 
-        # assert suspicions.xz was created
-        expected_path = os.path.join('tmp', 'test', 'suspicions.xz')
-        core.suspicions.to_csv.assert_called_once_with(
-            expected_path,
-            compression='xz',
-            encoding='utf-8',
-            index=False
-        )
+        # assert suspicions were saved
+        mocked_writer.assert_called_once_with('suspicions')
+        writer = mocked_writer.return_value.__enter__.return_value
+        writer.write.assert_called_once_with(core.suspicions)
+        mocked_save_report.assert_called_once_with()
 
-    @patch('rosie.core.os.path.isfile')
-    @patch('rosie.core.joblib')
-    def test_load_trained_model_without_pickle(self, joblib, isfile):
-        isfile.return_value = False
+    def test_writer(self):
+        writer_class = MagicMock()
+        writer_class.filename.return_value = 'suspicions.columns.zst'
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        core = Core(settings, self.adapter, workers=4, output_format='columnar', compression='zstd')
+        with patch.dict('rosie.core.WRITERS', {'columnar': writer_class}):
+            writer = core.writer('suspicions')
 
-        ClassifierClass, classifier_instance = MagicMock(), MagicMock()
-        ClassifierClass.return_value = classifier_instance
-        ClassifierClass.__name__ = 'ClassifierMock'
+        self.assertEqual(writer_class.return_value, writer)
+        writer_class.filename.assert_called_once_with('suspicions', 'zstd')
+        expected_path = os.path.join('tmp', 'test', 'suspicions.columns.zst')
+        writer_class.assert_called_once_with(expected_path, 4, 'zstd')
 
+    @patch.object(Core, 'load_trained_model')
+    def test_call_in_parallel(self, mocked_load):
+        model = MagicMock()
+        model.predict.return_value = np.array((1, -1), dtype=np.int)
+        mocked_load.return_value = model
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
-        core = Core(settings, self.adapter)
-        core.load_trained_model(ClassifierClass)
+        settings.CLASSIFIERS = {'answer': 42, 'another': 13}
+        core = Core(settings, self.adapter, workers=2)
+        with patch.object(core, 'writer'), patch.object(core, 'save_report'):
+            core()
 
-        expected_path = os.path.join('tmp', 'test', 'classifiermock.pkl')
-        classifier_instance.fit.assert_called_once_with(core.dataset)
-        joblib.dump.assert_called_once_with(classifier_instance, expected_path)
+        for name in settings.CLASSIFIERS:
+            with self.subTest():
+                self.assertEqual([False, True], core.suspicions[name].tolist())
 
-    @patch('rosie.core.os.path.isfile')
-    @patch('rosie.core.joblib')
-    def test_load_trained_model_with_pickle(self, joblib, isfile):
-        isfile.return_value = True
+        # measurements from the workers are in the report
+        self.assertEqual(2, core.report.classifiers['MagicMock']['predict']['calls'])
 
+    def test_load_trained_model_not_stored(self):
         ClassifierClass, classifier_instance = MagicMock(), MagicMock()
         ClassifierClass.return_value = classifier_instance
-        ClassifierClass.__name__ = 'ClassifierMock'
 
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
         core = Core(settings, self.adapter)
-        core.load_trained_model(ClassifierClass)
+        core.models = MagicMock()
+        core.models.key.return_value = ('key', {'classifier': 'ClassifierMock'})
+        core.models.load.return_value = None
+        model = core.load_trained_model(ClassifierClass)
 
-        expected_path = os.path.join('tmp', 'test', 'classifiermock.pkl')
-        self.assertFalse(classifier_instance.fit.called)
-        joblib.load.assert_called_once_with(expected_path)
+        self.assertEqual(classifier_instance, model)
+        classifier_instance.fit.assert_called_once_with(core.dataset)
+        core.models.save.assert_called_once_with(
+            'key', classifier_instance, {'classifier': 'ClassifierMock'})
 
-    def test_load_trained_model_for_subquota(self):
+    def test_load_trained_model_stored(self):
         ClassifierClass, classifier_instance = MagicMock(), MagicMock()
         ClassifierClass.return_value = classifier_instance
-        ClassifierClass.__name__ = 'MonthlySubquotaLimitClassifier'
 
         settings = MagicMock()
         settings.UNIQUE_IDS = ['number']
         core = Core(settings, self.adapter)
-        core.load_trained_model(ClassifierClass)
+        core.models = MagicMock()
+        core.models.key.return_value = ('key', {'classifier': 'ClassifierMock'})
+        model = core.load_trained_model(ClassifierClass)
 
-        classifier_instance.fit.assert_called_once_with(core.dataset)
+        self.assertEqual(core.models.load.return_value, model)
+        self.assertFalse(classifier_instance.fit.called)
+        core.models.load.assert_called_once_with('key')
+
+    def test_training_data_with_cols(self):
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        core = Core(settings, self.adapter)
+        with patch.object(EvenNumberClassifier, 'COLS', ['number'], create=True):
+            self.assertEqual(['number'], list(core.training_data(EvenNumberClassifier).columns))
+        self.assertTrue(DATAFRAME.equals(core.training_data(EvenNumberClassifier)))
 
     def test_predict(self):
         model = MagicMock()
@@ -116,3 +172,268 @@ class TestCore(TestCase):
         model.predict.assert_called_once_with(core.dataset)
         self.assertFalse(core.suspicions.iloc[0]['hypothesis'])
         self.assertTrue(core.suspicions.iloc[1]['hypothesis'])
+
+
+class TestRequiredColumns(TestCase):
+
+    def test_required_columns(self):
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        settings.CLASSIFIERS = {'even': EvenNumberClassifier}
+        with patch.object(EvenNumberClassifier, 'COLS', ['text'], create=True):
+            self.assertEqual({'number', 'text'}, Core.required_columns(settings))
+
+    def test_required_columns_of_selected_classifiers(self):
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        settings.CLASSIFIERS = {'even': EvenNumberClassifier, 'odd': OddNumberClassifier}
+        with patch.object(EvenNumberClassifier, 'COLS', ['text'], create=True), \
+                patch.object(OddNumberClassifier, 'COLS', ['group'], create=True):
+            columns = Core.required_columns(settings, ['odd'])
+        self.assertEqual({'number', 'group'}, columns)
+
+    def test_required_columns_without_cols(self):
+        settings = MagicMock()
+        settings.UNIQUE_IDS = ['number']
+        settings.CLASSIFIERS = {'even': EvenNumberClassifier}
+        self.assertIsNone(Core.required_columns(settings))
+
+
+class TestIncrementalCore(TestCase):
+
+    def setUp(self):
+        self.adapter = MagicMock()
+        self.adapter.dataset = pd.DataFrame({
+            'number': (1, 2, 3, 4),
+            'text': ('one', 'two', 'three', 'four'),
+            'group': ('a', 'a', 'b', 'b')
+        })
+        self.adapter.path = mkdtemp()
+        self.settings = MagicMock()
+        self.settings.UNIQUE_IDS = ['text']
+        self.settings.CLASSIFIERS = {'even': EvenNumberClassifier}
+
+    def tearDown(self):
+        shutil.rmtree(self.adapter.path)
+
+    def delta(self):
+        path = os.path.join(self.adapter.path, 'suspicions-delta.xz')
+        return pd.read_csv(path)
+
+    def test_report(self):
+        Core(self.settings, self.adapter)()
+        with open(os.path.join(self.adapter.path, Core.REPORT)) as fobj:
+            report = json.load(fobj)
+        self.assertEqual(4, report['rows'])
+        self.assertEqual(['dataset', 'output'], list(report['stages']))
+        phases = report['classifiers']['EvenNumberClassifier']
+        self.assertEqual(['load', 'fit', 'transform', 'predict'], list(phases))
+
+    def test_first_run_scores_all_rows(self):
+        core = Core(self.settings, self.adapter, incremental=True)
+        core()
+        self.assertEqual([False, True, False, True], core.suspicions['even'].tolist())
+        self.assertEqual(4, len(self.delta()))
+        self.assertTrue(os.path.isfile(os.path.join(self.adapter.path, Core.STATE)))
+
+    def test_next_run_scores_changed_rows(self):
+        Core(self.settings, self.adapter, incremental=True)()
+        self.adapter.dataset = self.adapter.dataset.copy()
+        self.adapter.dataset.loc[0, 'number'] = 42
+        with patch.object(EvenNumberClassifier, 'predict') as predict:
+            predict.return_value = np.array((True,))
+            core = Core(self.settings, self.adapter, incremental=True)
+            core()
+            scored, = predict.call_args[0]
+        self.assertEqual(['one'], scored['text'].tolist())
+        self.assertEqual([True, True, False, True], core.suspicions['even'].tolist())
+        self.assertEqual(['one'], self.delta()['text'].tolist())
+
+    def test_next_run_keeps_the_models(self):
+        Core(self.settings, self.adapter, incremental=True)()
+        self.adapter.dataset = self.adapter.dataset.copy()
+        self.adapter.dataset.loc[0, 'number'] = 42
+        with patch.object(EvenNumberClassifier, 'fit') as fit:
+            Core(self.settings, self.adapter, incremental=True)()
+            fit.assert_not_called()
+
+    def test_rows_to_score_without_group_keys(self):
+        core = Core(self.settings, self.adapter)
+        changed = np.array((True, False, False, False))
+        rows = core.rows_to_score(EvenNumberClassifier, changed, pd.DataFrame())
+        self.assertEqual(changed.tolist(), rows.tolist())
+
+    def test_rows_to_score_with_group_keys(self):
+        core = Core(self.settings, self.adapter)
+        changed = np.array((True, False, False, False))
+        removed = pd.DataFrame({'group': ('b',)})
+        with patch.object(EvenNumberClassifier, 'GROUP_KEYS', ['group']):
+            rows = core.rows_to_score(EvenNumberClassifier, changed, removed[:0])
+            self.assertEqual([True, True, False, False], rows.tolist())
+            rows = core.rows_to_score(EvenNumberClassifier, changed, removed)
+            self.assertEqual([True, True, True, True], rows.tolist())
+
+    def test_rows_to_score_with_the_whole_dataset_as_group(self):
+        core = Core(self.settings, self.adapter)
+        changed = np.array((True, False, False, False))
+        with patch.object(EvenNumberClassifier, 'GROUP_KEYS', []):
+            rows = core.rows_to_score(EvenNumberClassifier, changed, pd.DataFrame())
+            self.assertEqual([True] * 4, rows.tolist())
+            rows = core.rows_to_score(EvenNumberClassifier, np.zeros(4, dtype=np.bool), pd.DataFrame())
+            self.assertEqual([False] * 4, rows.tolist())
+
+
+class PartitionedTestCase(TestCase):
+    """Fixtures of a dataset with partition keys, written to a temporary
+    directory."""
+
+    def setUp(self):
+        self.adapter = MagicMock()
+        self.adapter.dataset = pd.DataFrame({
+            'applicant_id': (1, 2, 1, 3, 2, 1),
+            'number': (1, 2, 3, 4, 5, 6),
+            'text': ('one', 'two', 'three', 'four', 'five', 'six')
+        })
+        self.adapter.path = mkdtemp()
+        self.settings = MagicMock()
+        self.settings.UNIQUE_IDS = ['text']
+        self.settings.CLASSIFIERS = {'even': EvenNumberClassifier}
+
+    def tearDown(self):
+        shutil.rmtree(self.adapter.path)
+
+
+class TestChunkedCore(PartitionedTestCase):
+
+    def test_partitions_keep_partition_key_together(self):
+        core = Core(self.settings, self.adapter, chunk_size=2)
+        partitions = [positions.tolist() for positions in core.partitions()]
+        self.assertEqual([[0, 2, 5], [1, 4], [3]], partitions)
+
+    def test_partitions_without_partition_key(self):
+        self.adapter.dataset = self.adapter.dataset.drop(columns='applicant_id')
+        core = Core(self.settings, self.adapter, chunk_size=4)
+        partitions = [positions.tolist() for positions in core.partitions()]
+        self.assertEqual([[0, 1, 2, 3], [4, 5]], partitions)
+
+    def test_is_partitioned(self):
+        core = Core(self.settings, self.adapter, chunk_size=2)
+        self.assertTrue(core.is_partitioned(EvenNumberClassifier))
+        for keys, expected in ((['applicant_id', 'month'], True), (['text'], False), ([], False)):
+            with self.subTest(), patch.object(EvenNumberClassifier, 'GROUP_KEYS', keys):
+                self.assertEqual(expected, core.is_partitioned(EvenNumberClassifier))
+
+    def test_call_in_chunks(self):
+        Core(self.settings, self.adapter, chunk_size=2)()
+        path = os.path.join(self.adapter.path, 'suspicions.xz')
+        suspicions = pd.read_csv(path).set_index('text')['even']
+        expected = (self.adapter.dataset.set_index('text')['number'] % 2 == 0)
+        self.assertEqual(['one', 'three', 'six', 'two', 'five', 'four'], suspicions.index.tolist())
+        self.assertTrue(expected.sort_index().equals(suspicions.sort_index().rename('number')))
+
+    def test_call_in_chunks_with_whole_dataset_classifier(self):
+        with patch.object(EvenNumberClassifier, 'GROUP_KEYS', []), \
+                patch.object(EvenNumberClassifier, 'predict', autospec=True) as predict:
+            predict.side_effect = lambda self, X: (X['number'] % 2 == 0).values
+            Core(self.settings, self.adapter, chunk_size=2)()
+            scored = predict.call_args[0][1]
+        self.assertEqual(6, len(scored))
+
+    def test_output_is_measured_apart_from_classifiers(self):
+        measuring, calls = [], []
+        measure = RunReport.measure
+
+        @contextmanager
+        def tracked(report, stage, classifier=None):
+            measuring.append(stage)
+            with measure(report, stage, classifier):
+                yield
+            measuring.pop()
+
+        def track(name, result=None):
+            def side_effect(*args):
+                calls.append((name, tuple(measuring)))
+                return result(*args) if result else None
+            return side_effect
+
+        with patch.object(RunReport, 'measure', tracked), \
+                patch.object(EvenNumberClassifier, 'predict', autospec=True) as predict, \
+                patch.object(CsvWriter, 'write', autospec=True) as write, \
+                patch.object(CsvWriter, 'close', autospec=True) as close:
+            predict.side_effect = track('predict', lambda self, X: (X['number'] % 2 == 0).values)
+            write.side_effect = track('write')
+            close.side_effect = track('close')
+            Core(self.settings, self.adapter, chunk_size=2)()
+
+        expected = [('predict', ('predict',)), ('write', ('output',))] * 3 + [('close', ('output',))]
+        self.assertEqual(expected, calls)
+
+class TestSelectedClassifiers(TestCase):
+
+    def setUp(self):
+        self.adapter = MagicMock()
+        self.adapter.dataset = pd.DataFrame({
+            'applicant_id': (1, 2, 1, 3),
+            'number': (1, 2, 3, 4),
+            'text': ('one', 'two', 'three', 'four')
+        })
+        self.adapter.path = mkdtemp()
+        self.settings = MagicMock()
+        self.settings.UNIQUE_IDS = ['text']
+        self.settings.CLASSIFIERS = {'even': EvenNumberClassifier, 'odd': OddNumberClassifier}
+
+    def tearDown(self):
+        shutil.rmtree(self.adapter.path)
+
+    def suspicions(self):
+        path = os.path.join(self.adapter.path, 'suspicions.xz')
+        return pd.read_csv(path).set_index('text')
+
+    def test_unknown_classifier(self):
+        with self.assertRaises(ValueError):
+            Core(self.settings, self.adapter, classifiers=['even', 'prime'])
+
+    @patch.object(OddNumberClassifier, 'COLS', ['number'], create=True)
+    def test_incremental_with_selected_classifiers(self):
+        # the dataset has only the columns of the selected classifiers
+        columns = Core.required_columns(self.settings, ['odd'])
+        self.assertEqual({'number', 'text'}, columns)
+        self.adapter.dataset = self.adapter.dataset[sorted(columns)]
+        with self.assertRaises(ValueError):
+            Core(self.settings, self.adapter, incremental=True, classifiers=['odd'])
+
+    def test_runs_only_selected_classifiers(self):
+        core = Core(self.settings, self.adapter, classifiers=['odd'])
+        self.assertEqual(['odd'], list(core.classifiers))
+        with patch.object(EvenNumberClassifier, 'predict') as predict:
+            core()
+            predict.assert_not_called()
+        self.assertEqual(['odd'], list(self.suspicions().columns))
+
+    def test_keeps_suspicions_of_other_classifiers(self):
+        Core(self.settings, self.adapter)()
+        self.adapter.dataset = self.adapter.dataset.iloc[::-1].copy()
+        self.adapter.dataset.loc[4] = (4, 5, 'five')
+        with patch.object(OddNumberClassifier, 'predict') as predict:
+            predict.return_value = np.zeros(5, dtype=np.bool)
+            Core(self.settings, self.adapter, classifiers=['odd'])()
+
+        suspicions = self.suspicions()
+        self.assertEqual(['even', 'odd'], list(suspicions.columns))
+        self.assertEqual([False] * 5, suspicions['odd'].tolist())
+        expected = {'one': False, 'two': True, 'three': False, 'four': True, 'five': False}
+        self.assertEqual(expected, suspicions['even'].to_dict())
+
+    def test_keeps_suspicions_of_other_classifiers_in_chunks(self):
+        Core(self.settings, self.adapter, output_format='columnar')()
+        with patch.object(OddNumberClassifier, 'predict', autospec=True) as predict:
+            predict.side_effect = lambda self, X: np.zeros(len(X), dtype=np.bool)
+            Core(self.settings, self.adapter, chunk_size=2, output_format='columnar',
+                 classifiers=['odd'])()
+
+        path = os.path.join(self.adapter.path, 'suspicions.columns.xz')
+        suspicions = ColumnarWriter.read(path).set_index('text')
+        self.assertEqual(['even', 'odd'], list(suspicions.columns))
+        self.assertEqual([False] * 4, suspicions['odd'].tolist())
+        even = suspicions.loc[['one', 'two', 'three', 'four'], 'even']
+        self.assertEqual([False, True, False, True], even.tolist())
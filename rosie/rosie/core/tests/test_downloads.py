@@ -0,0 +1,48 @@
+import json
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from rosie.core.downloads import Downloads
+
+
+class TestDownloads(TestCase):
+
+    def setUp(self):
+        self.path = Path(mkdtemp())
+        self.downloaded = self.path / 'reimbursements.csv'
+        self.downloaded.write_text('year\n2018\n')
+        self.downloads = Downloads(self.path / 'downloads.json')
+        self.downloads.log.disabled = True
+
+    def tearDown(self):
+        shutil.rmtree(str(self.path))
+
+    def test_remote_not_available(self):
+        self.assertIsNone(self.downloads.remote('http://127.0.0.1:1/reimbursements.csv'))
+
+    def test_is_up_to_date_with_etag(self):
+        remote = {'etag': '"a"', 'size': 42}
+        self.assertFalse(self.downloads.is_up_to_date(2018, remote, self.downloaded))
+        self.downloads.record(2018, remote)
+        self.assertTrue(self.downloads.is_up_to_date(2018, remote, self.downloaded))
+        self.assertFalse(self.downloads.is_up_to_date(2018, {'etag': '"b"', 'size': 42}, self.downloaded))
+
+    def test_is_up_to_date_with_size(self):
+        self.assertTrue(self.downloads.is_up_to_date(2018, {'etag': None, 'size': 10}, self.downloaded))
+        self.assertFalse(self.downloads.is_up_to_date(2018, {'etag': None, 'size': 11}, self.downloaded))
+        self.assertFalse(self.downloads.is_up_to_date(2018, {'etag': None, 'size': None}, self.downloaded))
+
+    def test_is_up_to_date_without_remote_or_file(self):
+        self.assertFalse(self.downloads.is_up_to_date(2018, None, self.downloaded))
+        missing = self.path / 'missing.csv'
+        self.assertFalse(self.downloads.is_up_to_date(2018, {'etag': None, 'size': 10}, missing))
+
+    def test_save(self):
+        self.downloads.record(2018, {'etag': '"a"', 'size': 42})
+        self.downloads.record(2019, None)
+        self.downloads.save()
+        with open(str(self.path / 'downloads.json')) as fobj:
+            self.assertEqual({'2018': '"a"', '2019': None}, json.load(fobj))
+        self.assertEqual({'2018': '"a"', '2019': None}, Downloads(self.path / 'downloads.json').versions)
@@ -2,6 +2,7 @@ from unittest import TestCase
 
 import numpy as np
 import pandas as pd
+from brutils import cnpj, cpf
 
 from rosie.core.classifiers import InvalidCnpjCpfClassifier
 
@@ -45,3 +46,19 @@ class TestInvalidCnpjCpfClassifier(TestCase):
 
     def test_transform(self):
         self.assertEqual(self.subject.transform(), self.subject)
+
+    def test_check_digits_match_brutils(self):
+        valid = ['51563979217', '26064005777', '79857470874', '03707183050',
+                 '54262629000139', '55608283000140', '89220365000135']
+        invalid = [number[:-1] + str((int(number[-1]) + 1) % 10) for number in valid]
+        dataset = pd.DataFrame({
+            'recipient_id': valid + invalid,
+            'document_type': 'bill_of_sale'
+        })
+        prediction = self.subject.predict(dataset)
+        expected = [  # 03707183051 is an invalid CPF but, padded, a valid CNPJ
+            not (cpf.validate(number.zfill(11)) or cnpj.validate(number.zfill(14)))
+            for number in valid + invalid
+        ]
+        self.assertEqual([False] * 7 + [True] * 3 + [False] + [True] * 3, expected)
+        self.assertEqual(expected, prediction.tolist())
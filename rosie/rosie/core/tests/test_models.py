@@ -0,0 +1,100 @@
+import os
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+from unittest import TestCase
+
+import pandas as pd
+
+from rosie.core.models import ModelStore
+
+
+class ThresholdClassifier:
+
+    def __init__(self, factor=1):
+        self.factor = factor
+
+    def fit(self, X):
+        self.threshold = X['number'].mean() * self.factor
+        return self
+
+
+class TestModelStore(TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.dataset = pd.DataFrame({'number': (1, 2, 3)})
+        self.store = ModelStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def fitted(self, model, dataset=None):
+        dataset = self.dataset if dataset is None else dataset
+        key, metadata = self.store.key(model, dataset)
+        self.store.save(key, model.fit(dataset), metadata)
+        return key
+
+    def test_load_without_model(self):
+        key, _ = self.store.key(ThresholdClassifier(), self.dataset)
+        self.assertIsNone(self.store.load(key))
+
+    def test_load_stored_model(self):
+        key = self.fitted(ThresholdClassifier())
+        self.assertEqual(2, self.store.load(key).threshold)
+
+    def test_load_uncompressed_model(self):
+        self.store = ModelStore(self.path, compress=0)
+        key = self.fitted(ThresholdClassifier())
+        self.assertEqual(2, self.store.load(key).threshold)
+
+    def test_key_depends_on_params(self):
+        key, _ = self.store.key(ThresholdClassifier(1), self.dataset)
+        other, _ = self.store.key(ThresholdClassifier(2), self.dataset)
+        self.assertNotEqual(key, other)
+
+    def test_key_depends_on_data(self):
+        key, metadata = self.store.key(ThresholdClassifier(), self.dataset)
+        other, _ = self.store.key(ThresholdClassifier(), self.dataset + 1)
+        self.assertNotEqual(key, other)
+        self.assertEqual(key, self.store.key(ThresholdClassifier(), self.dataset.copy())[0])
+        self.assertEqual('ThresholdClassifier', metadata['classifier'])
+        self.assertEqual({'factor': 1}, metadata['params'])
+        self.assertTrue(metadata['source'])
+
+    def test_entries_most_recently_used_first(self):
+        first = self.fitted(ThresholdClassifier(1))
+        second = self.fitted(ThresholdClassifier(2))
+        self.assertEqual([second, first], [entry['key'] for entry in self.store.entries()])
+        self.store.load(first)
+        self.assertEqual([first, second], [entry['key'] for entry in self.store.entries()])
+
+    def test_save_evicts_least_recently_used(self):
+        first = self.fitted(ThresholdClassifier(1))
+        size = self.store.entries()[0]['size']
+        self.store.max_size = size
+        second = self.fitted(ThresholdClassifier(2))
+        self.assertIsNone(self.store.load(first))
+        self.assertIsNotNone(self.store.load(second))
+
+    def test_prune(self):
+        self.fitted(ThresholdClassifier(1))
+        self.fitted(ThresholdClassifier(2))
+        self.assertEqual(2, len(self.store.prune(0)))
+        self.assertEqual([], self.store.entries())
+
+    def test_prune_keeps_models_up_to_max_size_by_default(self):
+        self.fitted(ThresholdClassifier(1))
+        self.assertEqual([], self.store.prune())
+        self.assertEqual(1, len(self.store.entries()))
+
+    def test_remove_legacy(self):
+        store = ModelStore(os.path.join(self.path, 'models'))
+        legacy = os.path.join(self.path, 'thresholdclassifier.pkl')
+        state = os.path.join(self.path, 'rosie-state.pkl')
+        for path in (legacy, state):
+            open(path, 'w').close()
+        removed = store.remove_legacy([ThresholdClassifier, TestModelStore])
+        self.assertEqual([Path(legacy)], removed)
+        self.assertFalse(os.path.exists(legacy))
+        self.assertTrue(os.path.exists(state))
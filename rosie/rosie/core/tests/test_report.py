@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+from unittest.mock import patch
+
+from rosie.core.report import RunReport
+
+
+class TestRunReport(TestCase):
+
+    def setUp(self):
+        self.report = RunReport()
+
+    def test_measure(self):
+        with self.report.measure('dataset'):
+            list(range(1000))
+        metrics = self.report.stages['dataset']
+        self.assertEqual(1, metrics['calls'])
+        self.assertGreaterEqual(metrics['wall'], 0)
+        self.assertGreaterEqual(metrics['cpu'], 0)
+        self.assertGreaterEqual(metrics['peak_rss_delta'], 0)
+
+    def test_measure_classifier(self):
+        with self.report.measure('predict', 'MealPriceOutlierClassifier'):
+            pass
+        self.assertEqual({}, self.report.stages)
+        self.assertIn('predict', self.report.classifiers['MealPriceOutlierClassifier'])
+
+    @patch('rosie.core.report.resource', None)
+    def test_measure_without_resource(self):
+        with self.report.measure('dataset'):
+            pass
+        self.assertIsNone(self.report.stages['dataset']['peak_rss_delta'])
+
+    def test_repeated_stages_are_added_up(self):
+        self.report.add('predict', 'Classifier', wall=1., cpu=.5, peak_rss_delta=10)
+        self.report.add('predict', 'Classifier', wall=2., cpu=1., peak_rss_delta=5)
+        expected = {'wall': 3., 'cpu': 1.5, 'peak_rss_delta': 10, 'calls': 2}
+        self.assertEqual(expected, self.report.classifiers['Classifier']['predict'])
+
+    def test_update(self):
+        other = RunReport()
+        other.add('fit', 'Classifier', wall=1.)
+        other.add('dataset', wall=2.)
+        self.report.add('fit', 'Classifier', wall=1.)
+        self.report.update(other)
+        self.assertEqual(2., self.report.classifiers['Classifier']['fit']['wall'])
+        self.assertEqual(2, self.report.classifiers['Classifier']['fit']['calls'])
+        self.assertEqual(2., self.report.stages['dataset']['wall'])
+
+    def test_save(self):
+        path = mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.report.add('dataset', wall=1.)
+        self.report.save(os.path.join(path, 'report.json'), rows=42)
+        with open(os.path.join(path, 'report.json')) as fobj:
+            report = json.load(fobj)
+        self.assertEqual(42, report['rows'])
+        self.assertEqual(1., report['stages']['dataset']['wall'])
+        self.assertIn('started', report)
@@ -0,0 +1,136 @@
+import json
+import lzma
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from rosie.core import writers
+from rosie.core.writers import ColumnarWriter, CsvWriter
+
+
+def read_columnar(path):
+    """Reads the blocks of a columnar file as lists of dicts."""
+    with lzma.open(path) as fobj:
+        contents = fobj.read()
+
+    rows = []
+    while contents:
+        line, contents = contents.split(b'\n', 1)
+        header = json.loads(line.decode('utf-8'))
+        block = {}
+        for column in header['columns']:
+            data, contents = contents[:column['size']], contents[column['size']:]
+            if column['type'] == 'bits':
+                values = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+                values = values[:header['rows']].astype(np.bool).tolist()
+            elif column['type'] == 'int64':
+                values = np.frombuffer(data, dtype='<i8').tolist()
+            else:
+                values = json.loads(data.decode('utf-8'))
+            block[column['name']] = values
+        rows.extend(dict(zip(block, values)) for values in zip(*block.values()))
+    return rows
+
+
+class TestWriters(TestCase):
+
+    def setUp(self):
+        self.path = mkdtemp()
+        self.dataset = pd.DataFrame({
+            'applicant_id': ('1', '2', None),
+            'document_id': (10, 20, 30),
+            'meal_price_outlier': (True, False, True)
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_filename(self):
+        self.assertEqual('suspicions.xz', CsvWriter.filename('suspicions'))
+        self.assertEqual('suspicions.zst', CsvWriter.filename('suspicions', 'zstd'))
+        self.assertEqual('suspicions.columns.xz', ColumnarWriter.filename('suspicions'))
+
+    def test_writer_requires_a_format(self):
+        with self.assertRaises(TypeError):
+            writers.Writer(os.path.join(self.path, 'suspicions'))
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            CsvWriter(os.path.join(self.path, 'suspicions'), compression='gzip')
+
+    @patch.object(writers, 'zstandard', None)
+    def test_zstd_without_zstandard(self):
+        with self.assertRaises(ImportError):
+            CsvWriter(os.path.join(self.path, 'suspicions.zst'), compression='zstd')
+
+    @skipIf(writers.zstandard is None, 'zstandard is not installed')
+    def test_csv_with_zstd(self):
+        path = os.path.join(self.path, 'suspicions.zst')
+        with CsvWriter(path, compression='zstd') as writer:
+            writer.write(self.dataset)
+        with open(path, 'rb') as fobj:
+            reader = writers.zstandard.ZstdDecompressor().stream_reader(fobj)
+            saved = pd.read_csv(reader, dtype={'applicant_id': np.str})
+        self.assertTrue(self.dataset.equals(saved))
+
+    @patch.object(CsvWriter, 'BLOCK_SIZE', 2)
+    def test_csv_in_blocks_and_chunks(self):
+        path = os.path.join(self.path, 'suspicions.xz')
+        with CsvWriter(path, threads=2) as writer:
+            writer.write(self.dataset)
+            writer.write(self.dataset)
+        saved = pd.read_csv(path, dtype={'applicant_id': np.str})
+        expected = pd.concat([self.dataset, self.dataset], ignore_index=True)
+        self.assertTrue(expected.equals(saved))
+
+    def test_read_csv(self):
+        path = os.path.join(self.path, 'suspicions.xz')
+        with CsvWriter(path) as writer:
+            writer.write(self.dataset)
+        saved = CsvWriter.read(path, {'applicant_id': np.str})
+        self.assertTrue(self.dataset.equals(saved))
+
+    def test_csv_without_rows(self):
+        path = os.path.join(self.path, 'suspicions.xz')
+        with CsvWriter(path) as writer:
+            writer.write(self.dataset[:0])
+        self.assertEqual(list(self.dataset.columns), list(pd.read_csv(path).columns))
+
+    @patch.object(ColumnarWriter, 'BLOCK_SIZE', 2)
+    def test_columnar(self):
+        path = os.path.join(self.path, 'suspicions.columns.xz')
+        with ColumnarWriter(path, threads=2) as writer:
+            writer.write(self.dataset)
+        expected = [
+            {'applicant_id': '1', 'document_id': 10, 'meal_price_outlier': True},
+            {'applicant_id': '2', 'document_id': 20, 'meal_price_outlier': False},
+            {'applicant_id': None, 'document_id': 30, 'meal_price_outlier': True}
+        ]
+        self.assertEqual(expected, read_columnar(path))
+
+    @patch.object(ColumnarWriter, 'BLOCK_SIZE', 2)
+    def test_read_columnar(self):
+        path = os.path.join(self.path, 'suspicions.columns.xz')
+        with ColumnarWriter(path) as writer:
+            writer.write(self.dataset)
+        self.assertTrue(self.dataset.equals(ColumnarWriter.read(path)))
+
+    @skipIf(writers.zstandard is None, 'zstandard is not installed')
+    def test_read_columnar_with_zstd(self):
+        path = os.path.join(self.path, 'suspicions.columns.zst')
+        with ColumnarWriter(path, compression='zstd') as writer:
+            writer.write(self.dataset)
+        self.assertTrue(self.dataset.equals(ColumnarWriter.read(path)))
+
+    def test_columnar_packs_booleans(self):
+        dataset = pd.DataFrame({'meal_price_outlier': np.ones(1000, dtype=np.bool)})
+        path = os.path.join(self.path, 'suspicions.columns.xz')
+        with ColumnarWriter(path) as writer:
+            header, payload = writer.encode(dataset).split(b'\n', 1)
+        self.assertEqual(125, len(payload))
+        self.assertEqual('bits', json.loads(header.decode('utf-8'))['columns'][0]['type'])
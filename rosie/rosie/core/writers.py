@@ -0,0 +1,179 @@
+import io
+import json
+import lzma
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_integer_dtype
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Writer(ABC):
+    """
+    Writes suspicions to a compressed file, chunk by chunk. Rows are encoded
+    in blocks of `BLOCK_SIZE` rows, and each block is compressed as an
+    independent stream (xz and zstd readers read concatenated streams as a
+    single file), so `threads` blocks are compressed at the same time.
+    """
+
+    BLOCK_SIZE = 2 ** 16
+    EXTENSION = ''
+    COMPRESSIONS = {'xz': '.xz', 'zstd': '.zst'}
+
+    def __init__(self, path, threads=1, compression='xz'):
+        if compression not in self.COMPRESSIONS:
+            raise ValueError(f'Unknown compression: {compression}')
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError('zstd compression requires the zstandard package')
+
+        self.path = path
+        self.threads = threads
+        self.compression = compression
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.pending = deque()
+        self.fobj = open(path, 'wb')
+        self.blocks = 0
+
+    @classmethod
+    def filename(cls, name, compression='xz'):
+        return name + cls.EXTENSION + cls.COMPRESSIONS[compression]
+
+    @classmethod
+    def read(cls, path, dtype=None):
+        """Reads a file saved by this writer as a DataFrame (`dtype` sets the
+        type of columns that would be guessed otherwise, as in `read_csv`)."""
+        if not path.endswith(cls.COMPRESSIONS['zstd']):
+            with lzma.open(path) as fobj:
+                return cls.decode(fobj, dtype)
+
+        if zstandard is None:
+            raise ImportError('zstd compression requires the zstandard package')
+        with open(path, 'rb') as compressed:
+            reader = zstandard.ZstdDecompressor().stream_reader(
+                compressed,
+                read_across_frames=True
+            )
+            with io.BufferedReader(reader) as fobj:
+                return cls.decode(fobj, dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, df):
+        for start in range(0, max(len(df), 1), self.BLOCK_SIZE):
+            data = self.encode(df.iloc[start:start + self.BLOCK_SIZE])
+            self.blocks += 1
+            self.pending.append(self.executor.submit(self.compress, data))
+            while len(self.pending) > 2 * self.threads:
+                self.fobj.write(self.pending.popleft().result())
+
+    def close(self):
+        while self.pending:
+            self.fobj.write(self.pending.popleft().result())
+        self.executor.shutdown()
+        self.fobj.close()
+
+    @abstractmethod
+    def encode(self, df):
+        """Returns a block of rows as bytes (before compression)."""
+
+    @classmethod
+    @abstractmethod
+    def decode(cls, fobj, dtype=None):
+        """Reads the decompressed file object as a DataFrame."""
+
+    def compress(self, data):
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().compress(data)
+        return lzma.compress(data)
+
+
+class CsvWriter(Writer):
+    """CSV with a header in the first line, as `DataFrame.to_csv`."""
+
+    def encode(self, df):
+        return df.to_csv(None, header=self.blocks == 0, index=False).encode('utf-8')
+
+    @classmethod
+    def decode(cls, fobj, dtype=None):
+        return pd.read_csv(fobj, dtype=dtype)
+
+
+class ColumnarWriter(Writer):
+    """
+    A compact columnar format, readable without NumPy. Each block is a JSON
+    line describing it, followed by the data of each column:
+
+    * boolean columns (e.g. the suspicions) are bit-packed, the first row
+    being the most significant bit of the first byte (`bits` type);
+    * integer columns are little-endian signed 64-bit integers (`int64` type);
+    * any other column is a JSON list of strings or nulls (`json` type).
+
+    The JSON line has the format name and version, the number of `rows` in the
+    block and a list of `columns`, each with its `name`, `type` and `size` in
+    bytes.
+    """
+
+    EXTENSION = '.columns'
+    FORMAT = 'rosie-columnar'
+    VERSION = 1
+
+    def encode(self, df):
+        columns, payloads = [], []
+        for name in df.columns:
+            values = df[name]
+            if is_bool_dtype(values):
+                kind, payload = 'bits', np.packbits(values.values).tobytes()
+            elif is_integer_dtype(values):
+                kind, payload = 'int64', values.values.astype('<i8').tobytes()
+            else:
+                text = [None if pd.isnull(value) else str(value) for value in values]
+                kind, payload = 'json', json.dumps(text).encode('utf-8')
+            columns.append({'name': str(name), 'type': kind, 'size': len(payload)})
+            payloads.append(payload)
+
+        header = {
+            'format': self.FORMAT,
+            'version': self.VERSION,
+            'rows': len(df),
+            'columns': columns
+        }
+        header = json.dumps(header).encode('utf-8') + b'\n'
+        return header + b''.join(payloads)
+
+    @classmethod
+    def decode(cls, fobj, dtype=None):
+        blocks = []
+        for line in iter(fobj.readline, b''):
+            header = json.loads(line.decode('utf-8'))
+            block = OrderedDict()
+            for column in header['columns']:
+                data = fobj.read(column['size'])
+                if column['type'] == 'bits':
+                    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+                    values = bits[:header['rows']].astype(np.bool)
+                elif column['type'] == 'int64':
+                    values = np.frombuffer(data, dtype='<i8').astype(np.int64)
+                else:
+                    values = json.loads(data.decode('utf-8'))
+                block[column['name']] = values
+            blocks.append(pd.DataFrame(block))
+
+        # types are stored with the data, so `dtype` is not needed
+        return pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame()
+
+
+WRITERS = {
+    'csv': CsvWriter,
+    'columnar': ColumnarWriter
+}
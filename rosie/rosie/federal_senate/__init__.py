@@ -3,7 +3,11 @@ from rosie.federal_senate.adapter import Adapter
 from rosie.core import Core
 
 
-def main(target_directory='/tmp/serenata-data'):
-    adapter = Adapter(target_directory)
-    core = Core(settings, adapter)
+def main(target_directory='/tmp/serenata-data', workers=1, incremental=False,
+         chunk_size=None, output_format='csv', compression='xz', years=None,
+         offline=False, classifiers=None, backend='pandas', compress_models=True):
+    columns = Core.required_columns(settings, classifiers)
+    adapter = Adapter(target_directory, years, offline, columns)
+    core = Core(settings, adapter, workers, incremental, chunk_size,
+                output_format, compression, classifiers, backend, compress_models)
     core()
\ No newline at end of file
@@ -1,10 +1,17 @@
+import logging
 import os
+from pathlib import Path
+from re import match
 
 import numpy as np
 import pandas as pd
 
 from serenata_toolbox.federal_senate.dataset import Dataset
 
+from rosie.core.cache import DatasetCache
+from rosie.core.downloads import Downloads
+from rosie.core.report import RunReport
+
 COLUMNS = {
     'net_value': 'reimbursement_value',
     'recipient_id': 'cnpj_cpf',
@@ -14,15 +21,100 @@ COLUMNS = {
 
 class Adapter:
 
-    def __init__(self, path):
+    REIMBURSEMENTS_DATASET = 'federal-senate-reimbursements.xz'
+    YEAR_PATTERN = r'federal-senate-(\d{4})\.xz$'
+    DOWNLOADS = 'federal-senate-downloads.json'
+    DTYPE = {
+        'year': np.int16,
+        'month': np.int8,
+        'congressperson_name': 'category',
+        'expense_type': 'category',
+        'cnpj_cpf': np.str,
+        'supplier': 'category',
+        'document_id': np.str,
+        'date': np.str,
+        'expense_details': np.str,
+        'reimbursement_value': np.str
+    }
+
+    # increase it whenever `prepare_dataset` changes, so cached datasets
+    # prepared by previous versions are built again
+    VERSION = 1
+
+    # columns identifying each reimbursement in the suspicions (there are no
+    # UNIQUE_IDS) or used to prepare the dataset, loaded even if not requested
+    REQUIRED_COLUMNS = (
+        'congressperson_name',
+        'date',
+        'document_id',
+        'month',
+        'recipient_id',
+        'year'
+    )
+
+    def __init__(self, path, years=None, offline=False, columns=None):
+        """
+        The optional `years` limits the reimbursements updated and loaded to
+        these years. With `offline`, nothing is downloaded and the dataset is
+        the one already in `path`.
+
+        The optional `columns` (named after Serenata de Amor standard) limits
+        the dataset to these columns and to the ones identifying each
+        reimbursement.
+        """
         self.path = path
+        self.years = sorted(years) if years else None
+        self.offline = offline
+        self.columns = sorted(set(columns) | set(self.REQUIRED_COLUMNS)) if columns else None
+        self.log = logging.getLogger(__name__)
+        self.cache = DatasetCache(path, 'federal-senate-dataset')
+        self.report = RunReport()
 
     @property
     def dataset(self):
-        path = self.update_datasets()
-        self._dataset = pd.read_csv(path, dtype={'cnpj_cpf': np.str}, encoding='utf-8')
-        self.prepare_dataset()
-        return self._dataset
+        if self.offline:
+            self.log.info('Offline mode: using the datasets already downloaded')
+            path = os.path.join(self.path, self.REIMBURSEMENTS_DATASET)
+        else:
+            with self.report.measure('download'):
+                path = self.update_datasets()
+
+        with self.report.measure('cache'):
+            df = self.cache.load([path], columns=self.columns, years=self.years,
+                                 schema=self.schema)
+
+        if df is None:
+            with self.report.measure('reimbursements'):
+                self._dataset = pd.read_csv(
+                    path,
+                    dtype=self.DTYPE,
+                    usecols=self.usecols,
+                    encoding='utf-8'
+                )
+            with self.report.measure('prepare'):
+                if self.years:
+                    self._dataset = self._dataset[self._dataset['year'].isin(self.years)]
+                self.prepare_dataset()
+                df = self._dataset
+                if self.columns:
+                    df = df[[col for col in df.columns if col in self.columns]]
+            with self.report.measure('cache'):
+                self.cache.save(df, [path], columns=self.columns, years=self.years,
+                                schema=self.schema)
+
+        self._dataset = df
+        return df
+
+    def usecols(self, column):
+        """Filter for columns to be loaded from the CSV file."""
+        if not self.columns:
+            return True
+
+        return column in {COLUMNS.get(col, col) for col in self.columns}
+
+    @property
+    def schema(self):
+        return DatasetCache.schema(self.VERSION, self.DTYPE)
 
     def prepare_dataset(self):
         self.drop_null_cnpj_cpf()
@@ -30,7 +122,8 @@ class Adapter:
         self.create_columns()
 
     def drop_null_cnpj_cpf(self):
-        self._dataset[self._dataset['cnpj_cpf'].notnull()]
+        self._dataset = self._dataset[self._dataset['cnpj_cpf'].notnull()] \
+            .reset_index(drop=True)
 
     def rename_columns(self):
         columns = {v: k for k, v in COLUMNS.items()}
@@ -42,10 +135,42 @@ class Adapter:
         self._dataset['document_type'] = 'unknown'
 
     def update_datasets(self):
+        """Downloads and translates the reimbursements of the years that
+        changed since they were downloaded (see `Downloads`), and merges the
+        ones on disk again only if any of them changed."""
         os.makedirs(self.path, exist_ok=True)
-        federal_senate = Dataset(self.path)
-        federal_senate.fetch()
-        federal_senate.translate()
-        federal_senate_reimbursements_path = federal_senate.clean()
+        downloads = Downloads(Path(self.path) / self.DOWNLOADS)
+        years = self.years or Dataset.AVAILABLE_YEARS
+
+        for year in years:
+            remote = downloads.remote(Dataset.URL.format(year))
+            downloaded = Path(self.path) / f'federal-senate-{year}.csv'
+            translated = downloaded.with_suffix('.xz')
+            if translated.exists() and downloads.is_up_to_date(year, remote, downloaded):
+                self.log.info(f'Reimbursements from {year} are up to date')
+                continue
+
+            self.log.info(f'Updating reimbursements from {year}')
+            federal_senate = Dataset(self.path, [year])
+            try:
+                federal_senate.fetch()
+            except OSError as e:  # HTTPError and URLError
+                self.log.error(f'Could not update reimbursements from year {year}: {e}')
+                continue
+            federal_senate.translate()
+            downloads.record(year, remote)
+        downloads.save()
+
+        # every year on disk is merged again if any of them is newer than
+        # the merged dataset (even if not in `years`)
+        path = Path(self.path) / self.REIMBURSEMENTS_DATASET
+        translated = {}
+        for year_path in Path(self.path).glob('federal-senate-*.xz'):
+            matches = match(self.YEAR_PATTERN, year_path.name)
+            if matches:
+                translated[int(matches.group(1))] = year_path.stat().st_mtime
+        if translated and (not path.exists() or max(translated.values()) > path.stat().st_mtime):
+            self.log.info('Merging reimbursements')
+            Dataset(self.path, sorted(translated)).clean()
 
-        return federal_senate_reimbursements_path
+        return str(path)
@@ -2,6 +2,7 @@ import os
 import shutil
 from tempfile import mkdtemp
 from unittest import TestCase
+from pathlib import Path
 from unittest.mock import patch
 
 import pandas as pd
@@ -21,6 +22,7 @@ class TestAdapter(TestCase):
     def setUp(self):
         self.temp_path = mkdtemp()
         subject = subject_class(self.temp_path)
+        subject.log.disabled = True
         with patch.object(subject_class, 'update_datasets') as mocked_update:
             mocked_update.return_value = FIXTURE_PATH
             self.dataset = subject.dataset
@@ -44,3 +46,88 @@ class TestAdapter(TestCase):
 
     def test_droped_all_null_values(self):
         self.assertTrue(self.dataset['recipient_id'].all())
+
+    def test_offline_dataset_with_selected_years(self):
+        shutil.copy2(FIXTURE_PATH, os.path.join(self.temp_path, subject_class.REIMBURSEMENTS_DATASET))
+        subject = subject_class(self.temp_path, years=(2013, 2016), offline=True)
+        with patch.object(subject_class, 'update_datasets') as mocked_update:
+            dataset = subject.dataset
+            mocked_update.assert_not_called()
+        self.assertEqual({2013, 2016}, set(dataset['year']))
+
+    def test_dropped_null_cnpj_cpf(self):
+        self.assertEqual(20, len(self.dataset))
+        self.assertEqual(list(range(20)), self.dataset.index.tolist())
+
+    def test_typed_columns(self):
+        self.assertEqual('int16', self.dataset['year'].dtype.name)
+        for column in ('congressperson_name', 'expense_type', 'recipient'):
+            with self.subTest():
+                self.assertEqual('category', self.dataset[column].dtype.name)
+
+    def test_dataset_with_selected_columns(self):
+        subject = subject_class(self.temp_path, columns=('document_type', 'recipient_id'))
+        subject.log.disabled = True
+        with patch.object(subject_class, 'update_datasets') as mocked_update:
+            mocked_update.return_value = FIXTURE_PATH
+            dataset = subject.dataset
+        expected = {'year', 'month', 'congressperson_name', 'document_id', 'date',
+                    'recipient_id', 'document_type'}
+        self.assertEqual(expected, set(dataset.columns))
+
+    def test_dataset_is_cached(self):
+        subject = subject_class(self.temp_path)
+        subject.log.disabled = True
+        with patch.object(subject_class, 'update_datasets') as mocked_update, \
+                patch('rosie.federal_senate.adapter.pd.read_csv') as read_csv:
+            mocked_update.return_value = FIXTURE_PATH
+            dataset = subject.dataset
+            read_csv.assert_not_called()
+        self.assertTrue(self.dataset.equals(dataset))
+
+
+@patch('rosie.federal_senate.adapter.Dataset')
+@patch('rosie.federal_senate.adapter.Downloads.remote')
+class TestUpdateDatasets(TestCase):
+
+    def setUp(self):
+        self.path = Path(mkdtemp())
+        self.subject = subject_class(str(self.path), years=(2017, 2018))
+        self.subject.log.disabled = True
+
+    def tearDown(self):
+        shutil.rmtree(str(self.path))
+
+    def download(self, year):
+        """Creates the files `Dataset` would."""
+        (self.path / f'federal-senate-{year}.csv').write_text('42')
+        (self.path / f'federal-senate-{year}.xz').write_text('42')
+
+    def updated_years(self, dataset):
+        return [args[1] for args, _ in dataset.call_args_list]
+
+    def test_updates_every_year(self, remote, dataset):
+        remote.return_value = {'etag': '"a"', 'size': 2}
+        dataset.return_value.fetch.side_effect = lambda: self.download(2017)
+        self.subject.update_datasets()
+        self.assertEqual([[2017], [2018], [2017]], self.updated_years(dataset))
+        dataset.return_value.clean.assert_called_once_with()
+
+    def test_skips_unchanged_years(self, remote, dataset):
+        remote.return_value = {'etag': None, 'size': 2}
+        for year in (2017, 2018):
+            self.download(year)
+        (self.path / subject_class.REIMBURSEMENTS_DATASET).write_text('42')
+        path = self.subject.update_datasets()
+        self.assertEqual(str(self.path / subject_class.REIMBURSEMENTS_DATASET), path)
+        dataset.assert_not_called()
+
+    def test_merges_when_a_year_is_newer(self, remote, dataset):
+        remote.return_value = {'etag': None, 'size': 2}
+        (self.path / subject_class.REIMBURSEMENTS_DATASET).write_text('42')
+        os.utime(str(self.path / subject_class.REIMBURSEMENTS_DATASET), (0, 0))
+        for year in (2016, 2017, 2018):
+            self.download(year)
+        self.subject.update_datasets()
+        self.assertEqual([[2016, 2017, 2018]], self.updated_years(dataset))
+        dataset.return_value.clean.assert_called_once_with()